@@ -1,8 +1,9 @@
 import logging
 import os
 from functools import lru_cache
-from typing import List
+from typing import Dict, List, Optional
 
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 # Define supported Presidio entity types
@@ -30,6 +31,32 @@ SUPPORTED_PRESIDIO_ENTITY_TYPES = [
 ]
 
 
+class AnalysisProfile(BaseModel):
+    """
+    An accuracy/speed trade-off for PII analysis. Each profile gets its own analyzer engine,
+    which is only loaded the first time a request selects the profile.
+    """
+
+    model: str = "en_core_web_lg"  # spaCy model used for NER
+    context_enhancement: bool = True  # Boost scores of matches with context words nearby
+    score_threshold: float = 0.0  # Results scoring below this are dropped
+    recognizers: Optional[List[str]] = None  # Names of the recognizers to keep; None keeps all
+    # spaCy components that are not loaded at all. Presidio never uses the parser or sentence
+    # boundaries; the lemmas read by context enhancement need tok2vec, tagger and lemmatizer.
+    spacy_exclude: List[str] = ["parser", "senter"]
+    spacy_disable: List[str] = []  # spaCy components that are loaded but not run
+    pattern_scanner: bool = True  # Scan each distinct regex once per text for all pattern recognizers
+    prefilter: bool = True  # Skip recognizers whose required characters or digit runs are missing from a text
+
+
+# Only profiles whose model ships with the backend belong here. Faster profiles, e.g. one on
+# en_core_web_sm without context enhancement (nothing then reads the lemmas, so only "ner"
+# needs to be kept), can be added through ANALYSIS_PROFILES once their model is installed.
+DEFAULT_ANALYSIS_PROFILES = {
+    "accurate": AnalysisProfile(),
+}
+
+
 class Settings(BaseSettings):
     """
     Application settings, loaded from environment variables.
@@ -46,10 +73,28 @@ class Settings(BaseSettings):
         "http://127.0.0.1:3000",
     ]
     TOKEN_MAP_TTL_SECONDS: int = 3600  # Time-to-live for token maps in seconds (1 hour)
+    TOKEN_MAP_STORE: str = "memory"  # "memory" (single worker only), "sqlite" or "redis"
+    TOKEN_MAP_MAX_MEMORY_MB: int = 512  # Memory store only; least recently used maps are evicted above this
+    TOKEN_MAP_SQLITE_PATH: str = "redactflow_token_maps.db"
+    TOKEN_MAP_REDIS_URL: str = "redis://127.0.0.1:6379/0"
     LOG_LEVEL: str = "INFO"
+    STARTUP_PROFILING: bool = False  # Profile every startup phase with cProfile and log where the time goes
 
     # Presidio configuration
     PRESIDIO_ENTITY_TYPES: List[str] = SUPPORTED_PRESIDIO_ENTITY_TYPES
+    ANALYSIS_PROFILES: Dict[str, AnalysisProfile] = DEFAULT_ANALYSIS_PROFILES  # Selected per request with presidio_config.profile
+    ANALYSIS_DEFAULT_PROFILE: str = "accurate"  # Loaded at startup and used when a request names no profile
+    RECOGNIZER_STATS_ENABLED: bool = False  # Time every recognizer; totals at /api/debug/recognizers
+
+    # Analysis executor configuration
+    ANALYSIS_EXECUTOR_MODE: str = "thread"  # "thread", or "process" to fork ANALYSIS_MAX_WORKERS analyzer processes
+    ANALYSIS_MAX_WORKERS: int = 2  # Number of concurrent analysis jobs
+    ANALYSIS_MAX_QUEUE_SIZE: int = 16  # Jobs allowed to wait for a worker before new requests are rejected
+    ANALYSIS_CHUNK_SIZE: int = 100_000  # Documents longer than this (in characters) are analyzed in parallel chunks
+    ANALYSIS_CHUNK_OVERLAP: int = 1_000  # Characters of context shared between neighbouring chunks
+    ANALYSIS_CACHE_MAX_MB: int = 64  # Size of the analysis result cache for repeated documents; 0 disables it
+    SANITIZE_STREAM_CHUNK_SIZE: int = 10_000  # Section size (in characters) emitted by /sanitize/stream
+    SANITIZE_BATCH_MAX_ITEMS: int = 500  # Maximum number of texts accepted by /sanitize/batch
 
 
 @lru_cache()
@@ -1,49 +1,166 @@
 import logging
 import os
+import threading
 import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.routing import Match
 
 from app.config import get_settings, setup_logging
 from app.models.responses import ErrorResponse
-from app.routes import detokenize, health, sanitize, tokenmap
-from app.services.presidio_service import PresidioService
+from app.routes import debug, detokenize, health, metrics, sanitize, tokenmap
+from app.services.analysis_cache import AnalysisCache
+from app.services.analysis_executor import AnalysisExecutor
+from app.services.chunking_service import DocumentChunker
+from app.services.metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+from app.services.readiness import ServiceReadiness
+from app.services.startup_timeline import StartupTimeline, startup_timeline
 from app.services.tokenmap_service import TokenMapService
+from app.services.tokenmap_store import create_token_map_store
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+# Phases of loading the analysis services, in order, for reporting readiness progress.
+SERVICE_LOAD_PHASES = [
+    "presidio import",
+    "registry load",
+    "spaCy load",
+    "warm-up",
+    "analysis executor init",
+    "TokenMapService init",
+]
+
+# Paths that answer while the analysis services are still loading.
+_ALWAYS_AVAILABLE_PATHS = {"/api/health", "/api/ready", "/api/metrics"}
+
+
+def load_services(app: FastAPI, settings, timeline: StartupTimeline):
     """
-    Context manager for managing the lifespan of the FastAPI application.
-    Initializes Presidio and TokenMap services on startup, and cleans up on shutdown.
+    Loads the models and creates the services that depend on them. Normally runs on a
+    background thread, so the server is already accepting connections meanwhile; each step
+    is recorded as a phase of the startup timeline.
     """
-    settings = get_settings()
-    setup_logging()
     logger = logging.getLogger(__name__)
 
-    logger.info("RedactFlow backend starting up...")
-    app.state.start_time = time.time()
+    # Presidio and spaCy are imported here rather than at module level, so importing
+    # the app stays cheap.
+    with timeline.phase("presidio import"):
+        from app.services.presidio_service import PresidioService
 
     # Initialize PresidioService
-    app.state.presidio_service = PresidioService(supported_entities=settings.PRESIDIO_ENTITY_TYPES)
+    presidio_service = PresidioService(
+        supported_entities=settings.PRESIDIO_ENTITY_TYPES,
+        profiles=settings.ANALYSIS_PROFILES,
+        default_profile=settings.ANALYSIS_DEFAULT_PROFILE,
+        timeline=timeline,
+        recognizer_stats=settings.RECOGNIZER_STATS_ENABLED,
+    )
     logger.info("PresidioService initialized.")
 
     # Warm up the Presidio analyzer to load models into memory
     logger.info("Warming up NLP model...")
-    app.state.presidio_service.analyze_text("Warm-up text to initialize models.")
+    with timeline.phase("warm-up"):
+        presidio_service.analyze_text("Warm-up text to initialize models.")
     logger.info("NLP model warm-up complete.")
 
+    # Initialize the bounded executor that keeps CPU-bound analysis off the event loop.
+    # In process mode this forks the analyzer workers, so it must run after the models
+    # are loaded and before other background threads are started.
+    with timeline.phase("analysis executor init"):
+        analysis_executor = AnalysisExecutor(
+            max_workers=settings.ANALYSIS_MAX_WORKERS,
+            max_queue_size=settings.ANALYSIS_MAX_QUEUE_SIZE,
+            mode=settings.ANALYSIS_EXECUTOR_MODE,
+            presidio_service=presidio_service,
+            chunker=DocumentChunker(chunk_size=settings.ANALYSIS_CHUNK_SIZE, overlap=settings.ANALYSIS_CHUNK_OVERLAP),
+            cache=AnalysisCache(max_bytes=settings.ANALYSIS_CACHE_MAX_MB * 1024 * 1024) if settings.ANALYSIS_CACHE_MAX_MB > 0 else None,
+        )
+    logger.info("AnalysisExecutor initialized.")
+
     # Initialize TokenMapService
-    app.state.token_map_service = TokenMapService(ttl_seconds=settings.TOKEN_MAP_TTL_SECONDS)
+    try:
+        with timeline.phase("TokenMapService init"):
+            token_map_store = create_token_map_store(
+                settings.TOKEN_MAP_STORE,
+                sqlite_path=settings.TOKEN_MAP_SQLITE_PATH,
+                redis_url=settings.TOKEN_MAP_REDIS_URL,
+                max_memory_bytes=settings.TOKEN_MAP_MAX_MEMORY_MB * 1024 * 1024,
+            )
+            token_map_service = TokenMapService(ttl_seconds=settings.TOKEN_MAP_TTL_SECONDS, store=token_map_store)
+    except Exception:
+        # Shutdown only cleans up loaded services, so the pools (and in process mode the
+        # forked workers) would otherwise outlive the failed startup.
+        analysis_executor.shutdown(wait=False)
+        raise
     logger.info("TokenMapService initialized.")
 
+    app.state.presidio_service = presidio_service
+    app.state.analysis_executor = analysis_executor
+    app.state.token_map_service = token_map_service
+    timeline.complete()
+
+
+def _load_services_and_mark_readiness(app: FastAPI, settings, readiness: ServiceReadiness):
+    try:
+        load_services(app, settings, readiness.timeline)
+    except Exception as e:
+        logging.getLogger(__name__).exception("Failed to load the analysis services.")
+        readiness.mark_failed(e)
+    else:
+        readiness.mark_ready()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Context manager for managing the lifespan of the FastAPI application.
+    Starts loading the Presidio and TokenMap services in the background, so the server
+    starts listening right away, and cleans them up on shutdown. Until they are loaded,
+    /api/ready reports the progress and other API routes answer 503.
+
+    In process mode the services are loaded before the server starts listening instead:
+    the analysis workers are forked while loading, and forking from a background thread
+    next to the running event loop could leave a worker with a lock held by another thread.
+    """
+    settings = get_settings()
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    logger.info("RedactFlow backend starting up...")
+    app.state.start_time = time.time()
+
+    # The process-wide timeline also covers importing the app. An app started again in
+    # the same process (as in tests) gets a timeline of its own.
+    timeline = startup_timeline if startup_timeline.completed_ms is None else StartupTimeline()
+    timeline.profiling = timeline.profiling or settings.STARTUP_PROFILING
+    app.state.startup_timeline = timeline
+    app.state.readiness = ServiceReadiness(timeline, SERVICE_LOAD_PHASES)
+
+    loader = None
+    if settings.ANALYSIS_EXECUTOR_MODE == "process":
+        logger.info("Loading the analysis services before listening, as process mode forks analysis workers.")
+        _load_services_and_mark_readiness(app, settings, app.state.readiness)
+    else:
+        # A daemon thread, so that stopping the server while the models load does not hang.
+        loader = threading.Thread(
+            target=_load_services_and_mark_readiness,
+            args=(app, settings, app.state.readiness),
+            name="service-loader",
+            daemon=True,
+        )
+        loader.start()
+
     yield
 
     logger.info("RedactFlow backend shutting down.")
-    # Perform cleanup here if necessary
+    if loader is not None and loader.is_alive():
+        logger.info("Shutting down while the analysis services are still loading.")
+        return
+    if app.state.readiness.is_ready:
+        app.state.analysis_executor.shutdown()
+        app.state.token_map_service.close()
 
 
 app = FastAPI(title="RedactFlow Backend", version="0.1.0", lifespan=lifespan)
@@ -64,17 +181,74 @@ app.include_router(health.router, prefix="/api", tags=["Health"])
 app.include_router(sanitize.router, prefix="/api", tags=["Sanitize"])
 app.include_router(detokenize.router, prefix="/api", tags=["Detokenize"])
 app.include_router(tokenmap.router, prefix="/api", tags=["TokenMap"])
+app.include_router(metrics.router, prefix="/api", tags=["Metrics"])
+app.include_router(debug.router, prefix="/api", tags=["Debug"])
+
+
+def _route_label(request: Request) -> str:
+    """
+    The path template of the route that handled a request, such as /api/tokens/{token_map_id},
+    so that request metrics are not split by IDs in the path.
+    """
+    route = request.scope.get("route")
+    if route is None:
+        # Requests answered by a middleware never reach the router.
+        for candidate in request.app.router.routes:
+            if candidate.matches(request.scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return route.path if route is not None else "unmatched"
+
+
+@app.middleware("http")
+async def reject_until_ready(request: Request, call_next):
+    """
+    Middleware that answers 503 with a Retry-After header while the analysis services
+    are still loading, instead of letting requests fail on missing services.
+    """
+    readiness = getattr(request.app.state, "readiness", None)
+    if (
+        readiness is None
+        or readiness.is_ready
+        or not request.url.path.startswith("/api/")
+        or request.url.path in _ALWAYS_AVAILABLE_PATHS
+    ):
+        return await call_next(request)
+
+    if readiness.status == ServiceReadiness.FAILED:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=ErrorResponse(
+                code="SERVICE_UNAVAILABLE",
+                message="The analysis services failed to load.",
+                details=readiness.as_dict(),
+            ).model_dump(),
+        )
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(readiness.retry_after_seconds)},
+        content=ErrorResponse(
+            code="SERVICE_STARTING",
+            message="The analysis models are still loading. Retry shortly.",
+            details=readiness.as_dict(),
+        ).model_dump(),
+    )
 
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     """
-    Middleware to add X-Process-Time header to responses.
+    Middleware to add X-Process-Time header to responses, and to count and time requests
+    per route for /api/metrics.
     """
     start_time = time.time()
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+
+    route = _route_label(request)
+    HTTP_REQUESTS.inc(method=request.method, route=route, status=str(response.status_code))
+    HTTP_REQUEST_SECONDS.observe(process_time, method=request.method, route=route)
     return response
 
 
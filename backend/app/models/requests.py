@@ -15,6 +15,29 @@ class SanitizeRequest(BaseModel):
     )
 
 
+class BatchSanitizeRequest(BaseModel):
+    """
+    Request model for sanitizing several texts in one call.
+    """
+
+    texts: List[str] = Field(..., min_length=1, description="The texts to be sanitized.")
+    presidio_config: Optional[dict] = Field(
+        None, description="Optional custom Presidio configuration shared by all texts."
+    )
+
+
+class IncrementalSanitizeRequest(BaseModel):
+    """
+    Request model for re-sanitizing an edited version of a previously sanitized text.
+    """
+
+    token_map_id: UUID = Field(..., description="The ID of the token map of the previous version.")
+    text: str = Field(..., min_length=1, description="The edited text to be sanitized.")
+    presidio_config: Optional[dict] = Field(
+        None, description="Optional custom Presidio configuration for entity detection."
+    )
+
+
 class DetokenizeRequest(BaseModel):
     """
     Request model for detokenizing text.
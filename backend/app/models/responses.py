@@ -46,3 +46,24 @@ class ErrorResponse(BaseModel):
     code: str = Field(..., description="A unique error code.")
     message: str = Field(..., description="A human-readable error message.")
     details: Optional[dict] = Field(None, description="Optional additional error details.")
+
+
+class BatchSanitizeItem(BaseModel):
+    """
+    Outcome of sanitizing a single text within a batch.
+    """
+
+    index: int = Field(..., description="Position of the text in the request's texts list.")
+    result: Optional[SanitizeResponse] = Field(None, description="The sanitization result, if successful.")
+    error: Optional[ErrorResponse] = Field(None, description="The error for this text, if it failed.")
+
+
+class BatchSanitizeResponse(BaseModel):
+    """
+    Response model for batch text sanitization.
+    """
+
+    results: List[BatchSanitizeItem] = Field(..., description="Per-text results, in request order.")
+    succeeded: int = Field(..., description="Number of texts sanitized successfully.")
+    failed: int = Field(..., description="Number of texts that failed.")
+    processing_time_ms: float = Field(..., description="Time taken for the whole batch in milliseconds.")
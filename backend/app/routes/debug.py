@@ -0,0 +1,43 @@
+import logging
+
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+
+from app.models.responses import ErrorResponse
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _recognizer_stats_disabled() -> JSONResponse:
+    error_response = ErrorResponse(
+        code="RECOGNIZER_STATS_DISABLED",
+        message="Recognizer stats are not enabled. Set RECOGNIZER_STATS_ENABLED=true to collect them.",
+    ).model_dump()
+    return JSONResponse(content=error_response, status_code=status.HTTP_404_NOT_FOUND)
+
+
+@router.get("/debug/recognizers", summary="Per-recognizer timing and hit-rate totals")
+async def recognizer_stats_endpoint(request: Request):
+    """
+    Returns, for every recognizer and the spaCy pipeline, how often it ran, the time it
+    took, the matches it produced and how many of them conflict resolution discarded,
+    the most expensive recognizer first.
+    """
+    recognizer_stats = request.app.state.presidio_service.recognizer_stats
+    if recognizer_stats is None:
+        return _recognizer_stats_disabled()
+    return JSONResponse(content={"recognizers": recognizer_stats.get_stats()}, status_code=status.HTTP_200_OK)
+
+
+@router.delete("/debug/recognizers", summary="Reset the per-recognizer totals")
+async def reset_recognizer_stats_endpoint(request: Request):
+    """
+    Clears the per-recognizer totals, e.g. before measuring a specific workload.
+    """
+    recognizer_stats = request.app.state.presidio_service.recognizer_stats
+    if recognizer_stats is None:
+        return _recognizer_stats_disabled()
+    recognizer_stats.reset()
+    logger.info("Recognizer stats reset.")
+    return JSONResponse(content={"message": "Recognizer stats reset."}, status_code=status.HTTP_200_OK)
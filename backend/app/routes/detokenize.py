@@ -1,11 +1,14 @@
 import logging
 import time
+from uuid import UUID
 
-from fastapi import APIRouter, Request, status
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, status
 from fastapi.responses import JSONResponse
 
 from app.models.requests import DetokenizeRequest
 from app.models.responses import DetokenizeResponse, ErrorResponse
+from app.services.detokenization_service import StreamingDetokenizer
+from app.services.metrics import DETOKENIZE_SECONDS
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -21,9 +24,9 @@ async def detokenize_text_endpoint(request: Request, detokenize_request: Detoken
     token_map_service = request.app.state.token_map_service
 
     try:
-        token_map = token_map_service.get_token_map(detokenize_request.token_map_id)
+        detokenizer = token_map_service.get_detokenizer(detokenize_request.token_map_id)
 
-        if not token_map:
+        if not detokenizer:
             error_response = ErrorResponse(
                 code="TOKEN_MAP_NOT_FOUND",
                 message="Token map not found or expired.",
@@ -31,14 +34,10 @@ async def detokenize_text_endpoint(request: Request, detokenize_request: Detoken
             ).model_dump()
             return JSONResponse(content=error_response, status_code=status.HTTP_404_NOT_FOUND)
 
-        detokenized_text = detokenize_request.text
-        # Replace tokens with original values. Iterate through the token_map to ensure all tokens are replaced.
-        # It's important to replace longer tokens first to avoid partial replacements.
-        sorted_tokens = sorted(token_map.keys(), key=len, reverse=True)
-
-        for token in sorted_tokens:
-            original_value = token_map[token]["original_value"]
-            detokenized_text = detokenized_text.replace(token, original_value)
+        # Replace all tokens with their original values in a single pass over the text.
+        # The matcher is compiled once per token map and cached until the map changes.
+        with DETOKENIZE_SECONDS.time():
+            detokenized_text = detokenizer.detokenize(detokenize_request.text)
 
         processing_time_ms = (time.time() - start_time) * 1000
         logger.info(f"Detokenization complete in {processing_time_ms:.2f}ms for token_map_id: {detokenize_request.token_map_id}")
@@ -56,3 +55,60 @@ async def detokenize_text_endpoint(request: Request, detokenize_request: Detoken
             details={"error": str(e)},
         ).model_dump()
         return JSONResponse(content=error_response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@router.websocket("/detokenize/stream")
+async def detokenize_stream_endpoint(websocket: WebSocket, token_map_id: UUID):
+    """
+    Detokenizes a streamed LLM completion as it arrives.
+
+    The client sends JSON messages {"text": "<fragment>"} and finally {"event": "end"}.
+    For each fragment the server replies {"text": "<detokenized>"} with everything that can
+    already be restored, holding back only a possible partial token at the end. The final
+    reply is {"text": "<rest>", "event": "end"}, after which the socket is closed.
+    """
+    await websocket.accept()
+    if not websocket.app.state.readiness.is_ready:
+        await websocket.send_json(ErrorResponse(
+            code="SERVICE_STARTING",
+            message="The analysis models are still loading. Retry shortly.",
+            details=websocket.app.state.readiness.as_dict(),
+        ).model_dump())
+        await websocket.close(code=1013)  # Try again later
+        return
+
+    token_map_service = websocket.app.state.token_map_service
+    detokenizer = token_map_service.get_detokenizer(token_map_id)
+
+    if not detokenizer:
+        await websocket.send_json(ErrorResponse(
+            code="TOKEN_MAP_NOT_FOUND",
+            message="Token map not found or expired.",
+            details={"token_map_id": str(token_map_id)},
+        ).model_dump())
+        await websocket.close(code=1008)
+        return
+
+    stream = StreamingDetokenizer(detokenizer)
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                message = None
+            if not isinstance(message, dict) or not isinstance(message.get("text", ""), str):
+                await websocket.send_json(ErrorResponse(
+                    code="INVALID_MESSAGE",
+                    message='Messages must be JSON objects of the form {"text": "<fragment>"} or {"event": "end"}.',
+                    details={"token_map_id": str(token_map_id)},
+                ).model_dump())
+                await websocket.close(code=1003)  # Unsupported data
+                return
+            if message.get("event") == "end":
+                await websocket.send_json({"text": stream.flush(), "event": "end"})
+                await websocket.close()
+                logger.info(f"Streaming detokenization complete for token_map_id: {token_map_id}")
+                return
+            await websocket.send_json({"text": stream.feed(message.get("text", ""))})
+    except WebSocketDisconnect:
+        logger.info(f"Streaming detokenization client disconnected for token_map_id: {token_map_id}")
@@ -14,12 +14,27 @@ logger = logging.getLogger(__name__)
 async def health_check(request: Request):
     """
     Returns the current health and status of the RedactFlow backend service.
-    Includes information about the Presidio analyzer and token map service.
+    Includes information about the Presidio analyzer and token map service once they
+    are loaded, and the loading progress before that.
     """
     try:
         start_time = time.time()
+        readiness = request.app.state.readiness
+        if not readiness.is_ready:
+            response_content = {
+                "status": "starting" if readiness.status == readiness.LOADING else "unhealthy",
+                "version": request.app.version,
+                "uptime": f"{time.time() - request.app.state.start_time:.2f} seconds",
+                "readiness": readiness.as_dict(),
+                "startup": request.app.state.startup_timeline.as_dict(),
+                "processing_time_ms": (time.time() - start_time) * 1000,
+            }
+            status_code = status.HTTP_200_OK if readiness.status == readiness.LOADING else status.HTTP_503_SERVICE_UNAVAILABLE
+            return JSONResponse(content=response_content, status_code=status_code)
+
         presidio_service = request.app.state.presidio_service
         token_map_service = request.app.state.token_map_service
+        analysis_executor = request.app.state.analysis_executor
 
         # Basic check for Presidio service (e.g., if it's initialized)
         presidio_status = "OK" if presidio_service.analyzer else "ERROR"
@@ -37,12 +52,20 @@ async def health_check(request: Request):
                 "status": presidio_status,
                 "message": presidio_message,
                 "supported_entities": presidio_service.supported_entities,
+                "default_profile": presidio_service.default_profile,
+                "profiles": sorted(presidio_service.profiles),
+                "loaded_profiles": presidio_service.loaded_profiles(),
+                "prefilter": presidio_service.get_prefilter_stats(),
             },
             "token_map_service": {
                 "status": token_map_status,
                 "message": token_map_message,
-                "active_token_maps": len(token_map_service.token_maps),
+                "store": type(token_map_service.store).__name__,
+                "active_token_maps": token_map_service.count(),
+                "store_stats": token_map_service.get_stats(),
             },
+            "analysis_executor": analysis_executor.get_stats(),
+            "startup": request.app.state.startup_timeline.as_dict(),
             "processing_time_ms": (time.time() - start_time) * 1000,
         }
         return JSONResponse(content=response_content, status_code=status.HTTP_200_OK)
@@ -55,3 +78,16 @@ async def health_check(request: Request):
             details={"error": str(e)},
         ).model_dump()
         return JSONResponse(content=error_response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@router.get("/ready", summary="Check whether the analysis models are loaded")
+async def readiness_check(request: Request):
+    """
+    Readiness probe. Answers 200 once the analysis services are loaded and 503 before
+    that, reporting the loading phase and progress either way.
+    """
+    readiness = request.app.state.readiness
+    if readiness.is_ready:
+        return JSONResponse(content=readiness.as_dict(), status_code=status.HTTP_200_OK)
+    headers = {"Retry-After": str(readiness.retry_after_seconds)} if readiness.status == readiness.LOADING else None
+    return JSONResponse(content=readiness.as_dict(), status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
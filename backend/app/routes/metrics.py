@@ -0,0 +1,51 @@
+import logging
+from typing import List, Tuple
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+from app.services.metrics import registry
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Version 0.0.4 of the Prometheus text exposition format.
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _service_metrics(request: Request) -> Tuple[List[Tuple[str, str, float]], List[Tuple[str, str, float]]]:
+    """
+    Values read from the services when the metrics are scraped: point-in-time gauges, and
+    the running totals the services keep since startup, as counters.
+    """
+    readiness = request.app.state.readiness
+    gauges = [("redactflow_ready", "Whether the analysis services are loaded (1) or not (0).", float(readiness.is_ready))]
+    counters = []
+    if not readiness.is_ready:
+        return gauges, counters
+
+    store_stats = request.app.state.token_map_service.get_stats()
+    gauges.append(("redactflow_token_maps", "Token maps currently stored.", store_stats["token_maps"]))
+    # Size and eviction accounting is only available from stores that track it.
+    if "bytes" in store_stats:
+        gauges.append(("redactflow_token_map_bytes", "Approximate size of the stored token maps in bytes.", store_stats["bytes"]))
+    if "evictions" in store_stats:
+        counters.append(("redactflow_token_map_evictions_total", "Token maps evicted to stay within the memory limit.", store_stats["evictions"]))
+    if "expirations" in store_stats:
+        counters.append(("redactflow_token_map_expirations_total", "Token maps removed after their TTL ran out.", store_stats["expirations"]))
+
+    executor_stats = request.app.state.analysis_executor.get_stats()
+    gauges.append(("redactflow_analysis_queued_jobs", "Analysis jobs waiting for a worker.", executor_stats["queued"]))
+    gauges.append(("redactflow_analysis_running_jobs", "Analysis jobs currently running.", executor_stats["running"]))
+    counters.append(("redactflow_analysis_rejected_jobs_total", "Analysis jobs rejected because the queue was full.", executor_stats["rejected"]))
+    return gauges, counters
+
+
+@router.get("/metrics", summary="Expose service metrics in Prometheus text format", response_class=PlainTextResponse)
+async def metrics_endpoint(request: Request):
+    """
+    Returns the latency histograms, size and span-count distributions, per-route request
+    counters, and the service gauges and counters in the Prometheus text format. The
+    metrics are kept in process, so no collector is needed to read them.
+    """
+    return PlainTextResponse(registry.render(*_service_metrics(request)), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,17 +1,60 @@
+import json
 import logging
+import re
 import time
 import traceback
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Set
 
 from fastapi import APIRouter, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from app.models.requests import SanitizeRequest
-from app.models.responses import ErrorResponse, SanitizeResponse, TokenInfo
+from app.config import get_settings
+from app.models.requests import BatchSanitizeRequest, IncrementalSanitizeRequest, SanitizeRequest
+from app.models.responses import BatchSanitizeItem, BatchSanitizeResponse, ErrorResponse, SanitizeResponse, TokenInfo
+from app.services.analysis_errors import AnalysisProfileError, UnknownAnalysisProfileError
+from app.services.analysis_executor import AnalysisQueueFullError
+from app.services.chunking_service import DocumentChunker
+from app.services.diff_service import DiffRegion, ParagraphDiffer
+from app.services.metrics import DETECTED_SPANS, INPUT_CHARACTERS
+
+if TYPE_CHECKING:
+    # presidio_analyzer pulls in spaCy; it is only imported once the models load.
+    from presidio_analyzer import RecognizerResult
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def _observe_document(endpoint: str, text: str, span_count: int):
+    """
+    Records the size of a sanitized text and the number of entities found in it.
+    """
+    INPUT_CHARACTERS.observe(len(text), endpoint=endpoint)
+    DETECTED_SPANS.observe(span_count, endpoint=endpoint)
+
+
+def _analysis_profile_error(presidio_service, error: AnalysisProfileError) -> JSONResponse:
+    """
+    Maps a profile that is not configured to 400, and one whose model failed to load to 503.
+    """
+    if isinstance(error, UnknownAnalysisProfileError):
+        error_response = ErrorResponse(
+            code="UNKNOWN_ANALYSIS_PROFILE",
+            message=str(error),
+            details={"available_profiles": sorted(presidio_service.profiles)},
+        ).model_dump()
+        return JSONResponse(content=error_response, status_code=status.HTTP_400_BAD_REQUEST)
+    logger.error(f"Analysis profile unavailable: {error}")
+    error_response = ErrorResponse(
+        code="ANALYSIS_PROFILE_UNAVAILABLE",
+        message="The selected analysis profile could not be loaded.",
+        details={"error": str(error), "loaded_profiles": presidio_service.loaded_profiles()},
+    ).model_dump()
+    return JSONResponse(content=error_response, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
 @router.post("/sanitize", response_model=SanitizeResponse, status_code=status.HTTP_200_OK, summary="Sanitize text by detecting and anonymizing PII")
 async def sanitize_text_endpoint(request: Request, sanitize_request: SanitizeRequest):
     """
@@ -21,25 +64,32 @@ async def sanitize_text_endpoint(request: Request, sanitize_request: SanitizeReq
     start_time = time.time()
     presidio_service = request.app.state.presidio_service
     token_map_service = request.app.state.token_map_service
+    analysis_executor = request.app.state.analysis_executor
+    presidio_config = sanitize_request.presidio_config or {}
 
     try:
-        # 1. Analyze text for PII
-        analyzer_results = presidio_service.analyze_text(
+        # 1. Analyze text for PII (CPU-bound, so it runs on the analysis executor)
+        analyzer_results = await analysis_executor.analyze(
             text=sanitize_request.text,
-            entities=sanitize_request.presidio_config.get("entities") if sanitize_request.presidio_config else None,
+            entities=presidio_config.get("entities"),
+            profile=presidio_service.resolve_profile(presidio_config.get("profile")),
         )
         logger.debug(f"Found {len(analyzer_results)} PII entities.")
 
         # 2. Anonymize text, get token map, and get token occurrence info
-        sanitized_text, raw_token_map, tokens_info = presidio_service.anonymize_text(
+        sanitized_text, raw_token_map, tokens_info = await analysis_executor.run(
+            presidio_service.anonymize_text,
             text=sanitize_request.text,
             analyzer_results=analyzer_results,
         )
         logger.debug(f"Text anonymized. Generated {len(raw_token_map)} unique tokens.")
 
         # 3. Store token map for later detokenization
-        token_map_id = token_map_service.create_token_map(raw_token_map, sanitize_request.text, tokens_info)
+        token_map_id = token_map_service.create_token_map(
+            raw_token_map, sanitize_request.text, tokens_info, sanitized_text=sanitized_text
+        )
         logger.info(f"Token map created with ID: {token_map_id}")
+        _observe_document("sanitize", sanitize_request.text, len(tokens_info))
 
         # 4. Return the successful response
         processing_time_ms = (time.time() - start_time) * 1000
@@ -52,6 +102,20 @@ async def sanitize_text_endpoint(request: Request, sanitize_request: SanitizeReq
             processing_time_ms=processing_time_ms,
         )
 
+    except AnalysisProfileError as e:
+        return _analysis_profile_error(presidio_service, e)
+    except AnalysisQueueFullError as e:
+        logger.warning(f"Sanitization rejected: {e}")
+        error_response = ErrorResponse(
+            code="ANALYSIS_QUEUE_FULL",
+            message="The server is busy analyzing other documents. Please retry shortly.",
+            details={"executor": analysis_executor.get_stats()},
+        ).model_dump()
+        return JSONResponse(
+            content=error_response,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         logger.exception("Sanitization failed.")
         error_response = ErrorResponse(
@@ -60,3 +124,408 @@ async def sanitize_text_endpoint(request: Request, sanitize_request: SanitizeReq
             details={"error": str(e)},
         ).model_dump()
         return JSONResponse(content=error_response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _anonymize_batch(presidio_service, texts, outcomes):
+    """
+    Anonymizes every successfully analyzed text of a batch, keeping failures per item.
+    """
+    anonymized = []
+    for text, outcome in zip(texts, outcomes):
+        if isinstance(outcome, Exception):
+            anonymized.append(outcome)
+            continue
+        item_start_time = time.time()
+        try:
+            sanitized_text, raw_token_map, tokens_info = presidio_service.anonymize_text(
+                text=text,
+                analyzer_results=outcome,
+            )
+            anonymized.append((sanitized_text, raw_token_map, tokens_info, (time.time() - item_start_time) * 1000))
+        except Exception as e:
+            logger.error(f"Anonymization failed for batch item: {e}")
+            anonymized.append(e)
+    return anonymized
+
+
+@router.post("/sanitize/batch", response_model=BatchSanitizeResponse, status_code=status.HTTP_200_OK, summary="Sanitize multiple texts in one request")
+async def sanitize_batch_endpoint(request: Request, batch_request: BatchSanitizeRequest):
+    """
+    Sanitizes a list of texts with a shared Presidio configuration. The texts are analyzed
+    together so spaCy can batch them, and each one gets its own token map.
+    A failure on one text is reported for that item only and does not fail the batch.
+    """
+    start_time = time.time()
+    presidio_service = request.app.state.presidio_service
+    token_map_service = request.app.state.token_map_service
+    analysis_executor = request.app.state.analysis_executor
+    max_items = get_settings().SANITIZE_BATCH_MAX_ITEMS
+    presidio_config = batch_request.presidio_config or {}
+
+    if len(batch_request.texts) > max_items:
+        error_response = ErrorResponse(
+            code="BATCH_TOO_LARGE",
+            message=f"A batch may contain at most {max_items} texts.",
+            details={"received": len(batch_request.texts), "max_items": max_items},
+        ).model_dump()
+        return JSONResponse(content=error_response, status_code=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # 1. Analyze all texts in one executor job
+        analysis_start_time = time.time()
+        outcomes = await analysis_executor.analyze_batch(
+            texts=batch_request.texts,
+            entities=presidio_config.get("entities"),
+            profile=presidio_service.resolve_profile(presidio_config.get("profile")),
+        )
+        analysis_ms_per_item = (time.time() - analysis_start_time) * 1000 / len(batch_request.texts)
+
+        # 2. Anonymize each text
+        anonymized = await analysis_executor.run(_anonymize_batch, presidio_service, batch_request.texts, outcomes)
+
+        # 3. Store a token map per successful text
+        results = []
+        for index, (text, item) in enumerate(zip(batch_request.texts, anonymized)):
+            if isinstance(item, Exception):
+                results.append(BatchSanitizeItem(
+                    index=index,
+                    error=ErrorResponse(
+                        code="SANITIZATION_ERROR",
+                        message="Failed to sanitize text.",
+                        details={"error": str(item)},
+                    ),
+                ))
+                continue
+
+            sanitized_text, raw_token_map, tokens_info, anonymize_ms = item
+            token_map_id = token_map_service.create_token_map(raw_token_map, text, tokens_info, sanitized_text=sanitized_text)
+            _observe_document("batch", text, len(tokens_info))
+            results.append(BatchSanitizeItem(
+                index=index,
+                result=SanitizeResponse(
+                    sanitized_text=sanitized_text,
+                    token_map_id=token_map_id,
+                    tokens=tokens_info,
+                    processing_time_ms=analysis_ms_per_item + anonymize_ms,
+                ),
+            ))
+
+        failed = sum(1 for item in results if item.error is not None)
+        processing_time_ms = (time.time() - start_time) * 1000
+        logger.info(f"Batch sanitization of {len(results)} texts complete in {processing_time_ms:.2f}ms ({failed} failed).")
+
+        return BatchSanitizeResponse(
+            results=results,
+            succeeded=len(results) - failed,
+            failed=failed,
+            processing_time_ms=processing_time_ms,
+        )
+
+    except AnalysisProfileError as e:
+        return _analysis_profile_error(presidio_service, e)
+    except AnalysisQueueFullError as e:
+        logger.warning(f"Batch sanitization rejected: {e}")
+        error_response = ErrorResponse(
+            code="ANALYSIS_QUEUE_FULL",
+            message="The server is busy analyzing other documents. Please retry shortly.",
+            details={"executor": analysis_executor.get_stats()},
+        ).model_dump()
+        return JSONResponse(
+            content=error_response,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+    except Exception as e:
+        logger.exception("Batch sanitization failed.")
+        error_response = ErrorResponse(
+            code="SANITIZATION_ERROR",
+            message="Failed to sanitize batch.",
+            details={"error": str(e)},
+        ).model_dump()
+        return JSONResponse(content=error_response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def _sanitize_stream(request: Request, sanitize_request: SanitizeRequest, profile: str):
+    """
+    Yields NDJSON events for /sanitize/stream: a "start" event announcing the token map,
+    one "segment" event per analyzed section, then an "end" (or "error") event.
+    """
+    start_time = time.time()
+    presidio_service = request.app.state.presidio_service
+    token_map_service = request.app.state.token_map_service
+    analysis_executor = request.app.state.analysis_executor
+    settings = get_settings()
+    text = sanitize_request.text
+    entities = sanitize_request.presidio_config.get("entities") if sanitize_request.presidio_config else None
+
+    # The token map is created empty and extended as sections complete, so the tokens
+    # emitted so far can already be detokenized while the rest is processed.
+    consistency_map = {}
+    entity_counters = defaultdict(int)
+    token_map_id = token_map_service.create_token_map({}, text, [])
+    span_count = 0
+    # An incomplete token map must not be used for detokenization, so it is deleted unless
+    # the stream got to its end. This also covers clients disconnecting mid-stream, which
+    # surfaces here as GeneratorExit or CancelledError rather than as an Exception.
+    delete_on_exit = True
+
+    try:
+        yield json.dumps({"event": "start", "token_map_id": str(token_map_id)}) + "\n"
+        chunker = DocumentChunker(chunk_size=settings.SANITIZE_STREAM_CHUNK_SIZE, overlap=settings.ANALYSIS_CHUNK_OVERLAP)
+        segment_start = 0
+        last_entity_end = 0
+        for index, chunk in enumerate(chunker.split(text)):
+            chunk_results = await analysis_executor.analyze_chunk(text, chunk, entities, profile)
+
+            # Results are resolved section by section. Dropping anything that starts inside
+            # an entity kept by an earlier section first makes this identical to resolving
+            # the whole document at once.
+            chunk_results = presidio_service.merge_chunk_results(
+                [[result for result in chunk_results if result.start >= last_entity_end]]
+            )
+            if chunk_results:
+                last_entity_end = chunk_results[-1].end
+            segment_end = max(chunk.core_end, last_entity_end)
+
+            segment_mapping = {}
+            sanitized_segment, segment_tokens = presidio_service.anonymize_segment(
+                text, segment_start, segment_end, chunk_results, consistency_map, entity_counters, segment_mapping
+            )
+            if not token_map_service.append_tokens(token_map_id, segment_mapping, segment_tokens):
+                raise RuntimeError("Token map expired or was deleted during streaming.")
+            segment_start = segment_end
+            span_count += len(segment_tokens)
+            yield json.dumps({
+                "event": "segment",
+                "index": index,
+                "sanitized_text": sanitized_segment,
+                "tokens": segment_tokens,
+            }) + "\n"
+
+        processing_time_ms = (time.time() - start_time) * 1000
+        logger.info(f"Streaming sanitization complete in {processing_time_ms:.2f}ms for token_map_id: {token_map_id}")
+        _observe_document("stream", text, span_count)
+        delete_on_exit = False
+        yield json.dumps({
+            "event": "end",
+            "token_map_id": str(token_map_id),
+            "token_count": len(consistency_map),
+            "processing_time_ms": processing_time_ms,
+        }) + "\n"
+
+    except Exception as e:
+        logger.exception("Streaming sanitization failed.")
+        token_map_service.delete_token_map(token_map_id)
+        delete_on_exit = False
+        if isinstance(e, AnalysisQueueFullError):
+            code = "ANALYSIS_QUEUE_FULL"
+        elif isinstance(e, AnalysisProfileError):
+            code = "ANALYSIS_PROFILE_UNAVAILABLE"
+        else:
+            code = "SANITIZATION_ERROR"
+        yield json.dumps({
+            "event": "error",
+            **ErrorResponse(
+                code=code,
+                message="Failed to sanitize text.",
+                details={"error": str(e), "token_map_id": str(token_map_id)},
+            ).model_dump(),
+        }) + "\n"
+    finally:
+        if delete_on_exit:
+            logger.warning(f"Streaming sanitization of token_map_id {token_map_id} was interrupted; deleting its token map.")
+            token_map_service.delete_token_map(token_map_id)
+
+
+@router.post("/sanitize/stream", status_code=status.HTTP_200_OK, summary="Sanitize text, streaming the result section by section")
+async def sanitize_stream_endpoint(request: Request, sanitize_request: SanitizeRequest):
+    """
+    Streaming variant of /sanitize. Returns newline-delimited JSON events so clients can
+    start using the token map id and the first sanitized sections before the whole
+    document has been processed.
+    """
+    presidio_service = request.app.state.presidio_service
+    presidio_config = sanitize_request.presidio_config or {}
+    try:
+        # Checked up front, since errors can no longer change the status code once streaming.
+        profile = presidio_service.resolve_profile(presidio_config.get("profile"))
+    except AnalysisProfileError as e:
+        return _analysis_profile_error(presidio_service, e)
+    return StreamingResponse(_sanitize_stream(request, sanitize_request, profile), media_type="application/x-ndjson")
+
+
+def _shift_unchanged_occurrences(occurrences: List[Dict], regions: List[DiffRegion]) -> List[Dict]:
+    """
+    Carries the occurrences inside unchanged regions over to their offsets in the new text.
+    """
+    starts = [occurrence["start"] for occurrence in occurrences]
+    kept_occurrences = []
+    for region in regions:
+        if region.changed:
+            continue
+        shift = region.new_start - region.old_start
+        for occurrence in occurrences[bisect_left(starts, region.old_start):bisect_left(starts, region.old_end)]:
+            if occurrence["end"] <= region.old_end:
+                kept_occurrences.append({**occurrence, "start": occurrence["start"] + shift, "end": occurrence["end"] + shift})
+    return kept_occurrences
+
+
+def _results_within_changed_regions(results: List["RecognizerResult"], regions: List[DiffRegion]) -> List["RecognizerResult"]:
+    """
+    Drops results that run past the end of the changed region they were found in, since
+    they would overlap an occurrence carried over from the following unchanged paragraph.
+    Results crossing a seam between two chunks of the same region are kept.
+    """
+    changed_regions = [region for region in regions if region.changed]
+    region_starts = [region.new_start for region in changed_regions]
+    return [
+        result for result in results
+        if result.end <= changed_regions[bisect_right(region_starts, result.start) - 1].new_end
+    ]
+
+
+def _reviewer_occurrences(text: str, regions: List[DiffRegion], reviewer_values: Dict[str, str], mappings: Dict[str, Dict]) -> List[Dict]:
+    """
+    Finds the values of the tokens the reviewer added or edited inside the changed regions.
+    Analysis does not detect them, so without this they would be left in plain text.
+    """
+    values = [value for value in reviewer_values if value]
+    if not values:
+        return []
+    # Longest first, so that a value is never shadowed by another value it starts with. Like
+    # manual tokens, matches must not be part of a larger word.
+    pattern = re.compile(
+        r"(?<![^\W_])(?:" + "|".join(re.escape(value) for value in sorted(values, key=len, reverse=True)) + r")(?![^\W_])"
+    )
+    occurrences = []
+    for region in regions:
+        if not region.changed:
+            continue
+        for match in pattern.finditer(text, region.new_start, region.new_end):
+            token = reviewer_values[match.group(0)]
+            occurrences.append({
+                "token": token,
+                "original_value": match.group(0),
+                "entity_type": mappings[token]["entity_type"],
+                "start": match.start(),
+                "end": match.end(),
+                "score": mappings[token]["score"],
+            })
+    return occurrences
+
+
+def _apply_reviewer_decisions(
+    text: str, results: List["RecognizerResult"], reviewer_occurrences: List[Dict], reverted_values: Set[str]
+) -> List["RecognizerResult"]:
+    """
+    Drops the results whose value the reviewer reverted, and those overlapping a reviewer
+    token, which takes precedence.
+    """
+    starts = [occurrence["start"] for occurrence in reviewer_occurrences]
+    kept_results = []
+    for result in results:
+        if text[result.start:result.end] in reverted_values:
+            continue
+        index = bisect_left(starts, result.end)
+        if index and reviewer_occurrences[index - 1]["end"] > result.start:
+            continue
+        kept_results.append(result)
+    return kept_results
+
+
+@router.post("/sanitize/incremental", response_model=SanitizeResponse, status_code=status.HTTP_200_OK, summary="Re-sanitize an edited version of a sanitized text")
+async def incremental_sanitize_endpoint(request: Request, incremental_request: IncrementalSanitizeRequest):
+    """
+    Re-sanitizes an edited document given the token map of its previous version. The two
+    versions are diffed paragraph by paragraph, only changed paragraphs are analyzed again,
+    and existing tokens keep their numbers. Reviewer decisions also apply to the changed
+    paragraphs: values the reviewer tokenized stay tokenized and reverted values stay in
+    plain text. A new token map is created for the result.
+    """
+    start_time = time.time()
+    presidio_service = request.app.state.presidio_service
+    token_map_service = request.app.state.token_map_service
+    analysis_executor = request.app.state.analysis_executor
+    settings = get_settings()
+    presidio_config = incremental_request.presidio_config or {}
+
+    try:
+        profile = presidio_service.resolve_profile(presidio_config.get("profile"))
+        previous_entry = token_map_service.get_token_map_entry(incremental_request.token_map_id)
+        if not previous_entry:
+            error_response = ErrorResponse(
+                code="TOKEN_MAP_NOT_FOUND",
+                message="Token map not found or expired.",
+                details={"token_map_id": str(incremental_request.token_map_id)},
+            ).model_dump()
+            return JSONResponse(content=error_response, status_code=status.HTTP_404_NOT_FOUND)
+
+        # 1. Diff the two versions and carry over the occurrences of unchanged paragraphs
+        text = incremental_request.text
+        regions = ParagraphDiffer().diff(previous_entry.original_text, text)
+        kept_occurrences = _shift_unchanged_occurrences(previous_entry.tokens_info_raw, regions)
+
+        # 2. Analyze only the changed paragraphs, with the surrounding text as context
+        chunker = DocumentChunker(chunk_size=settings.ANALYSIS_CHUNK_SIZE, overlap=settings.ANALYSIS_CHUNK_OVERLAP)
+        chunks = [
+            chunk
+            for region in regions if region.changed
+            for chunk in chunker.split_region(text, region.new_start, region.new_end)
+        ]
+        new_results = []
+        if chunks:
+            new_results = await analysis_executor.analyze_chunks(
+                text, chunks, entities=presidio_config.get("entities"), profile=profile
+            )
+            new_results = _results_within_changed_regions(new_results, regions)
+        previous_mappings = previous_entry.mappings
+        reviewer_occurrences = _reviewer_occurrences(text, regions, previous_entry.reviewer_values, previous_mappings)
+        new_results = _apply_reviewer_decisions(text, new_results, reviewer_occurrences, previous_entry.reverted_values)
+        reanalyzed_characters = sum(chunk.core_end - chunk.core_start for chunk in chunks)
+        logger.debug(f"Re-analyzed {reanalyzed_characters} of {len(text)} characters.")
+
+        # 3. Anonymize, keeping the previous token numbering
+        sanitized_text, raw_token_map, tokens_info = await analysis_executor.run(
+            presidio_service.anonymize_incremental, text, kept_occurrences + reviewer_occurrences, new_results, previous_mappings
+        )
+
+        # 4. Store the token map of the new version
+        token_map_id = token_map_service.create_token_map(
+            raw_token_map, text, tokens_info, sanitized_text=sanitized_text, reviewed_from=previous_entry
+        )
+        _observe_document("incremental", text, len(tokens_info))
+        processing_time_ms = (time.time() - start_time) * 1000
+        logger.info(
+            f"Incremental sanitization complete in {processing_time_ms:.2f}ms for token_map_id: {token_map_id} "
+            f"({reanalyzed_characters} of {len(text)} characters re-analyzed)"
+        )
+
+        return SanitizeResponse(
+            sanitized_text=sanitized_text,
+            token_map_id=token_map_id,
+            tokens=tokens_info,
+            processing_time_ms=processing_time_ms,
+        )
+
+    except AnalysisProfileError as e:
+        return _analysis_profile_error(presidio_service, e)
+    except AnalysisQueueFullError as e:
+        logger.warning(f"Incremental sanitization rejected: {e}")
+        error_response = ErrorResponse(
+            code="ANALYSIS_QUEUE_FULL",
+            message="The server is busy analyzing other documents. Please retry shortly.",
+            details={"executor": analysis_executor.get_stats()},
+        ).model_dump()
+        return JSONResponse(
+            content=error_response,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+    except Exception as e:
+        logger.exception("Incremental sanitization failed.")
+        error_response = ErrorResponse(
+            code="SANITIZATION_ERROR",
+            message="Failed to sanitize text.",
+            details={"error": str(e)},
+        ).model_dump()
+        return JSONResponse(content=error_response, status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
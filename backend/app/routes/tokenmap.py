@@ -83,45 +83,27 @@ async def manual_tokenization_endpoint(request: Request, manual_token_request: M
     token_map_service = request.app.state.token_map_service
 
     try:
-        # 1. Retrieve the existing token map and original text
-        token_map_entry = token_map_service.get_token_map_entry(manual_token_request.token_map_id)
-        if not token_map_entry:
+        # Find the occurrences to tokenize, checked against the map's interval index, and
+        # patch the stored token map around them
+        manual_token_info = manual_token_request.model_dump() # Pass the relevant info from the request
+        result = token_map_service.insert_manual_tokens(
+            manual_token_request.token_map_id,
+            lambda token_map_entry: presidio_service.integrate_manual_token(token_map_entry, manual_token_info),
+        )
+        if not result:
             error_response = ErrorResponse(
                 code="TOKEN_MAP_NOT_FOUND",
                 message="Token map not found or expired.",
                 details={"token_map_id": str(manual_token_request.token_map_id)},
             ).model_dump()
             return JSONResponse(content=error_response, status_code=status.HTTP_404_NOT_FOUND)
-
-        original_text = token_map_entry.original_text
-        existing_results = token_map_entry.tokens_info_raw # This is a list of RecognizerResult objects
-
-        # 2. Integrate the manual token and find all occurrences
-        updated_results, additional_occurrences = presidio_service.integrate_manual_token(
-            original_text,
-            existing_results,
-            manual_token_request.model_dump() # Pass the relevant info from the request
-        )
-
-        # 3. Re-anonymize the text with the updated results
-        sanitized_text, token_mapping, tokens_info = presidio_service.anonymize_text(
-            original_text, updated_results
-        )
-
-        # 4. Update the token map service with the new data
-        token_map_service.update_token_map_entry_after_manual_tokenization(
-            token_map_id=manual_token_request.token_map_id,
-            sanitized_text=sanitized_text,
-            token_mapping=token_mapping,
-            tokens_info=tokens_info,
-            tokens_info_raw=tokens_info # This is List[Dict]
-        )
+        token_map_entry, additional_occurrences = result
 
         logger.info(f"Manual token added to token map {manual_token_request.token_map_id}.")
         return SanitizeResponse(
-            sanitized_text=sanitized_text,
+            sanitized_text=token_map_entry.sanitized_text,
             token_map_id=manual_token_request.token_map_id,
-            tokens=tokens_info,
+            tokens=token_map_entry.tokens_info_raw,
             processing_time_ms=0.0, # Placeholder, actual time not measured for manual op
             additional_occurrences=additional_occurrences
         )
@@ -149,14 +131,13 @@ async def manual_tokenization_endpoint(request: Request, manual_token_request: M
 async def revert_token_endpoint(request: Request, revert_token_request: RevertTokenRequest):
     """
     Reverts a specific token back to its original value by removing it from the token map
-    and re-anonymizing the text without that entity.
+    and restoring the original text at each of its occurrences.
     """
-    presidio_service = request.app.state.presidio_service
     token_map_service = request.app.state.token_map_service
 
     try:
-        # 1. Retrieve the existing token map and original text
-        token_map_entry = token_map_service.get_token_map_entry(revert_token_request.token_map_id)
+        # Revert the token in place, patching the sanitized text around its occurrences
+        token_map_entry = token_map_service.revert_token(revert_token_request.token_map_id, revert_token_request.token)
         if not token_map_entry:
             error_response = ErrorResponse(
                 code="TOKEN_MAP_NOT_FOUND",
@@ -165,37 +146,11 @@ async def revert_token_endpoint(request: Request, revert_token_request: RevertTo
             ).model_dump()
             return JSONResponse(content=error_response, status_code=status.HTTP_404_NOT_FOUND)
 
-        original_text = token_map_entry.original_text
-        existing_results = token_map_entry.tokens_info_raw  # List of dict representations
-        current_token_mapping = token_map_entry.mappings
-
-        # 2. Filter out the token to revert
-        filtered_results = presidio_service.filter_results_by_token(
-            original_text,
-            existing_results,
-            revert_token_request.token,
-            current_token_mapping
-        )
-
-        # 3. Re-anonymize the text with the filtered results
-        sanitized_text, token_mapping, tokens_info = presidio_service.anonymize_text(
-            original_text, filtered_results
-        )
-
-        # 4. Update the token map service with the new data
-        token_map_service.update_token_map_entry_after_manual_tokenization(
-            token_map_id=revert_token_request.token_map_id,
-            sanitized_text=sanitized_text,
-            token_mapping=token_mapping,
-            tokens_info=tokens_info,
-            tokens_info_raw=tokens_info  # Updated list of dicts
-        )
-
         logger.info(f"Token {revert_token_request.token} reverted in token map {revert_token_request.token_map_id}.")
         return SanitizeResponse(
-            sanitized_text=sanitized_text,
+            sanitized_text=token_map_entry.sanitized_text,
             token_map_id=revert_token_request.token_map_id,
-            tokens=tokens_info,
+            tokens=token_map_entry.tokens_info_raw,
             processing_time_ms=0.0  # Placeholder, actual time not measured for revert op
         )
 
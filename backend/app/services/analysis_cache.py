@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from presidio_analyzer import RecognizerResult
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry overhead of the key tuple, the OrderedDict slot and the result tuple.
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class AnalysisCache:
+    """
+    Content-addressed LRU cache of analyzer results.
+
+    Entries are keyed by a hash of the text together with the requested entity set and the
+    version of the recognizer registry, so identical documents submitted again skip the
+    spaCy pipeline and recognizers entirely. Results are stored as plain tuples and the
+    cache is bounded by an approximate byte size.
+    """
+
+    def __init__(self, max_bytes: int):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative.")
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[tuple, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text: str, entities: List[str], registry_version: str) -> Tuple:
+        """
+        Builds the cache key for a text. The entity order does not matter.
+        """
+        digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        return digest, len(text), tuple(sorted(set(entities))), registry_version
+
+    def get(self, key: Tuple) -> Optional[List["RecognizerResult"]]:
+        """
+        Returns fresh RecognizerResult objects for a cached entry, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            spans = entry[0]
+
+        from presidio_analyzer import RecognizerResult
+
+        return [
+            RecognizerResult(entity_type=entity_type, start=start, end=end, score=score)
+            for entity_type, start, end, score in spans
+        ]
+
+    def put(self, key: Tuple, results: List["RecognizerResult"]):
+        """
+        Stores the results for a key, evicting the least recently used entries as needed.
+        """
+        spans = tuple((sys.intern(r.entity_type), r.start, r.end, r.score) for r in results)
+        size = _ENTRY_OVERHEAD_BYTES + sys.getsizeof(spans) + len(spans) * sys.getsizeof((None,) * 4)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[1]
+            self._entries[key] = (spans, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """
+        Returns entry count, size and hit/miss counters.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
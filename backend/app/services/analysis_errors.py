@@ -0,0 +1,10 @@
+class AnalysisProfileError(RuntimeError):
+    """
+    Raised when the analyzer engine of an analysis profile cannot be loaded.
+    """
+
+
+class UnknownAnalysisProfileError(AnalysisProfileError):
+    """
+    Raised when a request selects an analysis profile that is not configured.
+    """
@@ -0,0 +1,403 @@
+import asyncio
+import functools
+import gc
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+from app.services.analysis_cache import AnalysisCache
+from app.services.analysis_errors import AnalysisProfileError
+from app.services.chunking_service import DocumentChunker, TextChunk
+from app.services.metrics import ANALYSIS_JOB_SECONDS, ANALYSIS_QUEUE_WAIT_SECONDS
+
+if TYPE_CHECKING:
+    from presidio_analyzer import RecognizerResult
+
+logger = logging.getLogger(__name__)
+
+# Set in the parent right before forking so that every worker process inherits the
+# already-loaded spaCy model and recognizer registry through copy-on-write pages.
+_worker_presidio_service = None
+_worker_startup_barrier = None
+
+
+def _init_worker():
+    """
+    Initializer for forked analysis workers. Shutdown is driven by the parent process.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _worker_ready() -> int:
+    """
+    Blocks until every worker has picked up one of these jobs, so each worker reports exactly once.
+    """
+    _worker_startup_barrier.wait(timeout=60)
+    return os.getpid()
+
+
+def _analyze_in_worker(text: str, entities: Optional[List[str]], profile: Optional[str] = None) -> List[tuple]:
+    """
+    Runs analysis inside a forked worker and returns plain tuples, which are much
+    cheaper to pickle back to the parent than full RecognizerResult objects.
+    """
+    results = _worker_presidio_service.analyze_text(text=text, entities=entities, raise_errors=True, profile=profile)
+    return [(r.entity_type, r.start, r.end, r.score) for r in results]
+
+
+def _analyze_chunk_in_worker(
+    window_text: str, chunk: TextChunk, entities: Optional[List[str]], profile: Optional[str] = None
+) -> List[tuple]:
+    results = _worker_presidio_service.analyze_chunk(window_text=window_text, chunk=chunk, entities=entities, profile=profile)
+    return [(r.entity_type, r.start, r.end, r.score) for r in results]
+
+
+def _analyze_batch_in_worker(
+    texts: List[str], entities: Optional[List[str]], profile: Optional[str] = None
+) -> List[Union[List[tuple], Exception]]:
+    """
+    Batch counterpart of `_analyze_in_worker`. Failed items are passed back as exceptions.
+    """
+    outcomes = _worker_presidio_service.analyze_batch(texts=texts, entities=entities, profile=profile)
+    return [
+        outcome if isinstance(outcome, Exception) else [(r.entity_type, r.start, r.end, r.score) for r in outcome]
+        for outcome in outcomes
+    ]
+
+
+def _to_recognizer_results(spans: List[tuple]) -> List["RecognizerResult"]:
+    from presidio_analyzer import RecognizerResult
+
+    return [
+        RecognizerResult(entity_type=entity_type, start=start, end=end, score=score)
+        for entity_type, start, end, score in spans
+    ]
+
+
+class AnalysisQueueFullError(RuntimeError):
+    """
+    Raised when the analysis executor cannot accept more work.
+    """
+
+
+class AnalysisExecutor:
+    """
+    Bounded executor for CPU-bound Presidio work (spaCy NER, recognizers, anonymization).
+
+    Work is run on a fixed-size thread pool so that the event loop stays free to serve
+    other requests. Submissions beyond `max_workers + max_queue_size` in-flight jobs are
+    rejected with AnalysisQueueFullError instead of piling up without limit.
+
+    In "process" mode, analysis is additionally spread over `max_workers` processes that
+    are forked from the current process once the PresidioService has loaded its models,
+    so the model memory is shared copy-on-write instead of being loaded once per worker.
+    Each pool thread then simply waits on one worker process, which keeps the queue
+    accounting identical between the two modes.
+
+    Documents longer than the chunker's chunk size are split into overlapping chunks that
+    are analyzed in parallel (on worker processes, or on a separate chunk thread pool) and
+    stitched back together. A document takes a single queue slot however many chunks it has.
+
+    With an AnalysisCache, results are looked up by content before a job is queued, so a
+    repeated document neither waits for a worker nor touches the analyzer.
+
+    Every analysis method takes an optional analysis profile name. Profiles other than the
+    default are loaded lazily by whichever process runs the analysis, so in process mode
+    each worker loads its own copy of a non-default profile on first use.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue_size: int = 16,
+        mode: str = "thread",
+        presidio_service=None,
+        chunker: Optional[DocumentChunker] = None,
+        cache: Optional[AnalysisCache] = None,
+    ):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        if max_queue_size < 0:
+            raise ValueError("max_queue_size must not be negative.")
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported analysis executor mode: {mode}")
+
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.presidio_service = presidio_service
+        self.chunker = chunker
+        self.cache = cache
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self.worker_pids: List[int] = []
+
+        if mode == "process":
+            if presidio_service is None:
+                raise ValueError("Process mode requires an initialized PresidioService.")
+            if "fork" not in multiprocessing.get_all_start_methods():
+                logger.warning("The 'fork' start method is not available on this platform. Falling back to thread mode.")
+                mode = "thread"
+            else:
+                self._start_process_pool()
+        self.mode = mode
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="presidio-analysis")
+        self._chunk_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="presidio-chunk")
+        self._lock = threading.Lock()
+
+        # Stats, guarded by self._lock
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+        self._total_run_ms = 0.0
+        logger.info(f"AnalysisExecutor initialized in {mode} mode with {max_workers} workers, max queue size: {max_queue_size}")
+
+    def _start_process_pool(self):
+        """
+        Forks the analysis worker processes. Must be called after the models are loaded.
+        """
+        global _worker_presidio_service, _worker_startup_barrier
+        fork_context = multiprocessing.get_context("fork")
+        _worker_presidio_service = self.presidio_service
+        _worker_startup_barrier = fork_context.Barrier(self.max_workers)
+
+        # Move everything allocated so far (the spaCy model, the registry) into the permanent
+        # generation, so garbage collection in the workers doesn't touch and copy those pages.
+        gc.freeze()
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=fork_context,
+            initializer=_init_worker,
+        )
+        # With the fork start method all workers are launched on the first submission.
+        futures = [self._process_pool.submit(_worker_ready) for _ in range(self.max_workers)]
+        self.worker_pids = sorted(future.result() for future in futures)
+        logger.info(f"Forked {self.max_workers} analysis worker processes: {self.worker_pids}")
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Runs `func(*args, **kwargs)` on the executor and awaits its result.
+
+        Raises:
+            AnalysisQueueFullError: If the executor is already at capacity.
+        """
+        with self._lock:
+            if self._queued + self._running >= self.max_workers + self.max_queue_size:
+                self._rejected += 1
+                raise AnalysisQueueFullError(
+                    f"Analysis queue is full ({self._queued} queued, {self._running} running)."
+                )
+            self._queued += 1
+
+        submitted_at = time.perf_counter()
+        future = self._executor.submit(functools.partial(self._run_job, submitted_at, func, args, kwargs))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The caller went away; release the queue slot if the job never started.
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    async def analyze(
+        self, text: str, entities: Optional[List[str]] = None, profile: Optional[str] = None
+    ) -> List["RecognizerResult"]:
+        """
+        Runs `PresidioService.analyze_text` on the executor, using a worker process in
+        process mode and chunked analysis for documents larger than the chunk size.
+        Cached results are returned without queueing a job.
+        """
+        if self.cache is None:
+            return await self.run(self._analyze_document, text, entities, profile)
+
+        cache_key = self._cache_key(text, entities, profile)
+        cached_results = self.cache.get(cache_key)
+        if cached_results is not None:
+            logger.debug(f"Analysis cache hit for text of {len(text)} characters.")
+            return cached_results
+        return await self.run(self._analyze_document, text, entities, profile, cache_key)
+
+    def _cache_key(self, text: str, entities: Optional[List[str]], profile: Optional[str] = None) -> tuple:
+        return AnalysisCache.make_key(
+            text,
+            entities if entities is not None else self.presidio_service.supported_entities,
+            self.presidio_service.profile_version(profile),
+        )
+
+    def _analyze_document(
+        self, text: str, entities: Optional[List[str]], profile: Optional[str] = None, cache_key: Optional[tuple] = None
+    ) -> List["RecognizerResult"]:
+        chunks = self.chunker.split(text) if self.chunker else []
+        if len(chunks) <= 1:
+            try:
+                if self._process_pool is None:
+                    results = self.presidio_service.analyze_text(text=text, entities=entities, raise_errors=True, profile=profile)
+                else:
+                    results = _to_recognizer_results(
+                        self._process_pool.submit(_analyze_in_worker, text, entities, profile).result()
+                    )
+            except AnalysisProfileError:
+                raise
+            except Exception:
+                # Keep analyze_text's fail-soft behaviour, but never cache the empty result.
+                return []
+        else:
+            results = self._analyze_chunks(text, chunks, entities, profile)
+
+        if cache_key is not None:
+            self.cache.put(cache_key, results)
+        return results
+
+    def _analyze_chunks(
+        self, text: str, chunks: List[TextChunk], entities: Optional[List[str]], profile: Optional[str] = None
+    ) -> List["RecognizerResult"]:
+        logger.info(f"Analyzing document of {len(text)} characters in {len(chunks)} chunks.")
+        if self._process_pool is None:
+            futures = [
+                self._chunk_pool.submit(
+                    self.presidio_service.analyze_chunk, text[chunk.window_start:chunk.window_end], chunk, entities, profile
+                )
+                for chunk in chunks
+            ]
+            chunk_results = [future.result() for future in futures]
+        else:
+            futures = [
+                self._process_pool.submit(
+                    _analyze_chunk_in_worker, text[chunk.window_start:chunk.window_end], chunk, entities, profile
+                )
+                for chunk in chunks
+            ]
+            chunk_results = [_to_recognizer_results(future.result()) for future in futures]
+        return self.presidio_service.merge_chunk_results(chunk_results)
+
+    async def analyze_chunks(
+        self, text: str, chunks: List[TextChunk], entities: Optional[List[str]] = None, profile: Optional[str] = None
+    ) -> List["RecognizerResult"]:
+        """
+        Analyzes the given chunks of `text` in parallel as a single executor job and returns
+        their stitched, conflict-resolved results.
+        """
+        return await self.run(self._analyze_chunks, text, chunks, entities, profile)
+
+    async def analyze_chunk(
+        self, text: str, chunk: TextChunk, entities: Optional[List[str]] = None, profile: Optional[str] = None
+    ) -> List["RecognizerResult"]:
+        """
+        Runs `PresidioService.analyze_chunk` for one chunk of `text` as its own executor job.
+        """
+        window_text = text[chunk.window_start:chunk.window_end]
+        if self._process_pool is None:
+            return await self.run(self.presidio_service.analyze_chunk, window_text, chunk, entities, profile)
+        return await self.run(self._analyze_chunk_in_process, window_text, chunk, entities, profile)
+
+    def _analyze_chunk_in_process(
+        self, window_text: str, chunk: TextChunk, entities: Optional[List[str]], profile: Optional[str] = None
+    ) -> List["RecognizerResult"]:
+        spans = self._process_pool.submit(_analyze_chunk_in_worker, window_text, chunk, entities, profile).result()
+        return _to_recognizer_results(spans)
+
+    async def analyze_batch(
+        self, texts: List[str], entities: Optional[List[str]] = None, profile: Optional[str] = None
+    ) -> List[Union[List["RecognizerResult"], Exception]]:
+        """
+        Runs `PresidioService.analyze_batch` on the executor as a single job. Texts found in
+        the cache are not sent to the analyzer.
+        """
+        if self.cache is None:
+            return await self._analyze_batch_uncached(texts, entities, profile)
+
+        cache_keys = [self._cache_key(text, entities, profile) for text in texts]
+        outcomes = [self.cache.get(cache_key) for cache_key in cache_keys]
+        missing = [index for index, outcome in enumerate(outcomes) if outcome is None]
+        if missing:
+            fresh_outcomes = await self._analyze_batch_uncached([texts[index] for index in missing], entities, profile)
+            for index, outcome in zip(missing, fresh_outcomes):
+                outcomes[index] = outcome
+                if not isinstance(outcome, Exception):
+                    self.cache.put(cache_keys[index], outcome)
+        return outcomes
+
+    async def _analyze_batch_uncached(
+        self, texts: List[str], entities: Optional[List[str]], profile: Optional[str] = None
+    ) -> List[Union[List["RecognizerResult"], Exception]]:
+        if self._process_pool is None:
+            return await self.run(self.presidio_service.analyze_batch, texts=texts, entities=entities, profile=profile)
+        return await self.run(self._analyze_batch_in_process, texts, entities, profile)
+
+    def _analyze_batch_in_process(
+        self, texts: List[str], entities: Optional[List[str]], profile: Optional[str] = None
+    ) -> List[Union[List["RecognizerResult"], Exception]]:
+        outcomes = self._process_pool.submit(_analyze_batch_in_worker, texts, entities, profile).result()
+        return [outcome if isinstance(outcome, Exception) else _to_recognizer_results(outcome) for outcome in outcomes]
+
+    def _run_job(self, submitted_at: float, func: Callable, args: tuple, kwargs: dict) -> Any:
+        """
+        Executes a job on a worker thread, recording its queue wait and run time.
+        """
+        started_at = time.perf_counter()
+        wait_ms = (started_at - submitted_at) * 1000
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+        ANALYSIS_QUEUE_WAIT_SECONDS.observe(wait_ms / 1000)
+
+        succeeded = False
+        try:
+            result = func(*args, **kwargs)
+            succeeded = True
+            return result
+        finally:
+            run_ms = (time.perf_counter() - started_at) * 1000
+            with self._lock:
+                self._running -= 1
+                self._total_run_ms += run_ms
+                if succeeded:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+            ANALYSIS_JOB_SECONDS.observe(run_ms / 1000)
+            if wait_ms > 1000:
+                logger.warning(f"Analysis job waited {wait_ms:.2f}ms in queue before starting.")
+
+    def get_stats(self) -> Dict:
+        """
+        Returns a snapshot of queue depth and wait-time statistics.
+        """
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "mode": self.mode,
+                "worker_pids": self.worker_pids,
+                "max_workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": self._total_wait_ms / finished if finished else 0.0,
+                "max_wait_ms": self._max_wait_ms,
+                "avg_run_ms": self._total_run_ms / finished if finished else 0.0,
+                "cache": self.cache.get_stats() if self.cache is not None else None,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shuts down the underlying pools.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._chunk_pool.shutdown(wait=wait, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait, cancel_futures=True)
+        logger.info("AnalysisExecutor shut down.")
@@ -0,0 +1,102 @@
+import logging
+import re
+from typing import List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"[.!?]\s|\n")
+_WHITESPACE = re.compile(r"\s")
+
+
+class TextChunk(NamedTuple):
+    """
+    A slice of a document to be analyzed on its own.
+
+    The core regions of all chunks tile the document without gaps or overlap. The window
+    extends the core by the overlap on both sides, so entities crossing a seam and the
+    context words around them are seen in full by the chunk that owns them.
+    """
+
+    core_start: int
+    core_end: int
+    window_start: int
+    window_end: int
+
+
+class DocumentChunker:
+    """
+    Splits large documents into overlapping chunks on paragraph or sentence boundaries.
+    """
+
+    def __init__(self, chunk_size: int = 100_000, overlap: int = 1_000):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1.")
+        if overlap < 0:
+            raise ValueError("overlap must not be negative.")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def split(self, text: str) -> List[TextChunk]:
+        """
+        Splits the text into chunks. Texts no longer than `chunk_size` yield a single chunk.
+        """
+        text_length = len(text)
+        if text_length <= self.chunk_size:
+            return [TextChunk(0, text_length, 0, text_length)]
+
+        chunks = self.split_region(text, 0, text_length)
+        logger.debug(f"Split text of {text_length} characters into {len(chunks)} chunks.")
+        return chunks
+
+    def split_region(self, text: str, start: int, end: int) -> List[TextChunk]:
+        """
+        Splits text[start:end] into chunks. The cores cover exactly that region, while the
+        windows may reach outside it so that the surrounding text still provides context.
+        """
+        chunks = []
+        core_start = start
+        while core_start < end:
+            core_end = min(core_start + self.chunk_size, end)
+            if core_end < end:
+                core_end = self._find_break(text, core_start + self.chunk_size // 2, core_end)
+
+            window_start = self._snap_backward(text, max(0, core_start - self.overlap), self.overlap)
+            window_end = self._snap_forward(text, min(len(text), core_end + self.overlap), self.overlap)
+            chunks.append(TextChunk(core_start, core_end, window_start, window_end))
+            core_start = core_end
+        return chunks
+
+    @staticmethod
+    def _find_break(text: str, lower: int, upper: int) -> int:
+        """
+        Returns the position just after the last paragraph break in [lower, upper), falling
+        back to a sentence break, then whitespace, then `upper` itself.
+        """
+        for pattern in (_PARAGRAPH_BREAK, _SENTENCE_BREAK, _WHITESPACE):
+            last_match = None
+            for last_match in pattern.finditer(text, lower, upper):
+                pass
+            if last_match is not None:
+                return last_match.end()
+        return upper
+
+    @staticmethod
+    def _snap_backward(text: str, position: int, max_distance: int) -> int:
+        """
+        Moves a window start back to just after the nearest whitespace, so no word is cut in half.
+        """
+        for index in range(position, max(0, position - max_distance) - 1, -1):
+            if index == 0 or text[index - 1].isspace():
+                return index
+        return position
+
+    @staticmethod
+    def _snap_forward(text: str, position: int, max_distance: int) -> int:
+        """
+        Moves a window end forward to the nearest whitespace, so no word is cut in half.
+        """
+        match = _WHITESPACE.search(text, position, min(len(text), position + max_distance))
+        if match:
+            return match.start()
+        return len(text) if position + max_distance >= len(text) else position
@@ -0,0 +1,107 @@
+import logging
+import re
+from bisect import bisect_left
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Every generated token looks like [ENTITY_TYPE_N], so a single generic pattern plus a dict
+# lookup finds them all in one pass, whatever the size of the token map.
+_TOKEN_SHAPE = re.compile(r"\[[^\[\]]+\]")
+
+
+class Detokenizer:
+    """
+    Single-pass matcher that replaces every token of one token map with its original value.
+
+    Built once per token map and cached on TokenMapData, so each /detokenize call is a
+    single scan over the text instead of one full `str.replace` pass per token.
+    """
+
+    def __init__(self, mappings: Dict[str, Dict]):
+        self._replacements = {token: details["original_value"] for token, details in mappings.items()}
+        self._sorted_tokens = sorted(self._replacements)
+        self._max_token_length = max((len(token) for token in self._sorted_tokens), default=0)
+
+        if all(_TOKEN_SHAPE.fullmatch(token) for token in self._replacements):
+            self._pattern = _TOKEN_SHAPE
+        elif self._replacements:
+            # Fall back to an alternation of the literal tokens, longest first so that a
+            # token is never shadowed by another token that is a prefix of it.
+            sorted_tokens = sorted(self._replacements, key=len, reverse=True)
+            self._pattern = re.compile("|".join(re.escape(token) for token in sorted_tokens))
+        else:
+            self._pattern = None
+        logger.debug(f"Built detokenizer for {len(self._replacements)} tokens.")
+
+    def detokenize(self, text: str) -> str:
+        """
+        Replaces all known tokens in the text with their original values.
+        Bracketed text that is not a known token is left untouched.
+        """
+        if self._pattern is None:
+            return text
+        replacements = self._replacements
+        return self._pattern.sub(lambda match: replacements.get(match.group(0), match.group(0)), text)
+
+    def _is_proper_token_prefix(self, candidate: str) -> bool:
+        """
+        True if some token starts with `candidate` and is longer than it.
+        """
+        index = bisect_left(self._sorted_tokens, candidate)
+        for token in self._sorted_tokens[index:index + 2]:
+            if token != candidate and token.startswith(candidate):
+                return True
+        return False
+
+    def safe_boundary(self, text: str) -> int:
+        """
+        Returns how much of `text` can be detokenized now if more text may follow.
+
+        Everything from the returned index on could still turn into (or extend) a token
+        once the next fragment arrives, so it has to be held back. This is at most the
+        length of the longest token, and usually zero.
+        """
+        if self._pattern is None:
+            return len(text)
+
+        boundary = len(text)
+        for index in range(max(0, len(text) - self._max_token_length + 1), len(text)):
+            if self._is_proper_token_prefix(text[index:]):
+                boundary = index
+                break
+
+        # Never split a complete token that straddles the boundary.
+        for match in self._pattern.finditer(text, max(0, boundary - self._max_token_length)):
+            if match.start() < boundary < match.end() and match.group(0) in self._replacements:
+                boundary = match.start()
+                break
+        return boundary
+
+
+class StreamingDetokenizer:
+    """
+    Detokenizes text that arrives in fragments, e.g. an LLM completion streamed token by
+    token. Only the suffix that could still be the start of a token split across fragments
+    is held back; everything before it is emitted immediately.
+    """
+
+    def __init__(self, detokenizer: Detokenizer):
+        self._detokenizer = detokenizer
+        self._pending = ""
+
+    def feed(self, fragment: str) -> str:
+        """
+        Adds a fragment and returns the detokenized text that is safe to emit.
+        """
+        buffer = self._pending + fragment
+        boundary = self._detokenizer.safe_boundary(buffer)
+        self._pending = buffer[boundary:]
+        return self._detokenizer.detokenize(buffer[:boundary])
+
+    def flush(self) -> str:
+        """
+        Emits whatever is still held back. Call once the input stream has ended.
+        """
+        remaining, self._pending = self._pending, ""
+        return self._detokenizer.detokenize(remaining)
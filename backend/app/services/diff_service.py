@@ -0,0 +1,73 @@
+import logging
+import re
+from difflib import SequenceMatcher
+from typing import List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+class DiffRegion(NamedTuple):
+    """
+    A run of paragraphs that is either identical in both texts or was changed.
+    Changed regions may be empty on either side (pure insertions or deletions).
+    """
+
+    old_start: int
+    old_end: int
+    new_start: int
+    new_end: int
+    changed: bool
+
+
+class ParagraphDiffer:
+    """
+    Diffs two versions of a document at paragraph granularity, so that an edited document
+    only has to be re-analyzed where it actually changed.
+    """
+
+    @staticmethod
+    def split_paragraphs(text: str) -> List[Tuple[int, int]]:
+        """
+        Returns (start, end) offsets of the paragraphs of a text. Each paragraph includes the
+        blank lines that follow it, so the paragraphs tile the text without gaps.
+        """
+        paragraphs = []
+        start = 0
+        for match in _PARAGRAPH_BREAK.finditer(text):
+            paragraphs.append((start, match.end()))
+            start = match.end()
+        if start < len(text) or not paragraphs:
+            paragraphs.append((start, len(text)))
+        return paragraphs
+
+    def diff(self, old_text: str, new_text: str) -> List[DiffRegion]:
+        """
+        Returns the regions of both texts in document order, covering both texts completely.
+        """
+        old_paragraphs = self.split_paragraphs(old_text)
+        new_paragraphs = self.split_paragraphs(new_text)
+        matcher = SequenceMatcher(
+            None,
+            [old_text[start:end] for start, end in old_paragraphs],
+            [new_text[start:end] for start, end in new_paragraphs],
+            autojunk=False,
+        )
+
+        regions = []
+        for tag, old_first, old_last, new_first, new_last in matcher.get_opcodes():
+            old_start, old_end = self._span(old_paragraphs, old_first, old_last, len(old_text))
+            new_start, new_end = self._span(new_paragraphs, new_first, new_last, len(new_text))
+            regions.append(DiffRegion(old_start, old_end, new_start, new_end, tag != "equal"))
+
+        changed = sum(region.new_end - region.new_start for region in regions if region.changed)
+        logger.debug(f"Paragraph diff: {changed} of {len(new_text)} characters changed.")
+        return regions
+
+    @staticmethod
+    def _span(paragraphs: List[Tuple[int, int]], first: int, last: int, text_length: int) -> Tuple[int, int]:
+        if first == last:
+            position = paragraphs[first][0] if first < len(paragraphs) else text_length
+            return position, position
+        return paragraphs[first][0], paragraphs[last - 1][1]
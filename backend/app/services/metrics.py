@@ -0,0 +1,224 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond regex passes to multi-second spaCy runs
+# over large documents.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+SPAN_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1_000, 5_000)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+class _Metric(ABC):
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} takes the labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """
+        The metric's lines in the Prometheus text format, starting with its HELP and TYPE.
+        """
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count, optionally split by labels.
+    """
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over fixed buckets, optionally split by labels.
+    Observations only increment one bucket; the cumulative counts Prometheus expects are
+    built when the metric is rendered.
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts (last one is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the run time of the enclosed block, in seconds. Also usable as a decorator.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            entry = self._values.get(self._label_values(labels))
+            return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, ([*entry[0]], entry[1], entry[2])) for key, entry in self._values.items())
+        lines = self._header()
+        for key, (bucket_counts, total, count) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process metrics registry that renders the Prometheus text exposition format, so
+    /api/metrics can be scraped, or simply read, without any external collector.
+
+    Metrics live in the process that records them. In process mode the analyzer and
+    conflict resolution timings of forked workers stay in those workers; the queue wait
+    and job timings of the analysis executor are recorded in the API process either way.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets, labelnames))
+
+    def render(
+        self, gauges: Iterable[Tuple[str, str, float]] = (), counters: Iterable[Tuple[str, str, float]] = ()
+    ) -> str:
+        """
+        Renders every registered metric, followed by the given point-in-time gauges and
+        the counters kept by the services themselves, as (name, documentation, value) tuples.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, documentation, value in gauges:
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"])
+        for name, documentation, value in counters:
+            lines.extend([f"# HELP {name} {documentation}", f"# TYPE {name} counter", f"{name} {_format_value(value)}"])
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+ANALYZE_SECONDS = registry.histogram(
+    "redactflow_analyze_seconds", "Time spent in the Presidio analyzer, by kind of call.", LATENCY_BUCKETS, ["kind"]
+)
+RESOLVE_CONFLICTS_SECONDS = registry.histogram(
+    "redactflow_resolve_conflicts_seconds", "Time spent resolving overlapping analyzer results.", LATENCY_BUCKETS
+)
+ANONYMIZE_SECONDS = registry.histogram(
+    "redactflow_anonymize_seconds", "Time spent replacing detected entities with tokens.", LATENCY_BUCKETS
+)
+DETOKENIZE_SECONDS = registry.histogram(
+    "redactflow_detokenize_seconds", "Time spent restoring original values in a text.", LATENCY_BUCKETS
+)
+TOKEN_MAP_STORE_SECONDS = registry.histogram(
+    "redactflow_token_map_store_seconds", "Time spent in token map store operations.", LATENCY_BUCKETS, ["operation"]
+)
+ANALYSIS_QUEUE_WAIT_SECONDS = registry.histogram(
+    "redactflow_analysis_queue_wait_seconds", "Time analysis jobs waited for an executor worker.", LATENCY_BUCKETS
+)
+ANALYSIS_JOB_SECONDS = registry.histogram(
+    "redactflow_analysis_job_seconds", "Run time of analysis executor jobs.", LATENCY_BUCKETS
+)
+INPUT_CHARACTERS = registry.histogram(
+    "redactflow_input_characters", "Size of the texts submitted for sanitization, in characters.", SIZE_BUCKETS, ["endpoint"]
+)
+DETECTED_SPANS = registry.histogram(
+    "redactflow_detected_spans", "Number of entities detected per sanitized text.", SPAN_BUCKETS, ["endpoint"]
+)
+HTTP_REQUESTS = registry.counter(
+    "redactflow_http_requests_total", "HTTP requests handled, by route and status code.", ["method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "redactflow_http_request_seconds", "HTTP request latency, by route.", LATENCY_BUCKETS, ["method", "route"]
+)
@@ -0,0 +1,150 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import regex
+from presidio_analyzer import EntityRecognizer, PatternRecognizer, RecognizerResult
+from presidio_analyzer.recognizer_registry import RecognizerRegistry
+
+logger = logging.getLogger(__name__)
+
+# PatternRecognizer's default flags when the analyzer passes none.
+_DEFAULT_FLAGS = regex.DOTALL | regex.MULTILINE
+
+
+class ScannedPatternRecognizer(EntityRecognizer):
+    """
+    Stands in for a PatternRecognizer in the registry and takes its matches from a shared
+    PatternScanner instead of scanning the text itself. Validation, invalidation, scoring and
+    context words are those of the wrapped recognizer.
+    """
+
+    def __init__(self, recognizer: PatternRecognizer, scanner: "PatternScanner"):
+        self.recognizer = recognizer
+        self.scanner = scanner
+        self.patterns = recognizer.patterns
+        super().__init__(
+            supported_entities=recognizer.supported_entities,
+            name=recognizer.name,
+            supported_language=recognizer.supported_language,
+            version=recognizer.version,
+            context=recognizer.context,
+        )
+
+    def load(self):
+        pass
+
+    def analyze(self, text: str, entities: List[str], nlp_artifacts=None, regex_flags: Optional[int] = None) -> List[RecognizerResult]:
+        return self.scanner.analyze(self, text, regex_flags or _DEFAULT_FLAGS)
+
+    def enhance_using_context(self, text, raw_recognizer_results, other_raw_recognizer_results, nlp_artifacts, context=None):
+        return self.recognizer.enhance_using_context(
+            text, raw_recognizer_results, other_raw_recognizer_results, nlp_artifacts, context
+        )
+
+
+class PatternScanner:
+    """
+    Shared scanning stage for the pattern recognizers of a registry.
+
+    Every distinct regex is compiled once, and scanned at most once per text however many
+    recognizers use it; the matches are then scored by each recognizer exactly as
+    PatternRecognizer would. Patterns are still scanned one by one: merging them into a
+    single alternation costs the `regex` engine its per-pattern fast first-character search
+    and made scanning several times slower.
+
+    Scans are cached per thread for the text being analyzed, since the analyzer calls its
+    recognizers one after another on the same text. Each thread holds on to its last text
+    until it analyzes the next one.
+    """
+
+    def __init__(self):
+        self._compiled: Dict[Tuple[str, int], "regex.Pattern"] = {}
+        self._compile_lock = threading.Lock()
+        self._local = threading.local()
+
+    def install(self, registry: RecognizerRegistry) -> int:
+        """
+        Replaces the registry's plain PatternRecognizers with scanned stand-ins, keeping their
+        order. Recognizers that override `analyze` keep scanning on their own.
+
+        Returns:
+            int: The number of recognizers now served by this scanner
+        """
+        installed = 0
+        recognizers = []
+        for recognizer in registry.recognizers:
+            if isinstance(recognizer, PatternRecognizer) and type(recognizer).analyze is PatternRecognizer.analyze:
+                recognizer = ScannedPatternRecognizer(recognizer, self)
+                installed += 1
+            recognizers.append(recognizer)
+        registry.recognizers = recognizers
+        logger.info(f"Pattern scanner installed for {installed} recognizers.")
+        return installed
+
+    def _compile(self, pattern: str, flags: int) -> "regex.Pattern":
+        key = (pattern, flags)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            with self._compile_lock:
+                compiled = self._compiled.get(key)
+                if compiled is None:
+                    compiled = regex.compile(pattern, flags)
+                    self._compiled[key] = compiled
+        return compiled
+
+    def _matches(self, text: str, pattern: str, flags: int) -> List[Tuple[int, int]]:
+        """
+        Returns the non-empty match spans of a pattern, scanning the text only on first use.
+        """
+        local = self._local
+        if getattr(local, "text", None) is not text:
+            local.text = text
+            local.matches = {}
+        key = (pattern, flags)
+        spans = local.matches.get(key)
+        if spans is None:
+            spans = [match.span() for match in self._compile(pattern, flags).finditer(text) if match.end() > match.start()]
+            local.matches[key] = spans
+        return spans
+
+    def analyze(self, stand_in: ScannedPatternRecognizer, text: str, flags: int) -> List[RecognizerResult]:
+        """
+        Builds the results of one recognizer from the shared scans. Mirrors the scoring in
+        PatternRecognizer's own pattern analysis, so the results are identical.
+        """
+        recognizer = stand_in.recognizer
+        entity_type = stand_in.supported_entities[0]
+        results = []
+        for pattern in stand_in.patterns:
+            for start, end in self._matches(text, pattern.regex, flags):
+                current_match = text[start:end]
+                score = pattern.score
+                validation_result = recognizer.validate_result(current_match)
+                description = recognizer.build_regex_explanation(
+                    stand_in.name, pattern.name, pattern.regex, score, validation_result
+                )
+                pattern_result = RecognizerResult(
+                    entity_type=entity_type,
+                    start=start,
+                    end=end,
+                    score=score,
+                    analysis_explanation=description,
+                    recognition_metadata={
+                        RecognizerResult.RECOGNIZER_NAME_KEY: stand_in.name,
+                        RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: stand_in.id,
+                    },
+                )
+
+                if validation_result is not None:
+                    pattern_result.score = EntityRecognizer.MAX_SCORE if validation_result else EntityRecognizer.MIN_SCORE
+
+                invalidation_result = recognizer.invalidate_result(current_match)
+                if invalidation_result is not None and invalidation_result:
+                    pattern_result.score = EntityRecognizer.MIN_SCORE
+
+                if pattern_result.score > EntityRecognizer.MIN_SCORE:
+                    results.append(pattern_result)
+                description.score = pattern_result.score
+
+        return EntityRecognizer.remove_duplicates(results)
@@ -1,52 +1,299 @@
+import hashlib
 import logging
+import threading
 from collections import defaultdict
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
 
 from presidio_analyzer import AnalyzerEngine, RecognizerResult
+from presidio_analyzer.context_aware_enhancers import ContextAwareEnhancer
+from presidio_analyzer.nlp_engine import NlpArtifacts, SpacyNlpEngine
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
 from presidio_anonymizer import AnonymizerEngine
 
+from app.config import AnalysisProfile
+from app.services.analysis_errors import AnalysisProfileError, UnknownAnalysisProfileError
+from app.services.chunking_service import TextChunk
+from app.services.metrics import ANALYZE_SECONDS, ANONYMIZE_SECONDS, RESOLVE_CONFLICTS_SECONDS
+from app.services.pattern_scanner import PatternScanner
+from app.services.recognizer_prefilter import RecognizerPrefilter
+from app.services.recognizer_stats import RecognizerStats
+from app.services.startup_timeline import StartupTimeline, timed_phase
+from app.services.tokenmap_store import TokenMapData
+
 logger = logging.getLogger(__name__)
 
 
+class _NoContextEnhancer(ContextAwareEnhancer):
+    """
+    Context enhancer for profiles with context enhancement turned off.
+    """
+
+    def __init__(self):
+        super().__init__(
+            context_similarity_factor=0,
+            min_score_with_context_similarity=0,
+            context_prefix_count=0,
+            context_suffix_count=0,
+        )
+
+    def enhance_using_context(self, text, raw_results, nlp_artifacts, recognizers, context=None):
+        return raw_results
+
+
+class TrimmedSpacyNlpEngine(SpacyNlpEngine):
+    """
+    SpacyNlpEngine that loads only the pipeline components PII detection needs.
+
+    Excluded components are never loaded, which saves both their memory and their run time.
+    Disabled components are loaded but skipped. Presidio's own engine always loads the
+    full pipeline and only disables the parser.
+    """
+
+    def __init__(self, models: Dict[str, str], exclude: List[str], disable: List[str]):
+        import spacy
+
+        self.nlp = {}
+        for language, model_name in models.items():
+            nlp = spacy.load(model_name, exclude=exclude, disable=disable)
+            logger.info(f"Loaded spaCy model {model_name} with components {nlp.pipe_names}.")
+            self.nlp[language] = nlp
+
+
+class _ProfileEngine(NamedTuple):
+    analyzer: AnalyzerEngine
+    nlp_entities: Set[str]
+    prefilter: Optional[RecognizerPrefilter]
+
+
 class PresidioService:
     """
     Service for interacting with Microsoft Presidio for PII detection and anonymization.
+
+    Every analysis profile gets its own AnalyzerEngine. The default profile is loaded up
+    front; the others are loaded the first time a request selects them and cached from then
+    on, so profiles nobody uses never load a spaCy model.
     """
 
-    def __init__(self, supported_entities: List[str]):
+    def __init__(
+        self,
+        supported_entities: List[str],
+        profiles: Optional[Dict[str, AnalysisProfile]] = None,
+        default_profile: str = "accurate",
+        timeline: Optional[StartupTimeline] = None,
+        recognizer_stats: bool = False,
+    ):
+        self.profiles = dict(profiles) if profiles else {default_profile: AnalysisProfile()}
+        if default_profile not in self.profiles:
+            raise ValueError(f"Default analysis profile '{default_profile}' is not configured.")
+        self.default_profile = default_profile
+        self._engines: Dict[str, _ProfileEngine] = {}
+        # Profiles whose engine failed to load, with the reason. Loading is not retried, since
+        # a missing model does not appear while the process runs.
+        self._failed_profiles: Dict[str, str] = {}
+        self._engines_lock = threading.Lock()
+        # Optional per-recognizer timing and hit-rate counters, shared by all profiles.
+        self.recognizer_stats = RecognizerStats() if recognizer_stats else None
+
+        engine = self._get_engine(default_profile, timeline=timeline)
+        self.analyzer = engine.analyzer
+        self.anonymizer = AnonymizerEngine()
+        self.supported_entities = supported_entities
+        self.registry_version = self._compute_registry_version()
+
+        # Entity types that only NER-based recognizers can find. Requests for other types
+        # are served by pattern recognizers alone and skip the spaCy pipeline.
+        self.nlp_entities = engine.nlp_entities
+        logger.info(f"PresidioService initialized with custom recognizer registry.")
+
+    def _build_engine(self, profile: AnalysisProfile, timeline: Optional[StartupTimeline] = None) -> _ProfileEngine:
+        """
+        Builds the recognizer registry and analyzer engine for a profile. Loading the
+        registry and the spaCy model are recorded as phases on the timeline, if given.
+        """
         # --- Phase 4: Advanced Conflict Resolution and Recognizer Tuning ---
         from presidio_analyzer.recognizer_registry import RecognizerRegistry
         from presidio_analyzer.pattern import Pattern
         from presidio_analyzer.pattern_recognizer import PatternRecognizer
 
-        registry = RecognizerRegistry()
-        registry.load_predefined_recognizers(languages=["en"])
-
-        # -- 4.3: Fine-Tune the Recognizer Registry --
-        # Remove recognizers that cause false positives on numeric data.
-        registry.remove_recognizer("UsLicenseRecognizer")
-        registry.remove_recognizer("UsPassportRecognizer")
+        with timed_phase(timeline, "registry load"):
+            registry = RecognizerRegistry()
+            registry.load_predefined_recognizers(languages=["en"])
+
+            # -- 4.3: Fine-Tune the Recognizer Registry --
+            # Remove recognizers that cause false positives on numeric data.
+            registry.remove_recognizer("UsLicenseRecognizer")
+            registry.remove_recognizer("UsPassportRecognizer")
+
+            # Add a custom recognizer for 9-digit bank account numbers with a higher score.
+            bank_acct_pattern = Pattern(name="Bank Account Pattern (9 digits)", regex=r"\b\d{9}\b", score=0.99) # Score increased
+            custom_bank_acct_recognizer = PatternRecognizer(
+                supported_entity="US_BANK_ACCOUNT_NUMBER",
+                patterns=[bank_acct_pattern],
+                name="Custom Bank Account Recognizer"
+            )
+            registry.add_recognizer(custom_bank_acct_recognizer)
 
-        # Add a custom recognizer for 9-digit bank account numbers with a higher score.
-        bank_acct_pattern = Pattern(name="Bank Account Pattern (9 digits)", regex=r"\b\d{9}\b", score=0.99) # Score increased
-        custom_bank_acct_recognizer = PatternRecognizer(
-            supported_entity="US_BANK_ACCOUNT_NUMBER",
-            patterns=[bank_acct_pattern],
-            name="Custom Bank Account Recognizer"
-        )
-        registry.add_recognizer(custom_bank_acct_recognizer)
+            if profile.recognizers is not None:
+                registry.recognizers = [
+                    recognizer for recognizer in registry.recognizers if recognizer.name in profile.recognizers
+                ]
+            if profile.pattern_scanner:
+                PatternScanner().install(registry)
 
         # Initialize the AnalyzerEngine with our custom registry
         try:
-            self.analyzer = AnalyzerEngine(registry=registry, supported_languages=["en"])
+            with timed_phase(timeline, "spaCy load"):
+                nlp_engine = TrimmedSpacyNlpEngine(
+                    models={"en": profile.model}, exclude=profile.spacy_exclude, disable=profile.spacy_disable
+                )
+            analyzer = AnalyzerEngine(
+                registry=registry,
+                nlp_engine=nlp_engine,
+                supported_languages=["en"],
+                default_score_threshold=profile.score_threshold,
+                context_aware_enhancer=None if profile.context_enhancement else _NoContextEnhancer(),
+            )
         except Exception as e:
             logger.error(f"Error initializing Presidio AnalyzerEngine: {e}")
             raise # Re-raise to ensure startup failure is propagated
 
-        self.anonymizer = AnonymizerEngine()
-        self.supported_entities = supported_entities
-        logger.info(f"PresidioService initialized with custom recognizer registry.")
+        if self.recognizer_stats is not None:
+            self.recognizer_stats.install(registry.recognizers, nlp_engine)
 
+        nlp_entities = {
+            entity
+            for recognizer in registry.recognizers
+            if isinstance(recognizer, SpacyRecognizer)
+            for entity in recognizer.supported_entities
+        }
+        prefilter = RecognizerPrefilter(registry.recognizers) if profile.prefilter else None
+        return _ProfileEngine(analyzer, nlp_entities, prefilter)
+
+    def resolve_profile(self, profile: Optional[str] = None) -> str:
+        """
+        Returns the name of the profile to use, falling back to the default profile.
+
+        Raises:
+            UnknownAnalysisProfileError: If the profile is not configured.
+        """
+        if profile is None:
+            return self.default_profile
+        if profile not in self.profiles:
+            raise UnknownAnalysisProfileError(
+                f"Unknown analysis profile '{profile}'. Available profiles: {', '.join(sorted(self.profiles))}."
+            )
+        return profile
+
+    def _get_engine(self, profile: Optional[str] = None, timeline: Optional[StartupTimeline] = None) -> _ProfileEngine:
+        """
+        Returns the engine of a profile, loading it on first use.
+        """
+        name = self.resolve_profile(profile)
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+
+        with self._engines_lock:
+            engine = self._engines.get(name)
+            if engine is None:
+                if name in self._failed_profiles:
+                    raise AnalysisProfileError(self._failed_profiles[name])
+                logger.info(f"Loading analysis profile '{name}' ({self.profiles[name].model})...")
+                try:
+                    engine = self._build_engine(self.profiles[name], timeline=timeline)
+                except Exception as e:
+                    self._failed_profiles[name] = f"Failed to load analysis profile '{name}': {e}"
+                    logger.error(self._failed_profiles[name])
+                    raise AnalysisProfileError(self._failed_profiles[name]) from e
+                self._engines[name] = engine
+        return engine
+
+    def _prefilter(self, engine: _ProfileEngine, text: str, entities: List[str]) -> List[str]:
+        """
+        Drops the entities that no recognizer of the engine can find in the text.
+        """
+        if engine.prefilter is None:
+            return entities
+        return engine.prefilter.filter_entities(text, entities)
+
+    def get_prefilter_stats(self) -> Dict[str, Dict]:
+        """
+        Returns the prefilter skip counters of every loaded profile.
+        """
+        return {
+            name: engine.prefilter.get_stats()
+            for name, engine in sorted(self._engines.items())
+            if engine.prefilter is not None
+        }
+
+    def loaded_profiles(self) -> List[str]:
+        """
+        Names of the profiles whose engines are currently loaded.
+        """
+        return sorted(self._engines)
+
+    def profile_version(self, profile: Optional[str] = None) -> str:
+        """
+        Version of a profile's analysis results, for cache keys. It covers the recognizer
+        registry and the profile's settings and does not require the profile to be loaded.
+        """
+        name = self.resolve_profile(profile)
+        payload = f"{self.registry_version}\n{name}\n{self.profiles[name].model_dump_json()}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _compute_registry_version(self) -> str:
+        """
+        Fingerprints the loaded recognizers and NLP engine. Analysis results cached under one
+        version are never reused once the registry or its patterns change.
+        """
+        parts = [type(self.analyzer.nlp_engine).__name__]
+        for recognizer in sorted(self.analyzer.registry.recognizers, key=lambda r: r.name):
+            patterns = getattr(recognizer, "patterns", None) or []
+            parts.append(repr((
+                recognizer.name,
+                sorted(recognizer.supported_entities),
+                getattr(recognizer, "version", ""),
+                [(pattern.regex, pattern.score) for pattern in patterns],
+                getattr(recognizer, "context", None),
+            )))
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    def requires_nlp(self, entities: Optional[List[str]] = None, profile: Optional[str] = None) -> bool:
+        """
+        True if any of the requested entity types needs the spaCy NER pipeline.
+        """
+        if entities is None:
+            entities = self.supported_entities
+        return not self._get_engine(profile).nlp_entities.isdisjoint(entities)
+
+    def _pattern_only_artifacts(self, text: str, entities: List[str], profile: Optional[str] = None) -> Optional[NlpArtifacts]:
+        """
+        Returns lightweight NLP artifacts when no requested entity needs NER, or None if the
+        full pipeline has to run.
+
+        Pattern recognizers only use the NLP artifacts for context enhancement, which looks
+        at the words around a match. Running the spaCy tokenizer alone provides those words
+        at a fraction of the cost of the full pipeline. Lowercased token text stands in for
+        the lemmas, which would need the tagger.
+        """
+        if self.requires_nlp(entities, profile):
+            return None
+        nlp_engine = self._get_engine(profile).analyzer.nlp_engine
+        nlp = getattr(nlp_engine, "nlp", {}).get("en")
+        if nlp is None:
+            return None
+
+        doc = nlp.make_doc(text)
+        return NlpArtifacts(
+            entities=[],
+            tokens=doc,
+            tokens_indices=[token.idx for token in doc],
+            lemmas=[token.lower_ for token in doc],
+            nlp_engine=nlp_engine,
+            language="en",
+        )
+
+    @RESOLVE_CONFLICTS_SECONDS.time()
     def _resolve_conflicts(self, results: List[RecognizerResult]) -> List[RecognizerResult]:
         """
         Resolves overlapping recognizer results by keeping the one with the highest score.
@@ -75,22 +322,38 @@ class PresidioService:
                 # Overlap detected. The list is sorted by score, so the `last_result`
                 # which came first at this position, is the one to keep.
                 logger.debug(f"Conflict detected. Ignoring '{result.entity_type}' which overlaps with '{last_result.entity_type}'.")
-        
+
+        if self.recognizer_stats is not None:
+            self.recognizer_stats.record_conflicts(results, filtered_results)
         return filtered_results
 
-    def analyze_text(self, text: str, entities: Optional[List[str]] = None) -> List[RecognizerResult]:
+    def analyze_text(
+        self, text: str, entities: Optional[List[str]] = None, raise_errors: bool = False, profile: Optional[str] = None
+    ) -> List[RecognizerResult]:
         """
         Analyzes text for PII, resolving any conflicting/overlapping entities.
+        Errors are logged and yield an empty list unless `raise_errors` is set. A profile
+        that cannot be loaded always raises AnalysisProfileError.
         """
         if not text:
             return []
 
         if entities is None:
             entities = self.supported_entities
+        engine = self._get_engine(profile)
 
         try:
             # 1. Get all potential results from the analyzer
-            initial_results = self.analyzer.analyze(text=text, entities=entities, language='en')
+            entities_to_run = self._prefilter(engine, text, entities)
+            if not entities_to_run:
+                return []
+            with ANALYZE_SECONDS.time(kind="text"):
+                initial_results = engine.analyzer.analyze(
+                    text=text,
+                    entities=entities_to_run,
+                    language='en',
+                    nlp_artifacts=self._pattern_only_artifacts(text, entities, profile),
+                )
             logger.debug(f"Analyzed text and found {len(initial_results)} initial entities.")
 
             # 2. Resolve conflicts to get a clean list
@@ -101,56 +364,131 @@ class PresidioService:
 
         except Exception as e:
             logger.error(f"An error occurred during text analysis: {e}")
+            if raise_errors:
+                raise
             # Return an empty list or re-raise, depending on desired failure behavior.
             # For service stability, returning an empty list is safer.
             return []
 
-    def filter_results_by_token(self, original_text: str, existing_results: List[Dict], token_to_remove: str, token_mapping: Dict[str, Dict]) -> List[RecognizerResult]:
+    def analyze_chunk(
+        self, window_text: str, chunk: TextChunk, entities: Optional[List[str]] = None, profile: Optional[str] = None
+    ) -> List[RecognizerResult]:
         """
-        Filters out the RecognizerResult that corresponds to a specific token.
-        This is used when reverting a token back to its original value.
-        
+        Analyzes one chunk of a larger document.
+
         Args:
-            original_text: The original document text
-            existing_results: List of existing result dictionaries
-            token_to_remove: The token string to remove (e.g., '[PERSON_1]')
-            token_mapping: The current token mapping to find the original value
-        
+            window_text: The document text between chunk.window_start and chunk.window_end
+            chunk: The chunk being analyzed
+            entities: The entity types to look for
+            profile: The analysis profile to use, or None for the default profile
+
         Returns:
-            List[RecognizerResult]: Filtered list of recognizer results
-        """
-        if token_to_remove not in token_mapping:
-            logger.warning(f"Token {token_to_remove} not found in token mapping.")
-            return [RecognizerResult(
-                entity_type=res_dict["entity_type"],
-                start=res_dict["start"],
-                end=res_dict["end"],
-                score=res_dict["score"],
-            ) for res_dict in existing_results]
-        
-        original_value = token_mapping[token_to_remove]["original_value"]
-        
-        # Convert existing_results (List[Dict]) to List[RecognizerResult], excluding the token to revert
-        filtered_results = []
-        for res_dict in existing_results:
-            text_span = original_text[res_dict["start"]:res_dict["end"]]
-            # Skip the result that matches the original value of the token we're reverting
-            if text_span == original_value:
-                logger.debug(f"Filtering out result for token {token_to_remove} at position {res_dict['start']}-{res_dict['end']}")
+            List[RecognizerResult]: Unresolved results in document offsets, limited to the
+            entities that start inside the chunk's core region.
+        """
+        if entities is None:
+            entities = self.supported_entities
+        engine = self._get_engine(profile)
+
+        try:
+            entities_to_run = self._prefilter(engine, window_text, entities)
+            initial_results = []
+            if entities_to_run:
+                with ANALYZE_SECONDS.time(kind="chunk"):
+                    initial_results = engine.analyzer.analyze(
+                        text=window_text,
+                        entities=entities_to_run,
+                        language='en',
+                        nlp_artifacts=self._pattern_only_artifacts(window_text, entities, profile),
+                    )
+        except Exception as e:
+            # Unlike analyze_text, don't swallow the error: a silently empty chunk would
+            # leave a whole section of the document unredacted.
+            logger.error(f"An error occurred during analysis of chunk {chunk.core_start}-{chunk.core_end}: {e}")
+            raise
+
+        owned_results = []
+        for result in initial_results:
+            result.start += chunk.window_start
+            result.end += chunk.window_start
+            if chunk.core_start <= result.start < chunk.core_end:
+                owned_results.append(result)
+        return owned_results
+
+    def merge_chunk_results(self, chunk_results: List[List[RecognizerResult]]) -> List[RecognizerResult]:
+        """
+        Stitches the results of `analyze_chunk` back into a single document-level list.
+
+        An entity crossing a seam is seen by the windows on both sides of it, but only the
+        chunk whose core contains its start keeps it, so each entity survives once. Conflicts
+        are then resolved exactly as in a single pass over the whole text.
+        """
+        stitched_results = [result for results in chunk_results for result in results]
+        final_results = self._resolve_conflicts(stitched_results)
+        logger.debug(f"Stitched {len(chunk_results)} chunks into {len(final_results)} entities.")
+        return final_results
+
+    @ANALYZE_SECONDS.time(kind="batch")
+    def analyze_batch(
+        self, texts: List[str], entities: Optional[List[str]] = None, profile: Optional[str] = None
+    ) -> List[Union[List[RecognizerResult], Exception]]:
+        """
+        Analyzes several texts in one go, running the spaCy pipeline over them with `nlp.pipe`
+        batching before the recognizers are applied to each text.
+
+        Failures are isolated per text: the returned list holds either the resolved results
+        or the exception raised for the text at the same index.
+        """
+        if entities is None:
+            entities = self.supported_entities
+        engine = self._get_engine(profile)
+        analyzer = engine.analyzer
+
+        outcomes: List[Optional[Union[List[RecognizerResult], Exception]]] = [None] * len(texts)
+        try:
+            if self.requires_nlp(entities, profile):
+                nlp_artifacts_batch = analyzer.nlp_engine.process_batch(texts=texts, language='en')
+            else:
+                nlp_artifacts_batch = ((text, self._pattern_only_artifacts(text, entities, profile)) for text in texts)
+            for index, (_, nlp_artifacts) in enumerate(nlp_artifacts_batch):
+                try:
+                    entities_to_run = self._prefilter(engine, texts[index], entities)
+                    initial_results = []
+                    if entities_to_run:
+                        initial_results = analyzer.analyze(
+                            text=texts[index], entities=entities_to_run, language='en', nlp_artifacts=nlp_artifacts
+                        )
+                    outcomes[index] = self._resolve_conflicts(initial_results)
+                except Exception as e:
+                    logger.error(f"An error occurred during batch analysis of item {index}: {e}")
+                    outcomes[index] = e
+        except Exception as e:
+            # A single bad document can break the nlp.pipe generator. Analyze whatever is
+            # left one by one so the failure stays confined to that document.
+            logger.warning(f"Batch NLP processing failed, analyzing remaining texts individually: {e}")
+
+        for index, outcome in enumerate(outcomes):
+            if outcome is not None:
                 continue
-            
-            filtered_results.append(
-                RecognizerResult(
-                    entity_type=res_dict["entity_type"],
-                    start=res_dict["start"],
-                    end=res_dict["end"],
-                    score=res_dict["score"],
-                )
-            )
-        
-        logger.info(f"Filtered results: removed token {token_to_remove}, {len(filtered_results)} results remaining.")
-        return filtered_results
+            try:
+                entities_to_run = self._prefilter(engine, texts[index], entities)
+                initial_results = []
+                if entities_to_run:
+                    initial_results = analyzer.analyze(
+                        text=texts[index],
+                        entities=entities_to_run,
+                        language='en',
+                        nlp_artifacts=self._pattern_only_artifacts(texts[index], entities, profile),
+                    )
+                outcomes[index] = self._resolve_conflicts(initial_results)
+            except Exception as e:
+                logger.error(f"An error occurred during analysis of batch item {index}: {e}")
+                outcomes[index] = e
+
+        logger.debug(f"Batch analysis complete for {len(texts)} texts.")
+        return outcomes
 
+    @ANONYMIZE_SECONDS.time()
     def anonymize_text(self, text: str, analyzer_results: List[RecognizerResult]) -> Tuple[str, Dict[str, Dict], List[Dict]]:
         """
         Anonymizes the given text by replacing detected PII with unique, consistent tokens.
@@ -172,11 +510,41 @@ class PresidioService:
                 for res in analyzer_results
             ]
 
-        consistency_map = {}
-        entity_counters = defaultdict(int)
-        
         sorted_results = sorted(analyzer_results, key=lambda x: x.start)
+        token_mapping = {}
+        anonymized_text, tokens_info = self.anonymize_segment(
+            text, 0, len(text), sorted_results, {}, defaultdict(int), token_mapping
+        )
+
+        logger.info(f"anonymize_text: tokens_info constructed: {tokens_info}") # <--- Add this line
+
+        return anonymized_text, token_mapping, tokens_info
+
+    def anonymize_segment(
+        self,
+        text: str,
+        segment_start: int,
+        segment_end: int,
+        sorted_results: List[RecognizerResult],
+        consistency_map: Dict[str, Dict],
+        entity_counters: Dict[str, int],
+        token_mapping: Dict[str, Dict],
+    ) -> Tuple[str, List[Dict]]:
+        """
+        Anonymizes text[segment_start:segment_end], continuing the token numbering held in
+        `consistency_map` and `entity_counters`. New tokens are added to `token_mapping`.
+        Calling this on consecutive segments produces the same tokens as anonymize_text
+        on the whole document.
+
+        Args:
+            sorted_results: Non-overlapping results inside the segment, sorted by start
+            consistency_map: Original value -> token details, shared across segments
+            entity_counters: Entity type -> last token number used, shared across segments
+            token_mapping: Token -> original value details, shared across segments
 
+        Returns:
+            Tuple[str, List[Dict]]: The anonymized segment and its token occurrences
+        """
         for result in sorted_results:
             original_pii = text[result.start:result.end]
             if original_pii not in consistency_map:
@@ -188,31 +556,26 @@ class PresidioService:
                     "entity_type": entity_type,
                     "score": result.score,
                 }
+                token_mapping[token] = {
+                    "original_value": original_pii,
+                    "entity_type": entity_type,
+                    "score": result.score,
+                }
 
         output_parts = []
-        last_end = 0
+        last_end = segment_start
         for result in sorted_results:
             output_parts.append(text[last_end:result.start])
             original_pii = text[result.start:result.end]
             output_parts.append(consistency_map[original_pii]["token"])
             last_end = result.end
-        
-        output_parts.append(text[last_end:])
-        anonymized_text = "".join(output_parts)
 
-        token_mapping = {
-            details["token"]: {
-                "original_value": original_pii,
-                "entity_type": details["entity_type"],
-                "score": details["score"],
-            }
-            for original_pii, details in consistency_map.items()
-        }
+        output_parts.append(text[last_end:segment_end])
 
         tokens_info = [
             {
                 "token": consistency_map[text[res.start:res.end]]["token"],
-                "original_value": text[res.start:res.end], # <--- Add this
+                "original_value": text[res.start:res.end],
                 "entity_type": res.entity_type,
                 "start": res.start,
                 "end": res.end,
@@ -221,113 +584,187 @@ class PresidioService:
             for res in sorted_results
         ]
 
-        logger.info(f"anonymize_text: tokens_info constructed: {tokens_info}") # <--- Add this line
+        return "".join(output_parts), tokens_info
 
-        return anonymized_text, token_mapping, tokens_info
+    def anonymize_incremental(
+        self,
+        text: str,
+        kept_occurrences: List[Dict],
+        new_results: List[RecognizerResult],
+        previous_mappings: Dict[str, Dict],
+    ) -> Tuple[str, Dict[str, Dict], List[Dict]]:
+        """
+        Anonymizes an edited version of a previously sanitized document.
+
+        Occurrences carried over from unchanged paragraphs, and reviewer tokens found in the
+        changed ones, keep their tokens. New results reuse the previous token of the same
+        original value, and otherwise continue the previous numbering, so tokens stay stable
+        across edits.
+
+        Args:
+            text: The new document text
+            kept_occurrences: Occurrences whose token is already decided, at offsets in `text`
+            new_results: Resolved results from the re-analyzed regions, not overlapping kept occurrences
+            previous_mappings: The token mappings of the previous version
+
+        Returns:
+            Tuple[str, Dict[str, Dict], List[Dict]]: The sanitized text, the mappings of all
+            tokens still in use, and the token occurrences
+        """
+        consistency_map = {}
+        entity_counters = defaultdict(int)
+        for token, details in previous_mappings.items():
+            consistency_map.setdefault(details["original_value"], {"token": token})
+            entity_type, _, number = token[1:-1].rpartition("_")
+            if number.isdigit():
+                entity_counters[entity_type] = max(entity_counters[entity_type], int(number))
+
+        occurrences = [
+            (occurrence["start"], occurrence["end"], occurrence["entity_type"], occurrence["score"], occurrence["token"])
+            for occurrence in kept_occurrences
+        ]
+        occurrences.extend((r.start, r.end, r.entity_type, r.score, None) for r in new_results)
+        occurrences.sort(key=lambda occurrence: occurrence[0])
+
+        token_mapping = {}
+        tokens_info = []
+        output_parts = []
+        last_end = 0
+        for start, end, entity_type, score, token in occurrences:
+            original_pii = text[start:end]
+            if token is None:
+                if original_pii not in consistency_map:
+                    entity_counters[entity_type] += 1
+                    consistency_map[original_pii] = {"token": f"[{entity_type}_{entity_counters[entity_type]}]"}
+                token = consistency_map[original_pii]["token"]
+            if token not in token_mapping:
+                previous_details = previous_mappings.get(token)
+                token_mapping[token] = dict(previous_details) if previous_details else {
+                    "original_value": original_pii,
+                    "entity_type": entity_type,
+                    "score": score,
+                }
+
+            output_parts.append(text[last_end:start])
+            output_parts.append(token)
+            last_end = end
+            tokens_info.append({
+                "token": token,
+                "original_value": original_pii,
+                "entity_type": entity_type,
+                "start": start,
+                "end": end,
+                "score": score,
+            })
+        output_parts.append(text[last_end:])
+
+        return "".join(output_parts), token_mapping, tokens_info
 
     def integrate_manual_token(
         self,
-        original_text: str,
-        existing_results: List[Dict],
+        token_map_data: TokenMapData,
         manual_token_info: Dict
-    ) -> Tuple[List[RecognizerResult], int]:
+    ) -> Tuple[Dict[str, Dict], List[Dict], int]:
         """
-        Integrates a manually provided token into the list of existing RecognizerResults.
+        Builds the occurrences of a manually provided token for an existing token map.
         Finds all exact, case-sensitive occurrences of the selected text and tokenizes them,
         but ONLY if they don't overlap with existing tokens (automatic or manual).
-        
+
+        Overlaps are looked up in the token map's sorted interval index, so each candidate
+        costs O(log n) instead of a scan over every stored span. Existing tokens keep their
+        numbers; a value that already has a token reuses it, along with its entity type.
+
+        Raises:
+            ValueError: If the selection overlaps an existing token, or no occurrence of the
+                selected text can be tokenized.
+
         Returns:
-            Tuple[List[RecognizerResult], int]: A tuple of (final_results, additional_occurrences_count)
+            Tuple[Dict[str, Dict], List[Dict], int]: The new token mappings, the new occurrences
+            sorted by start, and the number of additional occurrences
         """
+        original_text = token_map_data.original_text
         text_to_tokenize = manual_token_info["text_to_tokenize"]
         entity_type = manual_token_info["entity_type"]
         manual_start = manual_token_info["start"]
         manual_end = manual_token_info["end"]
-        
-        # Convert existing_results (List[Dict]) to List[RecognizerResult]
-        converted_existing_results = []
-        for res_dict in existing_results:
-            converted_existing_results.append(
-                RecognizerResult(
-                    entity_type=res_dict["entity_type"],
-                    start=res_dict["start"],
-                    end=res_dict["end"],
-                    score=res_dict["score"],
-                )
-            )
-        
+
         # Check if the user's selected text overlaps with any existing token
-        for existing_result in converted_existing_results:
-            # Check for any overlap: two ranges overlap if start1 < end2 AND start2 < end1
-            if manual_start < existing_result.end and existing_result.start < manual_end:
-                logger.warning(
-                    f"Cannot manually tokenize: selected text ({manual_start}-{manual_end}) "
-                    f"overlaps with existing {existing_result.entity_type} token ({existing_result.start}-{existing_result.end})"
-                )
-                raise ValueError(
-                    f"Cannot tokenize text that overlaps with an existing token. "
-                    f"The selected text overlaps with an existing {existing_result.entity_type} token. "
-                    f"Please revert the existing token first if you want to change it."
-                )
-        
+        existing_result = token_map_data.find_overlapping(manual_start, manual_end)
+        if existing_result:
+            logger.warning(
+                f"Cannot manually tokenize: selected text ({manual_start}-{manual_end}) "
+                f"overlaps with existing {existing_result['entity_type']} token ({existing_result['start']}-{existing_result['end']})"
+            )
+            raise ValueError(
+                f"Cannot tokenize text that overlaps with an existing token. "
+                f"The selected text overlaps with an existing {existing_result['entity_type']} token. "
+                f"Please revert the existing token first if you want to change it."
+            )
+
+        token = token_map_data.token_for_value(text_to_tokenize)
+        is_new_token = token is None
+        if is_new_token:
+            token = token_map_data.next_token(entity_type)
+        else:
+            entity_type = token_map_data.mappings[token]["entity_type"]
+
         # Find all exact, case-sensitive occurrences of the text
-        manual_results = []
+        new_occurrences = []
         search_start = 0
-        
+
         while True:
             index = original_text.find(text_to_tokenize, search_start)
             if index == -1:
                 break
-            
+
             # Verify it's a complete match (not part of a larger word)
             # Check if preceded by word boundary
             if index > 0 and original_text[index - 1].isalnum():
                 search_start = index + 1
                 continue
-            
+
             # Check if followed by word boundary
             end_index = index + len(text_to_tokenize)
             if end_index < len(original_text) and original_text[end_index].isalnum():
                 search_start = index + 1
                 continue
-            
+
             # Check if this occurrence overlaps with any existing token
-            overlaps_with_existing = False
-            for existing_result in converted_existing_results:
-                if index < existing_result.end and existing_result.start < end_index:
-                    overlaps_with_existing = True
-                    logger.debug(
-                        f"Skipping occurrence at {index}-{end_index}: overlaps with existing "
-                        f"{existing_result.entity_type} token at {existing_result.start}-{existing_result.end}"
-                    )
-                    break
-            
-            if not overlaps_with_existing:
-                # Create a RecognizerResult for this occurrence
-                manual_results.append(
-                    RecognizerResult(
-                        entity_type=entity_type,
-                        start=index,
-                        end=end_index,
-                        score=1.0,  # Assign highest score
-                        analysis_explanation="Manually added token"
-                    )
+            existing_result = token_map_data.find_overlapping(index, end_index)
+            if existing_result:
+                logger.debug(
+                    f"Skipping occurrence at {index}-{end_index}: overlaps with existing "
+                    f"{existing_result['entity_type']} token at {existing_result['start']}-{existing_result['end']}"
                 )
-            
+            else:
+                new_occurrences.append({
+                    "token": token,
+                    "original_value": text_to_tokenize,
+                    "entity_type": entity_type,
+                    "start": index,
+                    "end": end_index,
+                    "score": 1.0,  # Assign highest score
+                })
+
             search_start = end_index
-        
+
+        if not new_occurrences:
+            # A mapping without occurrences would use up a token number and be remembered
+            # as a reviewer decision.
+            raise ValueError(
+                f"No occurrence of '{text_to_tokenize}' can be tokenized. It only appears inside "
+                f"a larger word or overlapping an existing token."
+            )
+        new_mappings = {}
+        if is_new_token:
+            new_mappings[token] = {"original_value": text_to_tokenize, "entity_type": entity_type, "score": 1.0}
+
         # Calculate additional occurrences (total found minus the original selection)
-        additional_occurrences = max(0, len(manual_results) - 1)
-        
+        additional_occurrences = max(0, len(new_occurrences) - 1)
+
         logger.info(
-            f"Found {len(manual_results)} total non-overlapping occurrences of '{text_to_tokenize}' "
+            f"Found {len(new_occurrences)} total non-overlapping occurrences of '{text_to_tokenize}' "
             f"({additional_occurrences} additional)"
         )
 
-        # Combine existing and manual results
-        combined_results = converted_existing_results + manual_results
-
-        # Sort by start position for consistency
-        combined_results.sort(key=lambda x: x.start)
-
-        return combined_results, additional_occurrences
+        return new_mappings, new_occurrences, additional_occurrences
@@ -0,0 +1,68 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from app.services.startup_timeline import StartupTimeline
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceReadiness:
+    """
+    Tracks the background loading of the analysis services.
+
+    The server accepts connections while the models load; requests that need the services
+    are turned away until loading has finished. Progress is read from the startup
+    timeline, as the share of the expected loading phases that have completed.
+    """
+
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, timeline: StartupTimeline, expected_phases: List[str], retry_after_seconds: int = 2):
+        self.timeline = timeline
+        self.expected_phases = list(expected_phases)
+        self.retry_after_seconds = retry_after_seconds
+        self.status = self.LOADING
+        self.error: Optional[str] = None
+        self._ready_event = threading.Event()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == self.READY
+
+    def mark_ready(self):
+        self.status = self.READY
+        self._ready_event.set()
+        logger.info("Analysis services are ready.")
+
+    def mark_failed(self, error: Exception):
+        self.status = self.FAILED
+        self.error = str(error)
+        self._ready_event.set()
+        logger.error(f"Loading the analysis services failed: {error}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until loading has finished, successfully or not. Returns whether the
+        services are ready.
+        """
+        self._ready_event.wait(timeout)
+        return self.is_ready
+
+    def as_dict(self) -> Dict:
+        """
+        Loading progress, as reported by the readiness endpoint.
+        """
+        completed = {phase["name"] for phase in self.timeline.phases()}
+        completed_phases = [name for name in self.expected_phases if name in completed]
+        return {
+            "status": self.status,
+            "ready": self.is_ready,
+            "current_phase": self.timeline.current_phase,
+            "completed_phases": completed_phases,
+            "progress": round(len(completed_phases) / len(self.expected_phases), 2) if self.expected_phases else 1.0,
+            "elapsed_ms": self.timeline.as_dict()["total_ms"],
+            "error": self.error,
+        }
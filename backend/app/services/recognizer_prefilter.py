@@ -0,0 +1,130 @@
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple
+
+import regex
+from presidio_analyzer import EntityRecognizer
+
+logger = logging.getLogger(__name__)
+
+_DIGIT_RUN = regex.compile(r"\d+")
+
+
+class PrefilterRule(NamedTuple):
+    """
+    A condition every text must meet for a recognizer to possibly match it. Rules must only
+    state what the recognizer's patterns strictly require, so skipping never changes results.
+    """
+
+    any_chars: str = ""  # At least one of these characters occurs
+    min_digit_run: int = 0  # Length of the longest run of decimal digits
+    min_digits: int = 0  # Total number of decimal digits
+
+
+# Keyed by recognizer name. Digit requirements are measured on Unicode decimal digits, which
+# also covers patterns that only accept [0-9].
+DEFAULT_PREFILTER_RULES: Dict[str, PrefilterRule] = {
+    "EmailRecognizer": PrefilterRule(any_chars="@"),
+    "UrlRecognizer": PrefilterRule(any_chars="."),
+    "IpRecognizer": PrefilterRule(any_chars=".:"),
+    "CryptoRecognizer": PrefilterRule(any_chars="13"),
+    "IbanRecognizer": PrefilterRule(min_digit_run=2),
+    "CreditCardRecognizer": PrefilterRule(min_digit_run=4, min_digits=13),
+    "UsSsnRecognizer": PrefilterRule(min_digit_run=4, min_digits=9),
+    "UsBankRecognizer": PrefilterRule(min_digit_run=8),
+    "Custom Bank Account Recognizer": PrefilterRule(min_digit_run=9),
+    # phonenumbers needs at least 4 national digits for any supported region.
+    "PhoneRecognizer": PrefilterRule(min_digits=4),
+}
+
+
+class RecognizerPrefilter:
+    """
+    Skips recognizers that cannot match a text, based on one quick look at the characters
+    and digit runs it contains.
+
+    Skipping works on entity types: an entity is dropped from the analyzer request when
+    every recognizer that can find it fails its rule, so Presidio never selects those
+    recognizers. Recognizers without a rule (such as the spaCy recognizer) always run.
+    """
+
+    def __init__(self, recognizers: List[EntityRecognizer], rules: Dict[str, PrefilterRule] = DEFAULT_PREFILTER_RULES):
+        self._recognizer_entities: Dict[str, List[str]] = {}
+        self._entity_recognizers: Dict[str, List[str]] = defaultdict(list)
+        for recognizer in recognizers:
+            self._recognizer_entities[recognizer.name] = recognizer.supported_entities
+            for entity in recognizer.supported_entities:
+                self._entity_recognizers[entity].append(recognizer.name)
+        self.rules = {name: rule for name, rule in rules.items() if name in self._recognizer_entities}
+
+        self._required_chars = sorted({char for rule in self.rules.values() for char in rule.any_chars})
+        self._max_run_needed = max((rule.min_digit_run for rule in self.rules.values()), default=0)
+        self._max_digits_needed = max((rule.min_digits for rule in self.rules.values()), default=0)
+
+        self._lock = threading.Lock()
+        self._texts = 0
+        self._skipped: Counter = Counter()
+
+    def _digit_stats(self, text: str):
+        """
+        Returns the longest digit run and the digit count, stopping early once both are
+        large enough to satisfy every rule.
+        """
+        longest_run = 0
+        digits = 0
+        for match in _DIGIT_RUN.finditer(text):
+            length = match.end() - match.start()
+            longest_run = max(longest_run, length)
+            digits += length
+            if longest_run >= self._max_run_needed and digits >= self._max_digits_needed:
+                break
+        return longest_run, digits
+
+    def filter_entities(self, text: str, entities: List[str]) -> List[str]:
+        """
+        Returns the requested entities that can still be found in the text.
+        """
+        if not self.rules:
+            return entities
+
+        present_chars = {char for char in self._required_chars if char in text}
+        longest_run, digits = self._digit_stats(text) if self._max_run_needed or self._max_digits_needed else (0, 0)
+        failing = {
+            name
+            for name, rule in self.rules.items()
+            if (rule.any_chars and present_chars.isdisjoint(rule.any_chars))
+            or longest_run < rule.min_digit_run
+            or digits < rule.min_digits
+        }
+
+        kept_entities = [
+            entity
+            for entity in entities
+            if not self._entity_recognizers.get(entity)
+            or not all(name in failing for name in self._entity_recognizers[entity])
+        ]
+        requested, kept = set(entities), set(kept_entities)
+        skipped = [
+            name
+            for name in failing
+            if not requested.isdisjoint(self._recognizer_entities[name])
+            and kept.isdisjoint(self._recognizer_entities[name])
+        ]
+
+        with self._lock:
+            self._texts += 1
+            self._skipped.update(skipped)
+        if skipped:
+            logger.debug(f"Prefilter skipped {len(skipped)} recognizers for text of {len(text)} characters: {sorted(skipped)}")
+        return kept_entities
+
+    def get_stats(self) -> Dict:
+        """
+        Returns how many texts were checked and how often each recognizer was skipped.
+        """
+        with self._lock:
+            return {
+                "texts": self._texts,
+                "skipped": {name: self._skipped.get(name, 0) for name in sorted(self.rules)},
+            }
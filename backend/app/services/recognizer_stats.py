@@ -0,0 +1,122 @@
+import functools
+import logging
+import threading
+import time
+from typing import Dict, List
+
+from presidio_analyzer import EntityRecognizer, RecognizerResult
+from presidio_analyzer.nlp_engine import NlpEngine
+
+logger = logging.getLogger(__name__)
+
+# Name under which the spaCy pipeline run is reported. SpacyRecognizer itself only reads the
+# entities the pipeline already found, so without this entry NER would look free.
+NLP_PIPELINE = "spaCy pipeline"
+
+
+class RecognizerStats:
+    """
+    Per-recognizer timing and hit-rate counters.
+
+    Installed on an analyzer's recognizers and NLP engine, it records for every recognizer
+    how often it ran, the time it took and the matches it produced, and counts how many of
+    those matches `_resolve_conflicts` later discarded in favour of an overlapping one. A
+    recognizer that costs a lot and whose matches mostly get discarded is a candidate for
+    tuning or removal.
+
+    Totals cover every profile the stats are installed on. In process mode the analysis
+    runs in the worker processes, so their calls are not counted here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, name: str) -> Dict[str, float]:
+        entry = self._stats.get(name)
+        if entry is None:
+            entry = self._stats[name] = {"calls": 0, "total_ms": 0.0, "matches": 0, "kept": 0, "discarded": 0}
+        return entry
+
+    def record_call(self, name: str, elapsed_ms: float, matches: int):
+        with self._lock:
+            entry = self._entry(name)
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["matches"] += matches
+
+    def record_conflicts(self, results: List[RecognizerResult], kept: List[RecognizerResult]):
+        """
+        Counts, per recognizer, the results that survived conflict resolution and those that
+        were discarded.
+        """
+        kept_ids = {id(result) for result in kept}
+        with self._lock:
+            for result in results:
+                metadata = result.recognition_metadata or {}
+                entry = self._entry(metadata.get(RecognizerResult.RECOGNIZER_NAME_KEY, "unknown"))
+                entry["kept" if id(result) in kept_ids else "discarded"] += 1
+
+    def _timed(self, name: str, func, count_matches):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            self.record_call(name, (time.perf_counter() - start) * 1000, count_matches(result))
+            return result
+
+        return wrapper
+
+    def _timed_batch(self, func):
+        """
+        Times a batch NLP run, which is a generator, one processed text at a time.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            iterator = iter(func(*args, **kwargs))
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                self.record_call(NLP_PIPELINE, (time.perf_counter() - start) * 1000, 0)
+                yield item
+
+        return wrapper
+
+    def install(self, recognizers: List[EntityRecognizer], nlp_engine: NlpEngine):
+        """
+        Wraps the `analyze` method of every recognizer, and the text processing of the NLP
+        engine, with timing. Only these instances are affected.
+        """
+        for recognizer in recognizers:
+            recognizer.analyze = self._timed(recognizer.name, recognizer.analyze, lambda results: len(results or []))
+        nlp_engine.process_text = self._timed(NLP_PIPELINE, nlp_engine.process_text, lambda artifacts: 0)
+        nlp_engine.process_batch = self._timed_batch(nlp_engine.process_batch)
+        logger.info(f"Recognizer stats installed for {len(recognizers)} recognizers.")
+
+    def get_stats(self) -> List[Dict]:
+        """
+        Returns the totals per recognizer, the most expensive first.
+        """
+        with self._lock:
+            snapshot = {name: dict(entry) for name, entry in self._stats.items()}
+        stats = []
+        for name, entry in snapshot.items():
+            resolved = entry["kept"] + entry["discarded"]
+            stats.append({
+                "recognizer": name,
+                "calls": int(entry["calls"]),
+                "total_ms": round(entry["total_ms"], 3),
+                "avg_ms": round(entry["total_ms"] / entry["calls"], 3) if entry["calls"] else 0.0,
+                "matches": int(entry["matches"]),
+                "kept": int(entry["kept"]),
+                "discarded": int(entry["discarded"]),
+                "discard_rate": round(entry["discarded"] / resolved, 3) if resolved else 0.0,
+            })
+        return sorted(stats, key=lambda entry: entry["total_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
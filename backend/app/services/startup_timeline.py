@@ -0,0 +1,95 @@
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimeline:
+    """
+    Records how long each startup phase took, relative to when the timeline was created.
+
+    Phases are recorded as they finish, so a timeline can be read while startup is still
+    running. In profiling mode every phase is also run under cProfile and its most
+    expensive functions are logged, which shows where the seconds of a slow phase go.
+    """
+
+    def __init__(self, profiling: bool = False):
+        self.origin = time.perf_counter()
+        self.profiling = profiling
+        self.completed_ms: Optional[float] = None
+        self.current_phase: Optional[str] = None
+        self._phases: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.origin) * 1000
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Times the enclosed block as one phase of the timeline.
+        """
+        profiler = cProfile.Profile() if self.profiling else None
+        start_ms = self._elapsed_ms()
+        self.current_phase = name
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            duration_ms = self._elapsed_ms() - start_ms
+            self.current_phase = None
+            with self._lock:
+                self._phases.append({"name": name, "start_ms": round(start_ms, 1), "duration_ms": round(duration_ms, 1)})
+            logger.info(f"Startup phase '{name}' took {duration_ms:.0f} ms.")
+            if profiler is not None:
+                self._log_profile(name, profiler)
+
+    @staticmethod
+    def _log_profile(name: str, profiler: cProfile.Profile, limit: int = 15):
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+        logger.info(f"Startup profile of phase '{name}':\n{stream.getvalue()}")
+
+    def complete(self):
+        """
+        Marks startup as finished and logs the whole timeline.
+        """
+        self.completed_ms = round(self._elapsed_ms(), 1)
+        summary = ", ".join(f"{phase['name']} {phase['duration_ms']:.0f} ms" for phase in self.phases())
+        logger.info(f"Startup finished in {self.completed_ms:.0f} ms: {summary}.")
+
+    def phases(self) -> List[Dict]:
+        with self._lock:
+            return list(self._phases)
+
+    def as_dict(self) -> Dict:
+        """
+        The timeline as reported by the health endpoint.
+        """
+        return {
+            "profiling": self.profiling,
+            "completed": self.completed_ms is not None,
+            "total_ms": self.completed_ms if self.completed_ms is not None else round(self._elapsed_ms(), 1),
+            "phases": self.phases(),
+        }
+
+
+def timed_phase(timeline: Optional[StartupTimeline], name: str):
+    """
+    Times a phase on the timeline, if there is one.
+    """
+    return timeline.phase(name) if timeline is not None else nullcontext()
+
+
+# Created on first import, which startup.py does before anything else so that the
+# timeline also covers importing the application.
+startup_timeline = StartupTimeline()
@@ -1,42 +1,32 @@
 import logging
 import time
 from threading import Timer
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from uuid import UUID, uuid4
 
 from app.models.requests import TokenUpdate
+from app.services.detokenization_service import Detokenizer
+from app.services.metrics import TOKEN_MAP_STORE_SECONDS
+from app.services.tokenmap_store import InMemoryTokenMapStore, TokenMapData, TokenMapStore
 
 logger = logging.getLogger(__name__)
 
 
-class TokenMapData:
-    """
-    Holds token mapping data along with its creation and expiry timestamps,
-    original text, and raw recognizer results.
-    """
-
-    def __init__(self, mappings: Dict[str, Dict], original_text: str, tokens_info_raw: List[Dict], ttl_seconds: int):
-        self.mappings = mappings
-        self.original_text = original_text
-        self.tokens_info_raw = tokens_info_raw
-        self.created_at = time.time()
-        self.expires_at = self.created_at + ttl_seconds
-
-    def is_expired(self) -> bool:
-        return time.time() > self.expires_at
-
-
 class TokenMapService:
     """
-    Service for managing in-memory token mappings with a time-to-live (TTL).
+    Service for managing token mappings with a time-to-live (TTL).
+    Token maps are kept in a pluggable TokenMapStore, in-memory by default.
     """
 
-    def __init__(self, ttl_seconds: int = 3600, cleanup_interval_seconds: int = 300):
-        self.token_maps: Dict[UUID, TokenMapData] = {}
+    def __init__(self, ttl_seconds: int = 3600, cleanup_interval_seconds: int = 300, store: Optional[TokenMapStore] = None):
+        self.store = store if store is not None else InMemoryTokenMapStore()
         self.ttl_seconds = ttl_seconds
         self.cleanup_interval_seconds = cleanup_interval_seconds
         self._start_cleanup_task()
-        logger.info(f"TokenMapService initialized with TTL: {ttl_seconds}s, Cleanup Interval: {cleanup_interval_seconds}s")
+        logger.info(
+            f"TokenMapService initialized with {type(self.store).__name__}, "
+            f"TTL: {ttl_seconds}s, Cleanup Interval: {cleanup_interval_seconds}s"
+        )
 
     def _start_cleanup_task(self):
         """
@@ -51,27 +41,78 @@ class TokenMapService:
         """
         Removes expired token maps from storage.
         """
-        expired_ids = [uid for uid, data in self.token_maps.items() if data.is_expired()]
-        for uid in expired_ids:
-            del self.token_maps[uid]
-            logger.info(f"Cleaned up expired token map: {uid}")
-        
+        try:
+            removed = self.store.cleanup_expired()
+            logger.debug(f"Token map cleanup completed. {removed} maps removed.")
+        except Exception as e:
+            logger.error(f"Token map cleanup failed: {e}")
+
         # Reschedule the cleanup task
         self._start_cleanup_task()
-        logger.debug(f"Token map cleanup completed. {len(expired_ids)} maps removed.")
 
-    def create_token_map(self, mappings: Dict[str, Dict], original_text: str, tokens_info_raw: List[Dict]) -> UUID:
+    def _store_get(self, token_map_id: UUID) -> Optional[TokenMapData]:
+        with TOKEN_MAP_STORE_SECONDS.time(operation="get"):
+            return self.store.get(token_map_id)
+
+    def _store_put(self, token_map_id: UUID, token_map_data: TokenMapData):
+        with TOKEN_MAP_STORE_SECONDS.time(operation="put"):
+            self.store.put(token_map_id, token_map_data)
+
+    def _store_update(self, token_map_id: UUID, mutate: Callable[[TokenMapData], None]) -> Optional[TokenMapData]:
+        with TOKEN_MAP_STORE_SECONDS.time(operation="update"):
+            return self.store.update(token_map_id, mutate)
+
+    def _store_append(self, token_map_id: UUID, new_mappings: Dict[str, Dict], new_tokens_info: List[Dict]) -> bool:
+        with TOKEN_MAP_STORE_SECONDS.time(operation="append"):
+            return self.store.append(token_map_id, new_mappings, new_tokens_info)
+
+    def _store_delete(self, token_map_id: UUID) -> bool:
+        with TOKEN_MAP_STORE_SECONDS.time(operation="delete"):
+            return self.store.delete(token_map_id)
+
+    def count(self) -> int:
+        """
+        Returns the number of stored token maps.
+        """
+        return self.store.count()
+
+    def get_stats(self) -> Dict:
+        """
+        Returns the statistics of the underlying store.
+        """
+        return self.store.get_stats()
+
+    def close(self):
+        """
+        Stops the cleanup task and releases the store.
+        """
+        self._cleanup_timer.cancel()
+        self.store.close()
+
+    def create_token_map(
+        self,
+        mappings: Dict[str, Dict],
+        original_text: str,
+        tokens_info_raw: List[Dict],
+        sanitized_text: Optional[str] = None,
+        reviewed_from: Optional[TokenMapData] = None,
+    ) -> UUID:
         """
         Creates a new token map and stores it.
 
         Args:
             mappings (Dict[str, Dict]): A dictionary mapping tokens to their original values and entity types.
+            sanitized_text (Optional[str]): The anonymized text, rebuilt from the occurrences if omitted.
+            reviewed_from (Optional[TokenMapData]): A previous version of the document whose reviewer decisions carry over.
 
         Returns:
             UUID: The unique ID of the created token map.
         """
         token_map_id = uuid4()
-        self.token_maps[token_map_id] = TokenMapData(mappings, original_text, tokens_info_raw, self.ttl_seconds)
+        token_map_data = TokenMapData(mappings, original_text, tokens_info_raw, self.ttl_seconds, sanitized_text=sanitized_text)
+        if reviewed_from is not None:
+            token_map_data.inherit_review(reviewed_from)
+        self._store_put(token_map_id, token_map_data)
         logger.info(f"Created token map {token_map_id} with {len(mappings)} entries.")
         return token_map_id
 
@@ -85,7 +126,7 @@ class TokenMapService:
         Returns:
             Optional[Dict[str, Dict]]: The token map if found and not expired, otherwise None.
         """
-        token_map_data = self.token_maps.get(token_map_id)
+        token_map_data = self._store_get(token_map_id)
         if token_map_data:
             if token_map_data.is_expired():
                 self.delete_token_map(token_map_id)  # Clean up expired map immediately
@@ -106,21 +147,50 @@ class TokenMapService:
         Returns:
             bool: True if the update was successful, False otherwise.
         """
-        token_map_data = self.token_maps.get(token_map_id)
-        if not token_map_data or token_map_data.is_expired():
+        def apply_updates(token_map_data: TokenMapData):
+            for update in updates:
+                if token_map_data.update_token(update.token, update.original_value, update.entity_type):
+                    logger.debug(f"Updated token {update.token} in map {token_map_id}.")
+                else:
+                    logger.warning(f"Token {update.token} not found in map {token_map_id} during update.")
+
+        if self._store_update(token_map_id, apply_updates) is None:
             logger.warning(f"Cannot update: Token map {token_map_id} not found or expired.")
             return False
-
-        for update in updates:
-            if update.token in token_map_data.mappings:
-                token_map_data.mappings[update.token]["original_value"] = update.original_value
-                token_map_data.mappings[update.token]["entity_type"] = update.entity_type
-                logger.debug(f"Updated token {update.token} in map {token_map_id}.")
-            else:
-                logger.warning(f"Token {update.token} not found in map {token_map_id} during update.")
         logger.info(f"Token map {token_map_id} updated with {len(updates)} changes.")
         return True
 
+    def get_detokenizer(self, token_map_id: UUID) -> Optional[Detokenizer]:
+        """
+        Retrieves the cached detokenizer of a token map. With a store that serializes maps,
+        every lookup returns a new entry, so the detokenizer is rebuilt for each request.
+
+        Args:
+            token_map_id (UUID): The ID of the token map.
+
+        Returns:
+            Optional[Detokenizer]: The detokenizer if the map is found and not expired, otherwise None.
+        """
+        token_map_data = self.get_token_map_entry(token_map_id)
+        if not token_map_data:
+            return None
+        return token_map_data.get_detokenizer()
+
+    def append_tokens(self, token_map_id: UUID, new_mappings: Dict[str, Dict], new_tokens_info: List[Dict]) -> bool:
+        """
+        Adds newly generated tokens and their occurrences to an existing token map.
+        Used when a document is sanitized incrementally. Only the new tokens are written,
+        so the cost does not grow with the size of the map.
+
+        Returns:
+            bool: True if the map was extended, False if it was not found or expired.
+        """
+        if not self._store_append(token_map_id, new_mappings, new_tokens_info):
+            logger.warning(f"Cannot append tokens: Token map {token_map_id} not found or expired.")
+            return False
+        logger.debug(f"Appended {len(new_mappings)} tokens to map {token_map_id}.")
+        return True
+
     def delete_token_map(self, token_map_id: UUID) -> bool:
         """
         Deletes a token map by its ID.
@@ -131,8 +201,7 @@ class TokenMapService:
         Returns:
             bool: True if the token map was deleted, False if not found.
         """
-        if token_map_id in self.token_maps:
-            del self.token_maps[token_map_id]
+        if self._store_delete(token_map_id):
             logger.info(f"Deleted token map: {token_map_id}")
             return True
         logger.warning(f"Attempted to delete non-existent token map: {token_map_id}")
@@ -142,7 +211,7 @@ class TokenMapService:
         """
         Retrieves a TokenMapData entry by its ID.
         """
-        token_map_data = self.token_maps.get(token_map_id)
+        token_map_data = self._store_get(token_map_id)
         if token_map_data:
             if token_map_data.is_expired():
                 self.delete_token_map(token_map_id)
@@ -152,27 +221,63 @@ class TokenMapService:
         logger.warning(f"Token map entry {token_map_id} not found.")
         return None
 
-    def update_token_map_entry_after_manual_tokenization(
-        self,
-        token_map_id: UUID,
-        sanitized_text: str,
-        token_mapping: Dict[str, Dict],
-        tokens_info: List[Dict],
-        tokens_info_raw: List # Updated raw RecognizerResults
-    ) -> bool:
-        """
-        Updates an existing token map entry after manual tokenization has occurred.
-        This updates the mappings, raw results, and extends the expiry.
-        """
-        token_map_data = self.token_maps.get(token_map_id)
-        if not token_map_data or token_map_data.is_expired():
-            logger.warning(f"Cannot update after manual tokenization: Token map {token_map_id} not found or expired.")
-            return False
-
-        token_map_data.mappings = token_mapping
-        token_map_data.tokens_info_raw = tokens_info_raw
+    def _extend_expiry(self, token_map_data: TokenMapData):
         # Extend expiry time as the map has been actively used/modified
         token_map_data.created_at = time.time()
         token_map_data.expires_at = token_map_data.created_at + self.ttl_seconds
-        logger.info(f"Token map {token_map_id} updated after manual tokenization.")
-        return True
+
+    def insert_manual_tokens(
+        self,
+        token_map_id: UUID,
+        find_occurrences: Callable[[TokenMapData], Tuple[Dict[str, Dict], List[Dict], int]],
+    ) -> Optional[Tuple[TokenMapData, int]]:
+        """
+        Inserts manually added occurrences into an existing token map, patching its sanitized
+        text locally, and extends the expiry.
+
+        `find_occurrences` returns the new mappings, the new occurrences and the number of
+        additional occurrences for the current version of the map, as
+        PresidioService.integrate_manual_token does. It runs inside the store update, so the
+        occurrences are checked against the map as edited by other workers.
+
+        Returns:
+            Optional[Tuple[TokenMapData, int]]: The updated entry and the number of additional
+            occurrences, or None if the map was not found or expired.
+        """
+        found = {}
+
+        def insert(token_map_data: TokenMapData):
+            new_mappings, new_occurrences, found["additional_occurrences"] = find_occurrences(token_map_data)
+            token_map_data.insert_occurrences(new_mappings, new_occurrences)
+            token_map_data.mark_reviewer_tokens(list(new_mappings) + [occurrence["token"] for occurrence in new_occurrences])
+            self._extend_expiry(token_map_data)
+
+        token_map_data = self._store_update(token_map_id, insert)
+        if token_map_data is None:
+            logger.warning(f"Cannot insert manual tokens: Token map {token_map_id} not found or expired.")
+            return None
+        logger.info(f"Inserted {found['additional_occurrences'] + 1} manual occurrences into token map {token_map_id}.")
+        return token_map_data, found["additional_occurrences"]
+
+    def revert_token(self, token_map_id: UUID, token: str) -> Optional[TokenMapData]:
+        """
+        Reverts every occurrence of a token back to its original value, removes the token
+        from the map and extends the expiry.
+
+        Returns:
+            Optional[TokenMapData]: The updated entry, or None if it was not found or expired.
+        """
+        reverted = {}
+
+        def revert(token_map_data: TokenMapData):
+            reverted["occurrences"] = token_map_data.remove_token(token)
+            if not reverted["occurrences"]:
+                logger.warning(f"Token {token} not found in map {token_map_id} during revert.")
+            self._extend_expiry(token_map_data)
+
+        token_map_data = self._store_update(token_map_id, revert)
+        if token_map_data is None:
+            logger.warning(f"Cannot revert token: Token map {token_map_id} not found or expired.")
+            return None
+        logger.info(f"Reverted {reverted['occurrences']} occurrences of token {token} in token map {token_map_id}.")
+        return token_map_data
@@ -0,0 +1,985 @@
+import heapq
+import json
+import logging
+import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+from uuid import UUID
+
+from app.services.detokenization_service import Detokenizer
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRecord:
+    """
+    Original value, entity type and score of one token in a token map.
+    """
+
+    __slots__ = ("original_value", "entity_type", "score")
+
+    def __init__(self, original_value: str, entity_type: str, score: float):
+        self.original_value = original_value
+        self.entity_type = sys.intern(entity_type)
+        self.score = score
+
+    def to_dict(self) -> Dict:
+        return {"original_value": self.original_value, "entity_type": self.entity_type, "score": self.score}
+
+
+class TokenMapData:
+    """
+    Holds token mapping data along with its creation and expiry timestamps,
+    original text, and raw recognizer results.
+
+    Storage is compact: each token is a TokenRecord, and the occurrences are held column-wise,
+    with array-backed starts, ends and scores plus references to shared token and entity type
+    strings. An occurrence's original value is always original_text[start:end], so it is not
+    stored at all. The dict shapes used by the API are only built by `mappings` and
+    `tokens_info_raw` when requested.
+
+    Occurrences never overlap and are kept sorted by start, so the starts (and ends) form a
+    sorted interval index that answers overlap queries with a binary search. A second index
+    maps every token to the starts of its occurrences. The sanitized text is kept alongside
+    so that edits can patch it instead of re-anonymizing the document.
+
+    Reviewer decisions are remembered too: the tokens the reviewer added or edited, and the
+    values they reverted, so that re-sanitizing an edited version can honour them.
+    """
+
+    __slots__ = (
+        "original_text", "sanitized_text", "created_at", "expires_at", "_tokens", "_positions",
+        "_occurrence_tokens", "_occurrence_entity_types", "_starts", "_ends", "_scores", "_detokenizer",
+        "_reviewer_tokens", "_reverted_values",
+    )
+
+    def __init__(
+        self,
+        mappings: Dict[str, Dict],
+        original_text: str,
+        tokens_info_raw: List[Dict],
+        ttl_seconds: int,
+        sanitized_text: Optional[str] = None,
+    ):
+        self.original_text = original_text
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl_seconds
+        self._detokenizer: Optional[Detokenizer] = None
+        self._reviewer_tokens: Set[str] = set()
+        self._reverted_values: Set[str] = set()
+        self.set_tokens(mappings, tokens_info_raw, sanitized_text)
+
+    def is_expired(self) -> bool:
+        return time.time() > self.expires_at
+
+    @property
+    def mappings(self) -> Dict[str, Dict]:
+        """
+        Token -> original value details, in the shape returned by the API.
+        """
+        return {token: record.to_dict() for token, record in self._tokens.items()}
+
+    @property
+    def tokens_info_raw(self) -> List[Dict]:
+        """
+        Token occurrences sorted by position, in the shape returned by the API.
+        """
+        text = self.original_text
+        return [
+            {
+                "token": token,
+                "original_value": text[start:end],
+                "entity_type": entity_type,
+                "start": start,
+                "end": end,
+                "score": score,
+            }
+            for token, entity_type, start, end, score in zip(
+                self._occurrence_tokens, self._occurrence_entity_types, self._starts, self._ends, self._scores
+            )
+        ]
+
+    @property
+    def reviewer_values(self) -> Dict[str, str]:
+        """
+        Original value -> token, for the tokens the reviewer added or edited.
+        """
+        return {
+            self._tokens[token].original_value: token for token in self._reviewer_tokens if token in self._tokens
+        }
+
+    @property
+    def reverted_values(self) -> Set[str]:
+        """
+        Values the reviewer reverted, which should stay in plain text.
+        """
+        return set(self._reverted_values)
+
+    def mark_reviewer_tokens(self, tokens: List[str]):
+        """
+        Records tokens as added by the reviewer, so their values are no longer reverted.
+        """
+        for token in tokens:
+            record = self._tokens.get(token)
+            if record is not None:
+                self._reviewer_tokens.add(token)
+                self._reverted_values.discard(record.original_value)
+
+    def inherit_review(self, previous: "TokenMapData"):
+        """
+        Carries the reviewer decisions of a previous version of the document over to this map.
+        """
+        self._reverted_values.update(previous._reverted_values)
+        self.mark_reviewer_tokens([token for token in previous._reviewer_tokens if token in self._tokens])
+
+    def token_count(self) -> int:
+        return len(self._tokens)
+
+    def occurrence_count(self) -> int:
+        return len(self._starts)
+
+    def set_tokens(self, mappings: Dict[str, Dict], tokens_info_raw: List[Dict], sanitized_text: Optional[str] = None):
+        """
+        Replaces all tokens and occurrences. The sanitized text is rebuilt if not given.
+        """
+        self._tokens: Dict[str, TokenRecord] = {}
+        self._occurrence_tokens: List[str] = []
+        self._occurrence_entity_types: List[str] = []
+        self._starts = array("q")
+        self._ends = array("q")
+        self._scores = array("d")
+        self._add_records(mappings)
+        self._extend_columns(sorted(tokens_info_raw, key=lambda occurrence: occurrence["start"]))
+        self._build_positions()
+        self.sanitized_text = sanitized_text if sanitized_text is not None else self._render_sanitized_text()
+
+    def append_tokens(self, new_mappings: Dict[str, Dict], new_tokens_info: List[Dict]):
+        """
+        Adds tokens and their occurrences, given in the API dict shapes.
+        """
+        self.insert_occurrences(new_mappings, sorted(new_tokens_info, key=lambda occurrence: occurrence["start"]))
+
+    def insert_occurrences(self, new_mappings: Dict[str, Dict], new_occurrences: List[Dict]):
+        """
+        Adds tokens and occurrences anywhere in the document, patching the sanitized text
+        around each new occurrence instead of rebuilding it.
+
+        Args:
+            new_mappings: Tokens that are not yet part of the map
+            new_occurrences: Occurrences sorted by start that overlap no stored occurrence
+        """
+        self._add_records(new_mappings)
+        if not new_occurrences:
+            return
+
+        old_tokens, old_types = self._occurrence_tokens, self._occurrence_entity_types
+        old_starts, old_ends, old_scores = self._starts, self._ends, self._scores
+        self._occurrence_tokens, self._occurrence_entity_types = [], []
+        self._starts, self._ends, self._scores = array("q"), array("q"), array("d")
+
+        sanitized_parts = []
+        previous_index = 0
+        previous_sanitized = 0
+        # Length difference between the sanitized and the original text before the current
+        # position, counting only the occurrences that were already stored.
+        delta = 0
+        for occurrence in new_occurrences:
+            index = bisect_left(old_starts, occurrence["start"], previous_index)
+            delta += sum(map(len, old_tokens[previous_index:index]))
+            delta -= sum(old_ends[previous_index:index]) - sum(old_starts[previous_index:index])
+
+            self._occurrence_tokens.extend(old_tokens[previous_index:index])
+            self._occurrence_entity_types.extend(old_types[previous_index:index])
+            self._starts.extend(old_starts[previous_index:index])
+            self._ends.extend(old_ends[previous_index:index])
+            self._scores.extend(old_scores[previous_index:index])
+            self._extend_columns([occurrence])
+            insort(self._positions.setdefault(occurrence["token"], array("q")), occurrence["start"])
+
+            sanitized_start = occurrence["start"] + delta
+            sanitized_parts.append(self.sanitized_text[previous_sanitized:sanitized_start])
+            sanitized_parts.append(occurrence["token"])
+            previous_sanitized = sanitized_start + occurrence["end"] - occurrence["start"]
+            previous_index = index
+
+        self._occurrence_tokens.extend(old_tokens[previous_index:])
+        self._occurrence_entity_types.extend(old_types[previous_index:])
+        self._starts.extend(old_starts[previous_index:])
+        self._ends.extend(old_ends[previous_index:])
+        self._scores.extend(old_scores[previous_index:])
+        sanitized_parts.append(self.sanitized_text[previous_sanitized:])
+        self.sanitized_text = "".join(sanitized_parts)
+
+    def remove_token(self, token: str) -> int:
+        """
+        Removes a token and restores its original value at each of its occurrences, patching
+        the sanitized text locally. The occurrences are found through the position index, so
+        the work depends on the token's occurrence count rather than the document size.
+
+        Returns:
+            int: The number of occurrences that were reverted.
+        """
+        record = self._tokens.pop(token, None)
+        if record is None:
+            return 0
+        self.invalidate_detokenizer()
+        self._reviewer_tokens.discard(token)
+        self._reverted_values.add(record.original_value)
+        positions = self._positions.pop(token, None)
+        if not positions:
+            return 0
+
+        old_tokens, old_types = self._occurrence_tokens, self._occurrence_entity_types
+        old_starts, old_ends, old_scores = self._starts, self._ends, self._scores
+        self._occurrence_tokens, self._occurrence_entity_types = [], []
+        self._starts, self._ends, self._scores = array("q"), array("q"), array("d")
+
+        sanitized_parts = []
+        previous_index = 0
+        previous_sanitized = 0
+        # Length difference between the sanitized and the original text before the current position.
+        delta = 0
+        for start in positions:
+            index = bisect_left(old_starts, start, previous_index)
+            delta += sum(map(len, old_tokens[previous_index:index]))
+            delta -= sum(old_ends[previous_index:index]) - sum(old_starts[previous_index:index])
+
+            self._occurrence_tokens.extend(old_tokens[previous_index:index])
+            self._occurrence_entity_types.extend(old_types[previous_index:index])
+            self._starts.extend(old_starts[previous_index:index])
+            self._ends.extend(old_ends[previous_index:index])
+            self._scores.extend(old_scores[previous_index:index])
+
+            end = old_ends[index]
+            self._reverted_values.add(self.original_text[start:end])
+            sanitized_start = start + delta
+            sanitized_parts.append(self.sanitized_text[previous_sanitized:sanitized_start])
+            sanitized_parts.append(self.original_text[start:end])
+            previous_sanitized = sanitized_start + len(token)
+            delta += len(token) - (end - start)
+            previous_index = index + 1
+
+        self._occurrence_tokens.extend(old_tokens[previous_index:])
+        self._occurrence_entity_types.extend(old_types[previous_index:])
+        self._starts.extend(old_starts[previous_index:])
+        self._ends.extend(old_ends[previous_index:])
+        self._scores.extend(old_scores[previous_index:])
+        sanitized_parts.append(self.sanitized_text[previous_sanitized:])
+        self.sanitized_text = "".join(sanitized_parts)
+        return len(positions)
+
+    def find_overlapping(self, start: int, end: int) -> Optional[Dict]:
+        """
+        Returns a stored occurrence overlapping [start, end), or None. Runs in O(log n).
+        """
+        index = bisect_right(self._starts, start) - 1
+        for candidate in (index, index + 1):
+            if 0 <= candidate < len(self._starts) and self._starts[candidate] < end and start < self._ends[candidate]:
+                return {
+                    "token": self._occurrence_tokens[candidate],
+                    "entity_type": self._occurrence_entity_types[candidate],
+                    "start": self._starts[candidate],
+                    "end": self._ends[candidate],
+                }
+        return None
+
+    def token_for_value(self, original_value: str) -> Optional[str]:
+        """
+        Returns the token already standing for this original value, if any.
+        """
+        for token, record in self._tokens.items():
+            if record.original_value == original_value:
+                return token
+        return None
+
+    def next_token(self, entity_type: str) -> str:
+        """
+        Returns the next unused token for an entity type, continuing the existing numbering.
+        """
+        prefix = f"[{entity_type}_"
+        highest = 0
+        for token in self._tokens:
+            number = token[len(prefix):-1]
+            if token.startswith(prefix) and number.isdigit():
+                highest = max(highest, int(number))
+        return f"{prefix}{highest + 1}]"
+
+    def _add_records(self, mappings: Dict[str, Dict]):
+        for token, details in mappings.items():
+            self._tokens[token] = TokenRecord(details["original_value"], details["entity_type"], details["score"])
+        self.invalidate_detokenizer()
+
+    def _extend_columns(self, occurrences: List[Dict]):
+        # Occurrences refer to the token strings held as keys of the token dict, so each
+        # token string is stored once per map rather than once per occurrence.
+        shared_tokens = {token: token for token in self._tokens}
+        for occurrence in occurrences:
+            token = occurrence["token"]
+            self._occurrence_tokens.append(shared_tokens.setdefault(token, token))
+            self._occurrence_entity_types.append(sys.intern(occurrence["entity_type"]))
+            self._starts.append(occurrence["start"])
+            self._ends.append(occurrence["end"])
+            self._scores.append(occurrence["score"])
+
+    def _build_positions(self):
+        self._positions: Dict[str, array] = {}
+        for token, start in zip(self._occurrence_tokens, self._starts):
+            self._positions.setdefault(token, array("q")).append(start)
+
+    def _render_sanitized_text(self) -> str:
+        parts = []
+        last_end = 0
+        for token, start, end in zip(self._occurrence_tokens, self._starts, self._ends):
+            parts.append(self.original_text[last_end:start])
+            parts.append(token)
+            last_end = end
+        parts.append(self.original_text[last_end:])
+        return "".join(parts)
+
+    def update_token(self, token: str, original_value: str, entity_type: str) -> bool:
+        """
+        Changes the original value and entity type of an existing token.
+
+        Returns:
+            bool: False if the token is not part of this map.
+        """
+        record = self._tokens.get(token)
+        if record is None:
+            return False
+        record.original_value = original_value
+        record.entity_type = sys.intern(entity_type)
+        self.mark_reviewer_tokens([token])
+        self.invalidate_detokenizer()
+        return True
+
+    def get_detokenizer(self) -> Detokenizer:
+        """
+        Returns the compiled detokenizer for the current mappings, building it on first use.
+        """
+        if self._detokenizer is None:
+            self._detokenizer = Detokenizer(self.mappings)
+        return self._detokenizer
+
+    def invalidate_detokenizer(self):
+        """
+        Drops the cached detokenizer. Must be called whenever the mappings change.
+        """
+        self._detokenizer = None
+
+    def estimate_size(self) -> int:
+        """
+        Returns an approximate number of bytes held by this token map. It counts the
+        strings and containers directly; the cached detokenizer is ignored.
+        """
+        size = sys.getsizeof(self.original_text) + sys.getsizeof(self.sanitized_text) + sys.getsizeof(self._tokens)
+        for token, record in self._tokens.items():
+            size += sys.getsizeof(token) + sys.getsizeof(record) + sys.getsizeof(record.original_value)
+        for column in (self._occurrence_tokens, self._occurrence_entity_types, self._starts, self._ends, self._scores):
+            size += sys.getsizeof(column)
+        size += sys.getsizeof(self._positions) + sum(sys.getsizeof(positions) for positions in self._positions.values())
+        size += sys.getsizeof(self._reviewer_tokens) + sys.getsizeof(self._reverted_values)
+        size += sum(sys.getsizeof(value) for value in self._reverted_values)
+        return size
+
+    def to_json(self) -> str:
+        """
+        Serializes the token map for storage outside the process, keeping the columnar layout.
+        """
+        return json.dumps({
+            "tokens": {
+                token: [record.original_value, record.entity_type, record.score]
+                for token, record in self._tokens.items()
+            },
+            "occurrences": [
+                self._occurrence_tokens,
+                self._occurrence_entity_types,
+                self._starts.tolist(),
+                self._ends.tolist(),
+                self._scores.tolist(),
+            ],
+            "original_text": self.original_text,
+            "sanitized_text": self.sanitized_text,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at,
+            "reviewer_tokens": sorted(self._reviewer_tokens),
+            "reverted_values": sorted(self._reverted_values),
+        })
+
+    @classmethod
+    def from_json(cls, payload: str) -> "TokenMapData":
+        """
+        Rebuilds a token map serialized with `to_json`.
+        """
+        data = json.loads(payload)
+        token_map_data = cls({}, data["original_text"], [], 0, sanitized_text=data["sanitized_text"])
+        token_map_data.created_at = data["created_at"]
+        token_map_data.expires_at = data["expires_at"]
+        for token, (original_value, entity_type, score) in data["tokens"].items():
+            token_map_data._tokens[token] = TokenRecord(original_value, entity_type, score)
+
+        shared_tokens = {token: token for token in token_map_data._tokens}
+        occurrence_tokens, entity_types, starts, ends, scores = data["occurrences"]
+        token_map_data._occurrence_tokens = [shared_tokens.setdefault(token, token) for token in occurrence_tokens]
+        token_map_data._occurrence_entity_types = [sys.intern(entity_type) for entity_type in entity_types]
+        token_map_data._starts = array("q", starts)
+        token_map_data._ends = array("q", ends)
+        token_map_data._scores = array("d", scores)
+        token_map_data._build_positions()
+        # Absent from maps stored before reviewer decisions were recorded.
+        token_map_data._reviewer_tokens = set(data.get("reviewer_tokens", []))
+        token_map_data._reverted_values = set(data.get("reverted_values", []))
+        return token_map_data
+
+
+class TokenMapConflictError(RuntimeError):
+    """
+    Raised when a token map keeps being changed by other workers while it is updated.
+    """
+
+
+class TokenMapStore(ABC):
+    """
+    Storage backend for token maps.
+
+    `get` returns a TokenMapData that callers may modify; changes only become visible to
+    other workers once they are written back with `put`. Edits to a stored map go through
+    `update`, or `append` for new tokens, so that concurrent edits from several workers
+    don't overwrite each other.
+
+    Stores that serialize maps return a new TokenMapData from every `get`, so the
+    detokenizer cached on it only lasts as long as that object; only the in-memory store
+    keeps it between requests.
+    """
+
+    @abstractmethod
+    def get(self, token_map_id: UUID) -> Optional[TokenMapData]:
+        ...
+
+    @abstractmethod
+    def put(self, token_map_id: UUID, token_map_data: TokenMapData):
+        ...
+
+    @abstractmethod
+    def delete(self, token_map_id: UUID) -> bool:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def cleanup_expired(self) -> int:
+        """
+        Removes expired token maps and returns how many were removed.
+        """
+
+    @abstractmethod
+    def update(self, token_map_id: UUID, mutate: Callable[[TokenMapData], None]) -> Optional[TokenMapData]:
+        """
+        Applies `mutate` to a stored, unexpired map and writes it back, atomically with
+        respect to other updates of the same map. Returns the updated map, or None if it was
+        not found or has expired. If `mutate` raises, nothing is written back; to reject a
+        change it must raise before modifying the map, as the in-memory store holds the map
+        itself.
+
+        `mutate` may be called again on a fresh copy if the map changed concurrently, so it
+        should only modify the map it is given.
+        """
+
+    def append(self, token_map_id: UUID, new_mappings: Dict[str, Dict], new_tokens_info: List[Dict]) -> bool:
+        """
+        Adds tokens and their occurrences to a stored, unexpired map. Returns False if the
+        map was not found or has expired.
+
+        This default rewrites the whole map. Stores that serialize maps override it to
+        write only the new tokens, so that streaming a document does not rewrite the
+        growing map once per section.
+        """
+        token_map_data = self.get(token_map_id)
+        if token_map_data is None or token_map_data.is_expired():
+            return False
+        token_map_data.append_tokens(new_mappings, new_tokens_info)
+        self.put(token_map_id, token_map_data)
+        return True
+
+    def get_stats(self) -> Dict:
+        """
+        Returns store statistics for the health endpoint.
+        """
+        return {"token_maps": self.count()}
+
+    def close(self):
+        pass
+
+
+def _encode_append(new_mappings: Dict[str, Dict], new_tokens_info: List[Dict]) -> str:
+    return json.dumps({"mappings": new_mappings, "occurrences": new_tokens_info})
+
+
+def _apply_appends(token_map_data: TokenMapData, payloads: List[str]) -> TokenMapData:
+    """
+    Folds appends recorded with `_encode_append` into a map loaded from its last full write.
+    They are merged first, so the columns and sanitized text are rebuilt once.
+    """
+    if payloads:
+        mappings: Dict[str, Dict] = {}
+        occurrences: List[Dict] = []
+        for payload in payloads:
+            data = json.loads(payload)
+            mappings.update(data["mappings"])
+            occurrences.extend(data["occurrences"])
+        token_map_data.append_tokens(mappings, occurrences)
+    return token_map_data
+
+
+class InMemoryTokenMapStore(TokenMapStore):
+    """
+    Process-local store. Fastest, but only usable with a single worker process.
+
+    The approximate size of every map is tracked, and once the total exceeds `max_bytes`
+    the least recently used maps are evicted. Expiry times are kept in a min-heap, so
+    removing expired maps costs O(log n) per expired map rather than a scan over all of them.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.token_maps: "OrderedDict[UUID, TokenMapData]" = OrderedDict()
+        self._sizes: Dict[UUID, int] = {}
+        self._expiry_heap: List[tuple] = []
+        self._scheduled_expiry: Dict[UUID, float] = {}
+        self._total_bytes = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._lock = threading.RLock()
+
+    def get(self, token_map_id: UUID) -> Optional[TokenMapData]:
+        with self._lock:
+            token_map_data = self.token_maps.get(token_map_id)
+            if token_map_data is not None:
+                self.token_maps.move_to_end(token_map_id)
+            return token_map_data
+
+    def put(self, token_map_id: UUID, token_map_data: TokenMapData):
+        size = token_map_data.estimate_size()
+        with self._lock:
+            self._remove(token_map_id)
+            self.token_maps[token_map_id] = token_map_data
+            self._sizes[token_map_id] = size
+            self._total_bytes += size
+            if self._scheduled_expiry.get(token_map_id) != token_map_data.expires_at:
+                self._scheduled_expiry[token_map_id] = token_map_data.expires_at
+                heapq.heappush(self._expiry_heap, (token_map_data.expires_at, token_map_id.int, token_map_id))
+
+            self._expire(time.time())
+            self._evict(keep=token_map_id)
+
+    def update(self, token_map_id: UUID, mutate: Callable[[TokenMapData], None]) -> Optional[TokenMapData]:
+        with self._lock:
+            token_map_data = self.token_maps.get(token_map_id)
+            if token_map_data is None or token_map_data.is_expired():
+                return None
+            mutate(token_map_data)
+            # Stored again to refresh its size accounting and expiry schedule.
+            self.put(token_map_id, token_map_data)
+            return token_map_data
+
+    def delete(self, token_map_id: UUID) -> bool:
+        with self._lock:
+            removed = self._remove(token_map_id)
+            self._scheduled_expiry.pop(token_map_id, None)
+            return removed
+
+    def count(self) -> int:
+        return len(self.token_maps)
+
+    def cleanup_expired(self) -> int:
+        with self._lock:
+            return self._expire(time.time())
+
+    def get_stats(self) -> Dict:
+        """
+        Returns the number of stored maps, their approximate total size and how many
+        were evicted or expired so far.
+        """
+        with self._lock:
+            return {
+                "token_maps": len(self.token_maps),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _remove(self, token_map_id: UUID) -> bool:
+        """
+        Removes a map and its size accounting. Its heap entry is left behind and skipped later.
+        """
+        if self.token_maps.pop(token_map_id, None) is None:
+            return False
+        self._total_bytes -= self._sizes.pop(token_map_id)
+        return True
+
+    def _expire(self, now: float) -> int:
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] < now:
+            expires_at, _, token_map_id = heapq.heappop(self._expiry_heap)
+            # Entries are superseded when a map's expiry is extended, or left behind when a
+            # map is deleted or evicted; only the current schedule counts.
+            if self._scheduled_expiry.get(token_map_id) != expires_at:
+                continue
+            del self._scheduled_expiry[token_map_id]
+            if self._remove(token_map_id):
+                removed += 1
+                logger.info(f"Cleaned up expired token map: {token_map_id}")
+        self._expirations += removed
+
+        # Drop superseded entries once they make up most of the heap.
+        if len(self._expiry_heap) > 2 * len(self._scheduled_expiry) + 64:
+            self._expiry_heap = [
+                entry for entry in self._expiry_heap if self._scheduled_expiry.get(entry[2]) == entry[0]
+            ]
+            heapq.heapify(self._expiry_heap)
+        return removed
+
+    def _evict(self, keep: UUID):
+        if self.max_bytes is None:
+            return
+        while self._total_bytes > self.max_bytes and len(self.token_maps) > 1:
+            token_map_id = next(iter(self.token_maps))
+            if token_map_id == keep:
+                break
+            self._remove(token_map_id)
+            self._scheduled_expiry.pop(token_map_id, None)
+            self._evictions += 1
+            logger.warning(f"Evicted least recently used token map {token_map_id} to stay under the memory limit.")
+        if self._total_bytes > self.max_bytes:
+            logger.warning(f"Token map {keep} alone exceeds the token map memory limit of {self.max_bytes} bytes.")
+
+
+class SQLiteTokenMapStore(TokenMapStore):
+    """
+    Store backed by a SQLite database in WAL mode, shared by all worker processes on one host.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS token_maps (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS token_maps_expires_at ON token_maps (expires_at)")
+        # Tokens appended since the map was last written in full, applied in rowid order on read.
+        self._connection.execute("CREATE TABLE IF NOT EXISTS token_map_appends (id TEXT NOT NULL, data TEXT NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS token_map_appends_id ON token_map_appends (id)")
+        logger.info(f"SQLiteTokenMapStore initialized at {path}")
+
+    def get(self, token_map_id: UUID) -> Optional[TokenMapData]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM token_maps WHERE id = ?", (str(token_map_id),)
+            ).fetchone()
+            appends = self._connection.execute(
+                "SELECT data FROM token_map_appends WHERE id = ? ORDER BY rowid", (str(token_map_id),)
+            ).fetchall() if row else []
+        return _apply_appends(TokenMapData.from_json(row[0]), [append[0] for append in appends]) if row else None
+
+    def put(self, token_map_id: UUID, token_map_data: TokenMapData):
+        with self._lock, self._transaction():
+            self._write(token_map_id, token_map_data)
+
+    def update(self, token_map_id: UUID, mutate: Callable[[TokenMapData], None]) -> Optional[TokenMapData]:
+        # BEGIN IMMEDIATE takes the database write lock, so no other worker can change the
+        # map between reading it and writing it back.
+        with self._lock, self._transaction():
+            row = self._connection.execute(
+                "SELECT data FROM token_maps WHERE id = ? AND expires_at >= ?", (str(token_map_id), time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            appends = self._connection.execute(
+                "SELECT data FROM token_map_appends WHERE id = ? ORDER BY rowid", (str(token_map_id),)
+            ).fetchall()
+            token_map_data = _apply_appends(TokenMapData.from_json(row[0]), [append[0] for append in appends])
+            mutate(token_map_data)
+            self._write(token_map_id, token_map_data)
+        return token_map_data
+
+    def append(self, token_map_id: UUID, new_mappings: Dict[str, Dict], new_tokens_info: List[Dict]) -> bool:
+        with self._lock, self._transaction():
+            if self._connection.execute(
+                "SELECT 1 FROM token_maps WHERE id = ? AND expires_at >= ?", (str(token_map_id), time.time())
+            ).fetchone() is None:
+                return False
+            self._connection.execute(
+                "INSERT INTO token_map_appends (id, data) VALUES (?, ?)",
+                (str(token_map_id), _encode_append(new_mappings, new_tokens_info)),
+            )
+        return True
+
+    def delete(self, token_map_id: UUID) -> bool:
+        with self._lock, self._transaction():
+            cursor = self._connection.execute("DELETE FROM token_maps WHERE id = ?", (str(token_map_id),))
+            self._connection.execute("DELETE FROM token_map_appends WHERE id = ?", (str(token_map_id),))
+        return cursor.rowcount > 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM token_maps").fetchone()[0]
+
+    def cleanup_expired(self) -> int:
+        with self._lock, self._transaction():
+            now = time.time()
+            self._connection.execute(
+                "DELETE FROM token_map_appends WHERE id IN (SELECT id FROM token_maps WHERE expires_at < ?)", (now,)
+            )
+            cursor = self._connection.execute("DELETE FROM token_maps WHERE expires_at < ?", (now,))
+        if cursor.rowcount:
+            logger.info(f"Cleaned up {cursor.rowcount} expired token maps.")
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _write(self, token_map_id: UUID, token_map_data: TokenMapData):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO token_maps (id, data, expires_at) VALUES (?, ?, ?)",
+            (str(token_map_id), token_map_data.to_json(), token_map_data.expires_at),
+        )
+        # The full write includes everything appended before it.
+        self._connection.execute("DELETE FROM token_map_appends WHERE id = ?", (str(token_map_id),))
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Runs the enclosed statements atomically. The connection is in autocommit mode, so
+        single statements need no transaction.
+        """
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+
+class RedisProtocolError(RuntimeError):
+    """
+    Raised when a Redis-protocol server replies with an error.
+    """
+
+
+class RedisTokenMapStore(TokenMapStore):
+    """
+    Store for any server speaking the Redis protocol (Redis, Valkey, KeyDB, ...), shared by
+    all workers and replicas. Expiry is delegated to the server through key TTLs.
+
+    Only the handful of commands needed here are implemented, over a single connection,
+    so no client library is required.
+    """
+
+    KEY_PREFIX = "redactflow:tokenmap:"
+    # Attempts at an optimistic update before giving up on a map that keeps changing.
+    UPDATE_ATTEMPTS = 10
+    # Lists of the tokens appended since a map was last written in full. The prefix must not
+    # match KEY_PREFIX + "*", which `count` scans for.
+    APPENDS_KEY_PREFIX = "redactflow:tokenmap-appends:"
+
+    def __init__(self, url: str, socket_timeout: float = 5.0):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported Redis URL scheme: {parsed.scheme}")
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.socket_timeout = socket_timeout
+        self._lock = threading.Lock()
+        self._socket: Optional[socket.socket] = None
+        self._reader = None
+        self._execute("PING")
+        logger.info(f"RedisTokenMapStore initialized at {self.host}:{self.port}/{self.db}")
+
+    def _connect(self):
+        self._socket = socket.create_connection((self.host, self.port), timeout=self.socket_timeout)
+        self._reader = self._socket.makefile("rb")
+        if self.password:
+            self._send_command("AUTH", self.password)
+        if self.db:
+            self._send_command("SELECT", str(self.db))
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._reader.close()
+                self._socket.close()
+            except OSError:
+                pass
+        self._socket = None
+        self._reader = None
+
+    def _send_command(self, *args: str):
+        encoded = [arg.encode() if isinstance(arg, str) else arg for arg in args]
+        parts = [b"*%d\r\n" % len(encoded)]
+        for arg in encoded:
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        self._socket.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by Redis server.")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            raise RedisProtocolError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode()
+        if prefix == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisProtocolError(f"Unexpected reply from Redis server: {line!r}")
+
+    def _execute(self, *args: str):
+        """
+        Sends one command, reconnecting once if the connection was lost.
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    return self._send_command(*args)
+                except (ConnectionError, OSError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def _key(self, token_map_id: UUID) -> str:
+        return f"{self.KEY_PREFIX}{token_map_id}"
+
+    def _appends_key(self, token_map_id: UUID) -> str:
+        return f"{self.APPENDS_KEY_PREFIX}{token_map_id}"
+
+    def get(self, token_map_id: UUID) -> Optional[TokenMapData]:
+        payload = self._execute("GET", self._key(token_map_id))
+        if payload is None:
+            return None
+        return _apply_appends(TokenMapData.from_json(payload), self._execute("LRANGE", self._appends_key(token_map_id), "0", "-1"))
+
+    @staticmethod
+    def _ttl_ms(token_map_data: TokenMapData) -> str:
+        return str(max(1, int((token_map_data.expires_at - time.time()) * 1000)))
+
+    def put(self, token_map_id: UUID, token_map_data: TokenMapData):
+        self._execute("SET", self._key(token_map_id), token_map_data.to_json(), "PX", self._ttl_ms(token_map_data))
+        # The full write includes everything appended before it.
+        self._execute("DEL", self._appends_key(token_map_id))
+
+    def update(self, token_map_id: UUID, mutate: Callable[[TokenMapData], None]) -> Optional[TokenMapData]:
+        # Optimistic: WATCH makes EXEC fail if another client changed the map or its appends
+        # since they were read, in which case the update is redone on the new version.
+        key, appends_key = self._key(token_map_id), self._appends_key(token_map_id)
+        with self._lock:
+            if self._socket is None:
+                self._connect()
+            try:
+                for attempt in range(self.UPDATE_ATTEMPTS):
+                    if attempt:
+                        # Back off by a random amount, so competing workers stop colliding.
+                        time.sleep(random.uniform(0, 0.005 * attempt))
+                    self._send_command("WATCH", key, appends_key)
+                    payload = self._send_command("GET", key)
+                    token_map_data = None if payload is None else _apply_appends(
+                        TokenMapData.from_json(payload), self._send_command("LRANGE", appends_key, "0", "-1")
+                    )
+                    if token_map_data is None or token_map_data.is_expired():
+                        self._send_command("UNWATCH")
+                        return None
+                    mutate(token_map_data)
+                    self._send_command("MULTI")
+                    self._send_command("SET", key, token_map_data.to_json(), "PX", self._ttl_ms(token_map_data))
+                    self._send_command("DEL", appends_key)
+                    if self._send_command("EXEC") is not None:
+                        return token_map_data
+                    logger.debug(f"Token map {token_map_id} changed during an update, retrying.")
+            except (ConnectionError, OSError):
+                self._disconnect()
+                raise
+            except BaseException:
+                self._send_command("UNWATCH")
+                raise
+        raise TokenMapConflictError(
+            f"Token map {token_map_id} was changed by other workers during {self.UPDATE_ATTEMPTS} update attempts."
+        )
+
+    def append(self, token_map_id: UUID, new_mappings: Dict[str, Dict], new_tokens_info: List[Dict]) -> bool:
+        ttl_ms = self._execute("PTTL", self._key(token_map_id))
+        if ttl_ms <= 0:  # -2 when the map does not exist
+            return False
+        appends_key = self._appends_key(token_map_id)
+        self._execute("RPUSH", appends_key, _encode_append(new_mappings, new_tokens_info))
+        # Expire together with the map, so appends of a deleted or expired map never linger.
+        self._execute("PEXPIRE", appends_key, str(ttl_ms))
+        return True
+
+    def delete(self, token_map_id: UUID) -> bool:
+        deleted = self._execute("DEL", self._key(token_map_id)) > 0
+        self._execute("DEL", self._appends_key(token_map_id))
+        return deleted
+
+    def count(self) -> int:
+        total = 0
+        cursor = "0"
+        while True:
+            cursor, keys = self._execute("SCAN", cursor, "MATCH", f"{self.KEY_PREFIX}*", "COUNT", "1000")
+            total += len(keys)
+            if cursor == "0":
+                return total
+
+    def cleanup_expired(self) -> int:
+        # Keys carry their own TTL, so the server expires them.
+        return 0
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+
+def create_token_map_store(
+    backend: str, sqlite_path: str = "", redis_url: str = "", max_memory_bytes: Optional[int] = None
+) -> TokenMapStore:
+    """
+    Creates the token map store selected in the settings.
+    """
+    if backend == "memory":
+        return InMemoryTokenMapStore(max_bytes=max_memory_bytes)
+    if backend == "sqlite":
+        return SQLiteTokenMapStore(sqlite_path)
+    if backend == "redis":
+        return RedisTokenMapStore(redis_url)
+    raise ValueError(f"Unsupported token map store: {backend}")
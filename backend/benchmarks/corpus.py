@@ -0,0 +1,132 @@
+import random
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# Relative weights of the generated entity types.
+DEFAULT_ENTITY_MIX: Dict[str, float] = {
+    "PERSON": 4,
+    "EMAIL_ADDRESS": 2,
+    "PHONE_NUMBER": 2,
+    "LOCATION": 1,
+    "CREDIT_CARD": 1,
+    "US_SSN": 1,
+    "IP_ADDRESS": 1,
+    "URL": 1,
+}
+
+# A word no recognizer detects, present in every document, for benchmarking manual tokens.
+MANUAL_TOKEN_WORD = "Bluefinch"
+
+_FIRST_NAMES = ["James", "Maria", "Robert", "Linda", "Michael", "Aisha", "David", "Elena", "Thomas", "Priya", "Daniel", "Sofia"]
+_LAST_NAMES = ["Smith", "Garcia", "Johnson", "Nguyen", "Brown", "Okafor", "Miller", "Rossi", "Wilson", "Kowalski", "Taylor", "Haddad"]
+_CITIES = ["Chicago", "Denver", "Boston", "Seattle", "Atlanta", "Phoenix", "Portland", "Austin"]
+_DOMAINS = ["example.com", "mail.example.org", "corp.example.net"]
+_WORDS = (
+    "the report shows that our team reviewed all open items before the quarterly meeting and agreed on next steps "
+    "for the migration while the budget remains within the approved range pending final sign off from finance "
+    "please note that several documents still need an update and the schedule may shift by a week"
+).split()
+
+
+class SyntheticEntity(NamedTuple):
+    entity_type: str
+    start: int
+    end: int
+    value: str
+
+
+class SyntheticDocument(NamedTuple):
+    text: str
+    entities: List[SyntheticEntity]
+    manual_token_start: int  # Offset of the first MANUAL_TOKEN_WORD
+
+
+def _luhn_complete(digits: str) -> str:
+    """
+    Appends the check digit that makes `digits` pass the Luhn check.
+    """
+    total = 0
+    for index, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if index % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return digits + str((10 - total % 10) % 10)
+
+
+class CorpusGenerator:
+    """
+    Seeded generator of synthetic documents with known PII.
+
+    Documents are built from filler sentences with entities spliced in, so the same seed
+    always yields the same text. `entity_density` is the expected number of entities per
+    100 words, and `entity_mix` weighs how often each entity type is picked.
+    """
+
+    def __init__(self, seed: int = 0, entity_density: float = 2.0, entity_mix: Optional[Dict[str, float]] = None):
+        if entity_density < 0:
+            raise ValueError("entity_density must not be negative.")
+        self.seed = seed
+        self.entity_density = entity_density
+        self.entity_mix = dict(entity_mix or DEFAULT_ENTITY_MIX)
+        unknown = set(self.entity_mix) - set(self._value_generators())
+        if unknown:
+            raise ValueError(f"Unsupported entity types: {', '.join(sorted(unknown))}")
+
+    def _value_generators(self) -> Dict[str, Callable[[random.Random], str]]:
+        return {
+            "PERSON": lambda rng: f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}",
+            "EMAIL_ADDRESS": lambda rng: f"{rng.choice(_FIRST_NAMES).lower()}.{rng.choice(_LAST_NAMES).lower()}{rng.randint(1, 99)}@{rng.choice(_DOMAINS)}",
+            "PHONE_NUMBER": lambda rng: f"({rng.randint(201, 989)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+            "LOCATION": lambda rng: rng.choice(_CITIES),
+            "CREDIT_CARD": lambda rng: _luhn_complete("4" + "".join(str(rng.randint(0, 9)) for _ in range(14))),
+            "US_SSN": lambda rng: f"{rng.randint(100, 665)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}",
+            "IP_ADDRESS": lambda rng: ".".join(str(rng.randint(1, 254)) for _ in range(4)),
+            "URL": lambda rng: f"https://{rng.choice(_DOMAINS)}/docs/{rng.randint(100, 999)}",
+        }
+
+    def document(self, size_bytes: int, index: int = 0) -> SyntheticDocument:
+        """
+        Generates document number `index` of about `size_bytes` bytes (all text is ASCII).
+        Different indexes give different documents for the same seed.
+        """
+        rng = random.Random(f"{self.seed}:{size_bytes}:{index}")
+        generators = self._value_generators()
+        entity_types = list(self.entity_mix)
+        weights = [self.entity_mix[entity_type] for entity_type in entity_types]
+        entity_probability = self.entity_density / 100
+
+        parts: List[str] = []
+        entities: List[SyntheticEntity] = []
+        length = 0
+
+        def append(fragment: str):
+            nonlocal length
+            parts.append(fragment)
+            length += len(fragment)
+
+        append(f"Project {MANUAL_TOKEN_WORD} notes. ")
+        manual_token_start = len("Project ")
+        while length < size_bytes:
+            sentence_words = rng.randint(8, 20)
+            for position in range(sentence_words):
+                if position and entity_types and rng.random() < entity_probability:
+                    entity_type = rng.choices(entity_types, weights)[0]
+                    value = generators[entity_type](rng)
+                    entities.append(SyntheticEntity(entity_type, length, length + len(value), value))
+                    append(value)
+                else:
+                    word = rng.choice(_WORDS)
+                    append(word.capitalize() if position == 0 else word)
+                append(" " if position < sentence_words - 1 else ". ")
+            if rng.random() < 0.15:
+                append("\n\n")
+
+        text = "".join(parts)
+        if len(text) > size_bytes:
+            # Cut at the last sentence end that fits, dropping the entities beyond it.
+            cut = text.rfind(". ", 0, size_bytes)
+            text = text[:cut + 1] if cut > manual_token_start else text[:size_bytes]
+            entities = [entity for entity in entities if entity.end <= len(text)]
+        return SyntheticDocument(text, entities, manual_token_start)
@@ -0,0 +1,395 @@
+"""
+Concurrent load test against a running backend.
+
+Virtual users replay the sessions of the frontend (frontend/src/services/api.ts) over
+HTTP, each starting a new session as soon as the previous one ends:
+
+    sanitize     sanitize a document
+    review       sanitize, add a manual token, edit a token and revert one
+    detokenize   sanitize, then detokenize the sanitized text as an LLM answer
+
+Every session ends by deleting its token map. Users are started evenly over the ramp-up
+period, so throughput and latency per interval show where the backend saturates: the
+point where adding users stops adding throughput and only makes latency grow.
+
+    cd backend
+    python -m uvicorn app.main:app --port 8000
+    python -m benchmarks.load_test --users 20 --ramp 60 --duration 120
+
+The report lists p50/p95/p99 latency, error rate and throughput per endpoint and per
+interval, and is written as JSON next to the benchmark results.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.corpus import MANUAL_TOKEN_WORD, CorpusGenerator, SyntheticDocument
+from benchmarks.run import RESULTS_DIR, _git_commit, parse_mix, parse_size, percentile
+
+SESSION_TYPES = ("sanitize", "review", "detokenize")
+DEFAULT_SESSION_MIX = "sanitize=2,review=1,detokenize=1"
+DELETE_TOKEN_MAP = "DELETE /api/tokens/{token_map_id}"
+
+
+class Sample(NamedTuple):
+    started: float  # Seconds since the start of the run
+    endpoint: str
+    latency_ms: float
+    status: Optional[int]  # None when no response arrived
+    error: Optional[str]  # None for a successful request
+
+
+def parse_session_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        session_type, _, weight = item.partition("=")
+        session_type = session_type.strip()
+        if session_type not in SESSION_TYPES:
+            raise ValueError(f"Unknown session type '{session_type}', expected one of {', '.join(SESSION_TYPES)}.")
+        mix[session_type] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("At least one session type needs a positive weight.")
+    return mix
+
+
+def _latencies(samples: List[Sample]) -> Dict[str, float]:
+    latencies = [sample.latency_ms for sample in samples]
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None}
+    return {
+        "p50": round(percentile(latencies, 0.50), 3),
+        "p95": round(percentile(latencies, 0.95), 3),
+        "p99": round(percentile(latencies, 0.99), 3),
+    }
+
+
+def summarize(samples: List[Sample], duration: float) -> List[Dict]:
+    """
+    Latency percentiles, error rate and throughput per endpoint over the whole run.
+    """
+    by_endpoint: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample.endpoint, []).append(sample)
+    summary = []
+    for endpoint, endpoint_samples in by_endpoint.items():
+        errors: Dict[str, int] = {}
+        for sample in endpoint_samples:
+            if sample.error is not None:
+                errors[sample.error] = errors.get(sample.error, 0) + 1
+        latencies = [sample.latency_ms for sample in endpoint_samples]
+        summary.append({
+            "endpoint": endpoint,
+            "requests": len(endpoint_samples),
+            "errors": sum(errors.values()),
+            "error_rate": round(sum(errors.values()) / len(endpoint_samples), 4),
+            "error_kinds": errors,
+            "latency_ms": {
+                **_latencies(endpoint_samples),
+                "mean": round(statistics.mean(latencies), 3),
+                "max": round(max(latencies), 3),
+            },
+            "requests_per_s": round(len(endpoint_samples) / duration, 3) if duration else None,
+        })
+    return sorted(summary, key=lambda entry: entry["endpoint"])
+
+
+def timeline(samples: List[Sample], interval: float, user_starts: List[float]) -> List[Dict]:
+    """
+    Throughput, error rate and latency per interval of the run, by the time requests
+    started, with the number of users active at the end of each interval.
+    """
+    if not samples:
+        return []
+    buckets: Dict[int, List[Sample]] = {}
+    for sample in samples:
+        buckets.setdefault(int(sample.started // interval), []).append(sample)
+    entries = []
+    for index in range(max(buckets) + 1):
+        bucket = buckets.get(index, [])
+        errors = sum(1 for sample in bucket if sample.error is not None)
+        by_endpoint: Dict[str, List[Sample]] = {}
+        for sample in bucket:
+            by_endpoint.setdefault(sample.endpoint, []).append(sample)
+        entries.append({
+            "start_s": round(index * interval, 3),
+            "active_users": sum(1 for started in user_starts if started < (index + 1) * interval),
+            "requests": len(bucket),
+            "requests_per_s": round(len(bucket) / interval, 3),
+            "errors": errors,
+            "error_rate": round(errors / len(bucket), 4) if bucket else 0.0,
+            "latency_ms": _latencies(bucket),
+            "p95_by_endpoint_ms": {endpoint: _latencies(items)["p95"] for endpoint, items in sorted(by_endpoint.items())},
+        })
+    return entries
+
+
+def find_saturation(entries: List[Dict]) -> Optional[Dict]:
+    """
+    The interval with the highest throughput; past this point more users no longer
+    yield more completed requests.
+    """
+    busy = [entry for entry in entries if entry["requests"]]
+    if not busy:
+        return None
+    peak = max(busy, key=lambda entry: entry["requests_per_s"])
+    return {
+        "start_s": peak["start_s"],
+        "active_users": peak["active_users"],
+        "requests_per_s": peak["requests_per_s"],
+        "p95_ms": peak["latency_ms"]["p95"],
+        "error_rate": peak["error_rate"],
+    }
+
+
+class LoadUser:
+    """
+    A virtual user running one session after the other until the deadline.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, samples: List[Sample], documents: List[SyntheticDocument],
+                 session_mix: Dict[str, float], think_time: float, presidio_config: Optional[dict],
+                 rng: random.Random, started_at: float, deadline: float, user_id: int):
+        self.client = client
+        self.samples = samples
+        self.documents = documents
+        self.session_types = list(session_mix)
+        self.session_weights = [session_mix[session_type] for session_type in self.session_types]
+        self.think_time = think_time
+        self.presidio_config = presidio_config
+        self.rng = rng
+        self.started_at = started_at
+        self.deadline = deadline
+        self.user_id = user_id
+        self.sessions = 0
+
+    async def _call(self, method: str, path: str, endpoint: Optional[str] = None, payload: Optional[dict] = None) -> Optional[dict]:
+        start = time.perf_counter()
+        status = None
+        error = None
+        body = None
+        try:
+            response = await self.client.request(method, path, json=payload)
+            status = response.status_code
+            if status == 200:
+                body = response.json()
+            else:
+                error = f"HTTP {status}"
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        self.samples.append(Sample(start - self.started_at, endpoint or path, (time.perf_counter() - start) * 1000, status, error))
+        return body
+
+    async def _think(self):
+        # Time the user spends reading or editing between two requests.
+        if self.think_time > 0:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+
+    async def run_session(self, session_type: str):
+        document = self.rng.choice(self.documents)
+        # A per-session suffix keeps the analysis cache from answering repeated documents.
+        text = f"{document.text} Reference {self.user_id}-{self.sessions}."
+        sanitized = await self._call("POST", "/api/sanitize", payload={"text": text, "presidio_config": self.presidio_config})
+        if sanitized is None:
+            return
+        token_map_id = sanitized["token_map_id"]
+        try:
+            if session_type == "review":
+                await self._review(token_map_id, document, sanitized["tokens"])
+            elif session_type == "detokenize":
+                await self._think()
+                await self._call("POST", "/api/detokenize", payload={"token_map_id": token_map_id, "text": sanitized["sanitized_text"]})
+        finally:
+            await self._call("DELETE", f"/api/tokens/{token_map_id}", endpoint=DELETE_TOKEN_MAP)
+
+    async def _review(self, token_map_id: str, document: SyntheticDocument, tokens: List[dict]):
+        await self._think()
+        await self._call("POST", "/api/tokens/manual", payload={
+            "token_map_id": token_map_id,
+            "text_to_tokenize": MANUAL_TOKEN_WORD,
+            "entity_type": "PROJECT",
+            "start": document.manual_token_start,
+            "end": document.manual_token_start + len(MANUAL_TOKEN_WORD),
+        })
+        if not tokens:
+            return
+        token = self.rng.choice(tokens)
+        await self._think()
+        await self._call("POST", "/api/tokens/update", payload={
+            "token_map_id": token_map_id,
+            "updates": [{"token": token["token"], "original_value": "Updated Value", "entity_type": token["entity_type"]}],
+        })
+        await self._think()
+        await self._call("POST", "/api/tokens/revert", payload={"token_map_id": token_map_id, "token": self.rng.choice(tokens)["token"]})
+
+    async def run(self):
+        while time.perf_counter() < self.deadline:
+            session_type = self.rng.choices(self.session_types, self.session_weights)[0]
+            await self.run_session(session_type)
+            self.sessions += 1
+            await self._think()
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    """
+    Polls /api/ready, honouring its Retry-After, until the backend has loaded its models.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            response = await client.get("/api/ready")
+            if response.status_code == 200:
+                return
+            retry_after = response.headers.get("retry-after")
+            if retry_after is None:
+                raise RuntimeError(f"The backend failed to start: {response.text[:500]}")
+            delay = float(retry_after)
+        except httpx.TransportError:
+            delay = 1.0
+        if time.monotonic() + delay > deadline:
+            raise RuntimeError(f"The backend was not ready after {timeout:.0f} seconds.")
+        await asyncio.sleep(delay)
+
+
+async def _report_progress(samples: List[Sample], user_starts: List[float], interval: float, stop: asyncio.Event):
+    reported = 0
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        entries = timeline(samples, interval, user_starts)
+        # The last interval is still filling up, unless the run has ended.
+        for entry in entries[reported:len(entries) if stop.is_set() else -1]:
+            latency = entry["latency_ms"]
+            print(
+                f"{entry['start_s']:>7.0f} s  users {entry['active_users']:>4}  {entry['requests_per_s']:>8.2f} req/s  "
+                f"p50 {latency['p50'] or 0:>9.2f} ms  p95 {latency['p95'] or 0:>9.2f} ms  p99 {latency['p99'] or 0:>9.2f} ms  "
+                f"errors {entry['error_rate'] * 100:>5.1f}%",
+                flush=True,
+            )
+            reported += 1
+
+
+async def run_load_test(args) -> Dict:
+    session_mix = parse_session_mix(args.sessions)
+    generator = CorpusGenerator(seed=args.seed, entity_density=args.density, entity_mix=parse_mix(args.mix))
+    # Generated up front, since building large documents would stall the event loop mid-run.
+    documents = [generator.document(parse_size(size), index) for size in args.sizes.split(",") for index in range(args.documents)]
+    presidio_config = {"profile": args.profile} if args.profile else None
+    rng = random.Random(args.seed)
+
+    samples: List[Sample] = []
+    user_starts: List[float] = []
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        await wait_until_ready(client, args.ready_timeout)
+        print(f"Running {args.users} users for {args.duration:.0f} s against {args.url}", flush=True)
+
+        started_at = time.perf_counter()
+        deadline = started_at + args.duration
+        stop = asyncio.Event()
+        reporter = asyncio.create_task(_report_progress(samples, user_starts, args.interval, stop))
+
+        async def start_user(user_id: int):
+            await asyncio.sleep(args.ramp * user_id / args.users)
+            user_starts.append(time.perf_counter() - started_at)
+            user = LoadUser(client, samples, documents, session_mix, args.think_time, presidio_config,
+                            random.Random(rng.random()), started_at, deadline, user_id)
+            await user.run()
+            return user.sessions
+
+        sessions = await asyncio.gather(*(start_user(user_id) for user_id in range(args.users)))
+        elapsed = time.perf_counter() - started_at
+        stop.set()
+        await reporter
+
+    entries = timeline(samples, args.interval, user_starts)
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "url": args.url,
+            "users": args.users,
+            "ramp_s": args.ramp,
+            "duration_s": args.duration,
+            "elapsed_s": round(elapsed, 3),
+            "think_time_s": args.think_time,
+            "session_mix": session_mix,
+            "sessions_completed": sum(sessions),
+            "sizes": args.sizes,
+            "seed": args.seed,
+            "entity_density": args.density,
+            "entity_mix": parse_mix(args.mix),
+            "profile": args.profile,
+        },
+        "endpoints": summarize(samples, elapsed),
+        "timeline": entries,
+        "saturation": find_saturation(entries),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend base URL (default: http://127.0.0.1:8000)")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users (default: 10)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds over which users are started (default: 0, all at once)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds after which users stop starting requests (default: 60)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Reporting interval in seconds (default: 5)")
+    parser.add_argument("--sessions", default=DEFAULT_SESSION_MIX, help=f"Session type weights (default: {DEFAULT_SESSION_MIX})")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between a user's requests in seconds (default: 1)")
+    parser.add_argument("--sizes", default="10KB", help="Comma-separated document sizes to pick from (default: 10KB)")
+    parser.add_argument("--documents", type=int, default=10, help="Distinct documents per size (default: 10)")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus and session seed (default: 1234)")
+    parser.add_argument("--density", type=float, default=2.0, help="Entities per 100 words (default: 2)")
+    parser.add_argument("--mix", help="Entity type weights, e.g. PERSON=3,EMAIL_ADDRESS=1 (default: all types)")
+    parser.add_argument("--profile", help="Analysis profile to sanitize with (default: the configured default)")
+    parser.add_argument("--timeout", type=float, default=90.0, help="Request timeout in seconds, as in the frontend (default: 90)")
+    parser.add_argument("--ready-timeout", type=float, default=600.0, help="Seconds to wait for the backend to load (default: 600)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/load-<timestamp>-<commit>.json)")
+    args = parser.parse_args(argv)
+    if args.users < 1 or args.interval <= 0:
+        parser.error("--users must be at least 1 and --interval positive.")
+    try:
+        parse_session_mix(args.sessions)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(run_load_test(args))
+
+    print()
+    for entry in report["endpoints"]:
+        latency = entry["latency_ms"]
+        print(
+            f"{entry['endpoint']:<34} {entry['requests']:>7} req  {entry['requests_per_s']:>8.2f} req/s  "
+            f"p50 {latency['p50']:>9.2f} ms  p95 {latency['p95']:>9.2f} ms  p99 {latency['p99']:>9.2f} ms  "
+            f"errors {entry['error_rate'] * 100:>5.1f}%"
+        )
+    saturation = report["saturation"]
+    if saturation:
+        print(
+            f"Peak throughput {saturation['requests_per_s']:.2f} req/s with {saturation['active_users']} users "
+            f"(p95 {saturation['p95_ms']:.2f} ms) at {saturation['start_s']:.0f} s"
+        )
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"load-{stamp}-{report['meta']['git_commit'] or 'unknown'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmarks the trimmed spaCy pipeline of every configured analysis profile against the
+full pipeline of the same model.
+
+For each profile, the model is loaded once with the profile's `spacy_exclude` and
+`spacy_disable` and once with every component, and both run over the same seeded corpus.
+The report gives the loaded components, the memory allocated while loading, the NLP time
+per document, and whether the named entities found are identical:
+
+    cd backend
+    python -m benchmarks.pipeline --documents 200 --size 1KB
+
+Profiles come from the configured settings, so profiles added through ANALYSIS_PROFILES
+are included. Loading a large model several times takes a while and a few GB of memory.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+from app.services.presidio_service import TrimmedSpacyNlpEngine
+from benchmarks.corpus import CorpusGenerator
+from benchmarks.run import parse_size
+
+
+def _load_measured(model: str, exclude: List[str], disable: List[str]):
+    """
+    Loads a pipeline and returns it with the bytes allocated while loading.
+    """
+    tracemalloc.start()
+    try:
+        engine = TrimmedSpacyNlpEngine(models={"en": model}, exclude=exclude, disable=disable)
+        return engine, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def _process(engine: TrimmedSpacyNlpEngine, corpus: List[str]):
+    """
+    Runs the pipeline over the corpus; returns ms per document and the entities found.
+    """
+    started = time.perf_counter()
+    entities = [
+        [(entity.label_, entity.start_char, entity.end_char) for entity in nlp_artifacts.entities]
+        for _, nlp_artifacts in engine.process_batch(corpus, language="en")
+    ]
+    return (time.perf_counter() - started) * 1000 / len(corpus), entities
+
+
+def benchmark_profiles(corpus: List[str], profiles: Dict) -> List[Dict]:
+    results = []
+    warmed_up = set()
+    for name, profile in profiles.items():
+        if profile.model not in warmed_up:
+            # Imports and caches shared by every load of the model would count towards the first one.
+            _load_measured(profile.model, [], [])
+            warmed_up.add(profile.model)
+        full_engine, full_bytes = _load_measured(profile.model, [], [])
+        full_ms, full_entities = _process(full_engine, corpus)
+        del full_engine
+        trimmed_engine, trimmed_bytes = _load_measured(profile.model, profile.spacy_exclude, profile.spacy_disable)
+        trimmed_ms, trimmed_entities = _process(trimmed_engine, corpus)
+        results.append({
+            "profile": name,
+            "model": profile.model,
+            "pipe_names": trimmed_engine.nlp["en"].pipe_names,
+            "trimmed": {"ms_per_document": round(trimmed_ms, 3), "load_mb": round(trimmed_bytes / (1024 * 1024), 1)},
+            "full": {"ms_per_document": round(full_ms, 3), "load_mb": round(full_bytes / (1024 * 1024), 1)},
+            "entities_match": trimmed_entities == full_entities,
+        })
+        del trimmed_engine
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", help="Comma-separated profiles to benchmark (default: all configured)")
+    parser.add_argument("--documents", type=int, default=200, help="Documents in the corpus (default: 200)")
+    parser.add_argument("--size", default="1KB", help="Size of each document (default: 1KB)")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus seed (default: 1234)")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    profiles = get_settings().ANALYSIS_PROFILES
+    if args.profiles:
+        unknown = set(args.profiles.split(",")) - set(profiles)
+        if unknown:
+            parser.error(f"Unknown profiles: {', '.join(sorted(unknown))}. Configured: {', '.join(sorted(profiles))}")
+        profiles = {name: profiles[name] for name in args.profiles.split(",")}
+
+    generator = CorpusGenerator(seed=args.seed)
+    corpus = [generator.document(parse_size(args.size), index).text for index in range(args.documents)]
+    results = benchmark_profiles(corpus, profiles)
+
+    for entry in results:
+        print(
+            f"{entry['profile']:<12} {entry['model']:<16} {', '.join(entry['pipe_names'])}\n"
+            f"  trimmed {entry['trimmed']['ms_per_document']:>9.3f} ms/doc  {entry['trimmed']['load_mb']:>8.1f} MB\n"
+            f"  full    {entry['full']['ms_per_document']:>9.3f} ms/doc  {entry['full']['load_mb']:>8.1f} MB\n"
+            f"  entities {'identical' if entry['entities_match'] else 'DIFFER'}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
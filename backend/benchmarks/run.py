@@ -0,0 +1,289 @@
+"""
+Benchmarks the sanitize and token map endpoints on a seeded synthetic corpus.
+
+Every repetition runs the review workflow on a fresh document: sanitize it, detokenize
+the sanitized text, add a manual token, update a token and revert one. Latency
+percentiles, throughput and peak memory are recorded per endpoint and document size and
+written as JSON, so runs can be compared across commits:
+
+    cd backend
+    python -m benchmarks.run --sizes 1KB,100KB,1MB --repeat 5
+    python -m benchmarks.run --sizes 1KB,100KB,1MB --compare benchmarks/results/<earlier run>.json
+
+The app runs in-process through FastAPI's TestClient with its configured settings, so
+no server needs to be started; LOG_LEVEL defaults to WARNING. Each document is distinct,
+so the analysis cache does not skew the sanitize numbers.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+from fastapi.testclient import TestClient
+
+from benchmarks.corpus import DEFAULT_ENTITY_MIX, MANUAL_TOKEN_WORD, CorpusGenerator
+
+ENDPOINTS = ["/api/sanitize", "/api/detokenize", "/api/tokens/manual", "/api/tokens/update", "/api/tokens/revert"]
+DEFAULT_SIZES = "1KB,10KB,100KB,1MB,5MB"
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+_UNITS = {"KB": 1024, "MB": 1024 * 1024, "B": 1}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().upper()
+    for unit, factor in _UNITS.items():
+        if value.endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+def parse_mix(value: Optional[str]) -> Dict[str, float]:
+    if not value:
+        return dict(DEFAULT_ENTITY_MIX)
+    mix = {}
+    for item in value.split(","):
+        entity_type, _, weight = item.partition("=")
+        mix[entity_type.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile; exact for the small sample counts of a benchmark run.
+    """
+    ordered = sorted(samples)
+    return ordered[max(1, math.ceil(fraction * len(ordered))) - 1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class WorkflowBenchmark:
+    """
+    Runs the sanitize → detokenize → manual token → update → revert workflow and collects
+    per-endpoint timings.
+    """
+
+    def __init__(self, client: TestClient, presidio_config: Optional[dict] = None):
+        self.client = client
+        self.presidio_config = presidio_config
+
+    def _post(self, path: str, payload: dict, timings: Dict[str, float], measure: Callable) -> dict:
+        with measure(path, timings):
+            response = self.client.post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} failed with {response.status_code}: {response.text[:500]}")
+        return response.json()
+
+    def run(self, document, measure: Callable) -> Dict[str, float]:
+        timings: Dict[str, float] = {}
+        sanitized = self._post(
+            "/api/sanitize", {"text": document.text, "presidio_config": self.presidio_config}, timings, measure
+        )
+        token_map_id = sanitized["token_map_id"]
+        self._post("/api/detokenize", {"token_map_id": token_map_id, "text": sanitized["sanitized_text"]}, timings, measure)
+        self._post(
+            "/api/tokens/manual",
+            {
+                "token_map_id": token_map_id,
+                "text_to_tokenize": MANUAL_TOKEN_WORD,
+                "entity_type": "PROJECT",
+                "start": document.manual_token_start,
+                "end": document.manual_token_start + len(MANUAL_TOKEN_WORD),
+            },
+            timings,
+            measure,
+        )
+        tokens = [token for token in sanitized["tokens"] if not token["token"].startswith("[PROJECT")]
+        if tokens:
+            token = tokens[0]
+            self._post(
+                "/api/tokens/update",
+                {
+                    "token_map_id": token_map_id,
+                    "updates": [{"token": token["token"], "original_value": "Updated Value", "entity_type": token["entity_type"]}],
+                },
+                timings,
+                measure,
+            )
+            self._post("/api/tokens/revert", {"token_map_id": token_map_id, "token": tokens[-1]["token"]}, timings, measure)
+        self.client.delete(f"/api/tokens/{token_map_id}")
+        return timings
+
+
+class _Measure:
+    """
+    Records the latency of each call in milliseconds, or with `track_memory` its peak
+    traced allocations in MB.
+    """
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+
+    def __call__(self, path: str, timings: Dict[str, float]):
+        return _Timed(path, timings, self.track_memory)
+
+
+class _Timed:
+    def __init__(self, path: str, timings: Dict[str, float], track_memory: bool):
+        self.path = path
+        self.timings = timings
+        self.track_memory = track_memory
+
+    def __enter__(self):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            self.baseline = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.track_memory:
+            self.timings[self.path] = (tracemalloc.get_traced_memory()[1] - self.baseline) / (1024 * 1024)
+        else:
+            self.timings[self.path] = (time.perf_counter() - self.start) * 1000
+
+
+def run_benchmarks(args) -> Dict:
+    # Per-request INFO logging would dominate the timings of the token map endpoints.
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Imported here so that settings given through the environment apply.
+    from app.main import app
+
+    generator = CorpusGenerator(seed=args.seed, entity_density=args.density, entity_mix=parse_mix(args.mix))
+    presidio_config = {"profile": args.profile} if args.profile else None
+    results = []
+
+    with TestClient(app) as client:
+        if not client.app.state.readiness.wait(timeout=600):
+            raise RuntimeError(f"The backend failed to start: {client.app.state.readiness.error}")
+        benchmark = WorkflowBenchmark(client, presidio_config)
+        benchmark.run(generator.document(1024, index=-1), _Measure())  # Warm-up
+
+        for size in [parse_size(size) for size in args.sizes.split(",")]:
+            documents = [generator.document(size, index) for index in range(args.repeat)]
+            samples: Dict[str, List[float]] = {path: [] for path in ENDPOINTS}
+            for document in documents:
+                for path, elapsed_ms in benchmark.run(document, _Measure()).items():
+                    samples[path].append(elapsed_ms)
+
+            peak_memory: Dict[str, float] = {}
+            if not args.no_memory:
+                # A separate pass, since tracing allocations slows everything down.
+                tracemalloc.start()
+                try:
+                    peak_memory = benchmark.run(generator.document(size, index=args.repeat), _Measure(track_memory=True))
+                finally:
+                    tracemalloc.stop()
+
+            document_bytes = statistics.mean(len(document.text) for document in documents)
+            entity_count = statistics.mean(len(document.entities) for document in documents)
+            for path, latencies in samples.items():
+                if not latencies:
+                    continue
+                total_seconds = sum(latencies) / 1000
+                results.append({
+                    "endpoint": path,
+                    "size_bytes": size,
+                    "document_bytes": round(document_bytes),
+                    "entities_per_document": round(entity_count, 1),
+                    "runs": len(latencies),
+                    "latency_ms": {
+                        "p50": round(percentile(latencies, 0.50), 3),
+                        "p95": round(percentile(latencies, 0.95), 3),
+                        "p99": round(percentile(latencies, 0.99), 3),
+                        "mean": round(statistics.mean(latencies), 3),
+                        "min": round(min(latencies), 3),
+                        "max": round(max(latencies), 3),
+                    },
+                    "throughput": {
+                        "requests_per_s": round(len(latencies) / total_seconds, 3) if total_seconds else None,
+                        "mb_per_s": round(document_bytes * len(latencies) / (1024 * 1024) / total_seconds, 3) if total_seconds else None,
+                    },
+                    "peak_memory_mb": round(peak_memory[path], 3) if path in peak_memory else None,
+                })
+                print(
+                    f"{path:<22} {size:>9} B  p50 {results[-1]['latency_ms']['p50']:>10.2f} ms  "
+                    f"p95 {results[-1]['latency_ms']['p95']:>10.2f} ms  "
+                    f"peak {results[-1]['peak_memory_mb'] if results[-1]['peak_memory_mb'] is not None else '-'} MB",
+                    flush=True,
+                )
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "entity_density": args.density,
+            "entity_mix": parse_mix(args.mix),
+            "repeat": args.repeat,
+            "profile": args.profile,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """
+    Describes the p50 and p95 latency change of every endpoint and size found in both runs.
+    """
+    previous = {(entry["endpoint"], entry["size_bytes"]): entry for entry in baseline["results"]}
+    lines = [f"Compared with {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')}):"]
+    for entry in current["results"]:
+        before = previous.get((entry["endpoint"], entry["size_bytes"]))
+        if before is None:
+            continue
+        changes = []
+        for key in ("p50", "p95"):
+            old, new = before["latency_ms"][key], entry["latency_ms"][key]
+            changes.append(f"{key} {old:.2f} -> {new:.2f} ms ({(new - old) / old * 100:+.1f}%)" if old else f"{key} {new:.2f} ms")
+        lines.append(f"  {entry['endpoint']:<22} {entry['size_bytes']:>9} B  " + ", ".join(changes))
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated document sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=5, help="Documents per size (default: 5)")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus seed (default: 1234)")
+    parser.add_argument("--density", type=float, default=2.0, help="Entities per 100 words (default: 2)")
+    parser.add_argument("--mix", help="Entity type weights, e.g. PERSON=3,EMAIL_ADDRESS=1 (default: all types)")
+    parser.add_argument("--profile", help="Analysis profile to sanitize with (default: the configured default)")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the peak memory pass")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare latencies with")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['meta']['git_commit'] or 'unknown'}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n".join(compare(report, json.load(f))))
+
+
+if __name__ == "__main__":
+    main()
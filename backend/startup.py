@@ -6,6 +6,11 @@ import sys
 import os
 import logging
 
+# Start the startup timeline before anything else is imported. The module is lightweight,
+# and the application package is found next to this script in both layouts.
+from app.services.startup_timeline import startup_timeline
+startup_timeline.profiling = os.environ.get('STARTUP_PROFILING', '').lower() in ('1', 'true', 'yes')
+
 # Set up file logging immediately
 log_file = os.path.join(os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(__file__), 'startup.log')
 logging.basicConfig(
@@ -39,7 +44,8 @@ if getattr(sys, 'frozen', False):
 # Import uvicorn
 logger.info("Importing uvicorn...")
 try:
-    import uvicorn
+    with startup_timeline.phase("uvicorn import"):
+        import uvicorn
     logger.info("✓ uvicorn imported successfully")
 except Exception as e:
     logger.error(f"✗ Failed to import uvicorn: {e}")
@@ -47,10 +53,12 @@ except Exception as e:
     logger.error(traceback.format_exc())
     sys.exit(1)
 
-# Import the FastAPI app
+# Import the FastAPI app. Presidio and spaCy are only imported once the app starts up,
+# so this stays fast; their import time shows up as the "presidio import" phase.
 logger.info("Importing FastAPI app...")
 try:
-    from app.main import app
+    with startup_timeline.phase("app import"):
+        from app.main import app
     logger.info("✓ FastAPI app imported successfully")
 except Exception as e:
     logger.error(f"✗ Failed to import app: {e}")
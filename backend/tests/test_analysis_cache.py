@@ -0,0 +1,44 @@
+from presidio_analyzer import RecognizerResult
+
+from app.services.analysis_cache import AnalysisCache
+
+
+def _results(count=1):
+    return [RecognizerResult(entity_type="PERSON", start=index, end=index + 1, score=0.85) for index in range(count)]
+
+def test_cache_hit_and_miss():
+    cache = AnalysisCache(max_bytes=1024 * 1024)
+    key = AnalysisCache.make_key("John Doe", ["PERSON"], "v1")
+    assert cache.get(key) is None
+
+    cache.put(key, _results(2))
+    cached = cache.get(key)
+    assert [(r.entity_type, r.start, r.end, r.score) for r in cached] == [("PERSON", 0, 1, 0.85), ("PERSON", 1, 2, 0.85)]
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+def test_cache_key_covers_entities_and_registry_version():
+    key = AnalysisCache.make_key("John Doe", ["PERSON", "EMAIL_ADDRESS"], "v1")
+    assert key == AnalysisCache.make_key("John Doe", ["EMAIL_ADDRESS", "PERSON"], "v1")
+    assert key != AnalysisCache.make_key("John Doe", ["PERSON"], "v1")
+    assert key != AnalysisCache.make_key("John Doe", ["PERSON", "EMAIL_ADDRESS"], "v2")
+    assert key != AnalysisCache.make_key("John Doe.", ["PERSON", "EMAIL_ADDRESS"], "v1")
+
+def test_cache_evicts_least_recently_used_within_byte_limit():
+    probe = AnalysisCache(max_bytes=1024 * 1024)
+    probe.put("probe", _results(10))
+    entry_bytes = probe.get_stats()["bytes"]
+
+    cache = AnalysisCache(max_bytes=entry_bytes * 2)
+    cache.put("first", _results(10))
+    cache.put("second", _results(10))
+    cache.get("first")
+    cache.put("third", _results(10))
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["bytes"] <= entry_bytes * 2
@@ -0,0 +1,128 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from app.services.analysis_cache import AnalysisCache
+from app.services.analysis_executor import AnalysisExecutor, AnalysisQueueFullError
+
+
+@pytest.fixture
+def analysis_executor():
+    executor = AnalysisExecutor(max_workers=1, max_queue_size=1)
+    yield executor
+    executor.shutdown()
+
+def test_run_returns_result(analysis_executor):
+    result = asyncio.run(analysis_executor.run(lambda a, b=0: a + b, 2, b=3))
+    assert result == 5
+    stats = analysis_executor.get_stats()
+    assert stats["completed"] == 1
+    assert stats["queued"] == 0
+    assert stats["running"] == 0
+
+def test_run_propagates_exceptions(analysis_executor):
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        asyncio.run(analysis_executor.run(fail))
+    assert analysis_executor.get_stats()["failed"] == 1
+
+def test_run_rejects_when_queue_is_full(analysis_executor):
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(analysis_executor.run(release.wait))
+        queued = asyncio.ensure_future(analysis_executor.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(AnalysisQueueFullError):
+            await analysis_executor.run(lambda: "rejected")
+        release.set()
+        return await running, await queued
+
+    assert asyncio.run(scenario()) == (True, "queued")
+    stats = analysis_executor.get_stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["max_wait_ms"] > 0
+
+def test_event_loop_stays_responsive(analysis_executor):
+    async def scenario():
+        slow_job = asyncio.ensure_future(analysis_executor.run(time.sleep, 0.3))
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        loop_latency = time.perf_counter() - started
+        await slow_job
+        return loop_latency
+
+    assert asyncio.run(scenario()) < 0.2
+
+class _PidAnalyzer:
+    """
+    Minimal stand-in for PresidioService that reports which process did the analysis.
+    """
+
+    def analyze_text(self, text, entities=None, raise_errors=False, profile=None):
+        from presidio_analyzer import RecognizerResult
+        return [RecognizerResult(entity_type="PID", start=0, end=len(text), score=float(os.getpid()))]
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork start method not available")
+def test_process_mode_analyzes_in_forked_workers():
+    executor = AnalysisExecutor(max_workers=2, max_queue_size=8, mode="process", presidio_service=_PidAnalyzer())
+    try:
+        assert len(executor.worker_pids) == 2
+        assert os.getpid() not in executor.worker_pids
+
+        async def scenario():
+            return await asyncio.gather(*(executor.analyze(f"text {i}") for i in range(8)))
+
+        batches = asyncio.run(scenario())
+        assert all(len(results) == 1 for results in batches)
+        assert {int(results[0].score) for results in batches} <= set(executor.worker_pids)
+        assert executor.get_stats()["mode"] == "process"
+    finally:
+        executor.shutdown()
+
+class _CountingAnalyzer:
+    """
+    Minimal stand-in for PresidioService that counts how often the analyzer runs.
+    """
+
+    supported_entities = ["PERSON"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def analyze_text(self, text, entities=None, raise_errors=False, profile=None):
+        from presidio_analyzer import RecognizerResult
+        self.calls += 1
+        return [RecognizerResult(entity_type="PERSON", start=0, end=len(text), score=0.85)]
+
+    def analyze_batch(self, texts, entities=None, profile=None):
+        return [self.analyze_text(text, entities) for text in texts]
+
+    def profile_version(self, profile=None):
+        return f"test-{profile}"
+
+def test_cached_results_skip_the_analyzer():
+    analyzer = _CountingAnalyzer()
+    executor = AnalysisExecutor(presidio_service=analyzer, cache=AnalysisCache(max_bytes=1024 * 1024))
+    try:
+        async def scenario():
+            first = await executor.analyze("John Doe")
+            second = await executor.analyze("John Doe")
+            batch = await executor.analyze_batch(["John Doe", "Jane Roe"])
+            return first, second, batch
+
+        first, second, batch = asyncio.run(scenario())
+        assert [(r.start, r.end) for r in first] == [(r.start, r.end) for r in second] == [(0, 8)]
+        assert [(r.start, r.end) for r in batch[1]] == [(0, 8)]
+        assert analyzer.calls == 2
+        assert executor.get_stats()["cache"]["hits"] == 2
+        assert executor.get_stats()["completed"] == 2
+    finally:
+        executor.shutdown()
@@ -2,6 +2,9 @@ import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.readiness import ServiceReadiness
+from app.services.startup_timeline import StartupTimeline
+from unittest.mock import MagicMock
 from uuid import UUID
 
 
@@ -10,6 +13,8 @@ def client():
     # Ensure the app is properly initialized for testing
     test_app = app
     with TestClient(test_app) as c:
+        # The models load in the background after startup.
+        assert c.app.state.readiness.wait(timeout=300)
         yield c
 
 def test_health_check(client):
@@ -19,6 +24,148 @@ def test_health_check(client):
     assert "presidio_analyzer" in response.json()
     assert "token_map_service" in response.json()
 
+def test_ready_endpoint(client):
+    response = client.get("/api/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    assert response.json()["progress"] == 1.0
+
+
+def test_requests_are_rejected_while_loading(client):
+    ready = client.app.state.readiness
+    timeline = StartupTimeline()
+    loading = ServiceReadiness(timeline, ["presidio import", "spaCy load"])
+    with timeline.phase("presidio import"):
+        pass
+    client.app.state.readiness = loading
+    try:
+        response = client.post("/api/sanitize", json={"text": "My name is John Doe."})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(loading.retry_after_seconds)
+        assert response.json()["code"] == "SERVICE_STARTING"
+        assert response.json()["details"]["progress"] == 0.5
+
+        response = client.get("/api/ready")
+        assert response.status_code == 503
+        assert response.json()["completed_phases"] == ["presidio import"]
+
+        health = client.get("/api/health")
+        assert health.status_code == 200
+        assert health.json()["status"] == "starting"
+
+        loading.mark_failed(RuntimeError("model not installed"))
+        response = client.post("/api/sanitize", json={"text": "My name is John Doe."})
+        assert response.status_code == 503
+        assert response.json()["code"] == "SERVICE_UNAVAILABLE"
+        assert "Retry-After" not in response.headers
+        assert client.get("/api/health").json()["status"] == "unhealthy"
+    finally:
+        client.app.state.readiness = ready
+
+
+def test_process_mode_loads_services_before_listening(monkeypatch):
+    from app import main
+    from app.config import get_settings
+
+    loaded_on = []
+
+    def load_services(app, settings, timeline):
+        loaded_on.append(main.threading.current_thread())
+        app.state.analysis_executor = MagicMock()
+        app.state.token_map_service = MagicMock()
+
+    monkeypatch.setattr(get_settings(), "ANALYSIS_EXECUTOR_MODE", "process")
+    monkeypatch.setattr(main, "load_services", load_services)
+    with TestClient(FastAPI(lifespan=main.lifespan)) as c:
+        # No background loader: the services were loaded before the lifespan yielded.
+        assert c.app.state.readiness.is_ready
+        executor = c.app.state.analysis_executor
+    assert len(loaded_on) == 1
+    assert loaded_on[0].name != "service-loader"
+    executor.shutdown.assert_called_once()
+
+
+def test_failed_load_shuts_down_analysis_executor(monkeypatch):
+    from app import main
+    from app.config import get_settings
+    from app.services import presidio_service
+
+    class FakePresidioService:
+        def __init__(self, **kwargs):
+            pass
+
+        def analyze_text(self, text):
+            return []
+
+    class FakeAnalysisExecutor:
+        def __init__(self, **kwargs):
+            self.shut_down = False
+
+        def shutdown(self, wait=True):
+            self.shut_down = True
+
+    executors = []
+
+    def create_executor(**kwargs):
+        executors.append(FakeAnalysisExecutor(**kwargs))
+        return executors[-1]
+
+    def fail_to_create_store(*args, **kwargs):
+        raise RuntimeError("token map store unreachable")
+
+    monkeypatch.setattr(presidio_service, "PresidioService", FakePresidioService)
+    monkeypatch.setattr(main, "AnalysisExecutor", create_executor)
+    monkeypatch.setattr(main, "create_token_map_store", fail_to_create_store)
+    timeline = StartupTimeline()
+    readiness = ServiceReadiness(timeline, main.SERVICE_LOAD_PHASES)
+    main._load_services_and_mark_readiness(FastAPI(), get_settings(), readiness)
+
+    assert readiness.status == ServiceReadiness.FAILED
+    assert readiness.error == "token map store unreachable"
+    assert executors[0].shut_down
+
+
+def test_metrics_endpoint(client):
+    token_map_id = client.post(
+        "/api/sanitize", json={"text": "Mail john.doe@example.com", "presidio_config": {"entities": ["EMAIL_ADDRESS"]}}
+    ).json()["token_map_id"]
+    client.post("/api/detokenize", json={"token_map_id": token_map_id, "text": "[EMAIL_ADDRESS_1]"})
+    client.delete(f"/api/tokens/{token_map_id}")
+
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    for name in [
+        "redactflow_analyze_seconds_bucket",
+        "redactflow_resolve_conflicts_seconds_count",
+        "redactflow_anonymize_seconds_count",
+        "redactflow_detokenize_seconds_count",
+        'redactflow_token_map_store_seconds_count{operation="put"}',
+        'redactflow_input_characters_count{endpoint="sanitize"}',
+        'redactflow_detected_spans_bucket{endpoint="sanitize",le="1"}',
+        'redactflow_http_requests_total{method="POST",route="/api/sanitize",status="200"}',
+        'redactflow_http_requests_total{method="DELETE",route="/api/tokens/{token_map_id}",status="200"}',
+        "redactflow_token_maps ",
+        "# TYPE redactflow_analysis_rejected_jobs_total counter\nredactflow_analysis_rejected_jobs_total 0",
+        "redactflow_ready 1",
+    ]:
+        assert name in text
+
+def test_recognizer_stats_endpoint_when_disabled(client):
+    response = client.get("/api/debug/recognizers")
+    assert response.status_code == 404
+    assert response.json()["code"] == "RECOGNIZER_STATS_DISABLED"
+
+def test_health_check_reports_startup_timeline(client):
+    startup = client.get("/api/health").json()["startup"]
+    assert startup["completed"] is True
+    phases = [phase["name"] for phase in startup["phases"]]
+    for name in ["presidio import", "registry load", "spaCy load", "warm-up", "TokenMapService init"]:
+        assert name in phases
+    assert phases.index("registry load") < phases.index("spaCy load") < phases.index("warm-up")
+    assert all(phase["start_ms"] + phase["duration_ms"] <= startup["total_ms"] + 0.2 for phase in startup["phases"])
+
 def test_sanitize_text(client):
     text = "My name is John Doe and my email is john.doe@example.com."
     response = client.post(
@@ -146,3 +293,297 @@ def test_delete_token_map(client):
     )
     assert response.status_code == 404
     assert response.json()["code"] == "TOKEN_MAP_NOT_FOUND"
+
+def test_sanitize_batch(client):
+    texts = [
+        "My name is John Doe.",
+        "Contact me at jane.doe@example.com.",
+        "Nothing sensitive here.",
+    ]
+    response = client.post(
+        "/api/sanitize/batch",
+        json={
+            "texts": texts,
+            "presidio_config": {"entities": ["PERSON", "EMAIL_ADDRESS"]}
+        }
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["succeeded"] == 3
+    assert data["failed"] == 0
+    assert [item["index"] for item in data["results"]] == [0, 1, 2]
+    assert data["results"][0]["result"]["sanitized_text"] == "My name is [PERSON_1]."
+    assert data["results"][1]["result"]["sanitized_text"] == "Contact me at [EMAIL_ADDRESS_1]."
+    assert data["results"][2]["result"]["sanitized_text"] == texts[2]
+
+    # Each item gets its own, independently usable token map
+    token_map_ids = {item["result"]["token_map_id"] for item in data["results"]}
+    assert len(token_map_ids) == 3
+    detokenize_response = client.post(
+        "/api/detokenize",
+        json={
+            "token_map_id": data["results"][0]["result"]["token_map_id"],
+            "text": "[PERSON_1] says hi."
+        }
+    )
+    assert detokenize_response.json()["detokenized_text"] == "John Doe says hi."
+
+def test_sanitize_stream_matches_sanitize(client, monkeypatch):
+    import json
+    from app.config import get_settings
+    monkeypatch.setattr(get_settings(), "SANITIZE_STREAM_CHUNK_SIZE", 120)
+
+    text = " ".join(
+        f"Section {i}: My name is John Doe and my email is john.doe@example.com." for i in range(6)
+    )
+    payload = {"text": text, "presidio_config": {"entities": ["PERSON", "EMAIL_ADDRESS"]}}
+
+    with client.stream("POST", "/api/sanitize/stream", json=payload) as response:
+        assert response.status_code == 200
+        events = [json.loads(line) for line in response.iter_lines() if line]
+
+    assert events[0]["event"] == "start"
+    assert events[-1]["event"] == "end"
+    segments = [event for event in events if event["event"] == "segment"]
+    assert len(segments) > 1
+
+    expected = client.post("/api/sanitize", json=payload).json()
+    assert "".join(segment["sanitized_text"] for segment in segments) == expected["sanitized_text"]
+    assert [t for segment in segments for t in segment["tokens"]] == expected["tokens"]
+
+    # The announced token map is usable for detokenization
+    detokenize_response = client.post(
+        "/api/detokenize",
+        json={"token_map_id": events[0]["token_map_id"], "text": "[PERSON_1] <[EMAIL_ADDRESS_1]>"}
+    )
+    assert detokenize_response.json()["detokenized_text"] == "John Doe <john.doe@example.com>"
+
+def test_sanitize_stream_disconnect_deletes_token_map(client):
+    import asyncio
+    import json
+    from types import SimpleNamespace
+    from uuid import UUID
+    from app.models.requests import SanitizeRequest
+    from app.routes.sanitize import _sanitize_stream
+
+    async def disconnect_after_start():
+        request = SimpleNamespace(app=client.app)
+        stream = _sanitize_stream(request, SanitizeRequest(text="My name is John Doe."), "accurate")
+        start = json.loads(await stream.__anext__())
+        # What Starlette does when the client goes away mid-response.
+        await stream.aclose()
+        return UUID(start["token_map_id"])
+
+    token_map_id = asyncio.run(disconnect_after_start())
+    assert client.app.state.token_map_service.get_token_map_entry(token_map_id) is None
+
+def test_detokenize_stream(client):
+    sanitize_response = client.post(
+        "/api/sanitize",
+        json={"text": "My name is Jane Doe.", "presidio_config": {"entities": ["PERSON"]}}
+    )
+    token_map_id = sanitize_response.json()["token_map_id"]
+
+    with client.websocket_connect(f"/api/detokenize/stream?token_map_id={token_map_id}") as websocket:
+        output = []
+        for fragment in ["Hello [PER", "SON_", "1], how", " are you?"]:
+            websocket.send_json({"text": fragment})
+            output.append(websocket.receive_json()["text"])
+        websocket.send_json({"event": "end"})
+        final = websocket.receive_json()
+        assert final["event"] == "end"
+        output.append(final["text"])
+
+    assert output[0] == "Hello "
+    assert "".join(output) == "Hello Jane Doe, how are you?"
+
+def test_detokenize_stream_invalid_token_map_id(client):
+    with client.websocket_connect("/api/detokenize/stream?token_map_id=00000000-0000-0000-0000-000000000000") as websocket:
+        assert websocket.receive_json()["code"] == "TOKEN_MAP_NOT_FOUND"
+
+def test_detokenize_stream_invalid_message(client):
+    from starlette.websockets import WebSocketDisconnect
+
+    sanitize_response = client.post(
+        "/api/sanitize",
+        json={"text": "My name is Jane Doe.", "presidio_config": {"entities": ["PERSON"]}}
+    )
+    token_map_id = sanitize_response.json()["token_map_id"]
+
+    for send in (
+        lambda websocket: websocket.send_text("not json"),
+        lambda websocket: websocket.send_json(["[PERSON_1]"]),
+        lambda websocket: websocket.send_json({"text": 42}),
+    ):
+        with client.websocket_connect(f"/api/detokenize/stream?token_map_id={token_map_id}") as websocket:
+            send(websocket)
+            assert websocket.receive_json()["code"] == "INVALID_MESSAGE"
+            with pytest.raises(WebSocketDisconnect) as disconnect:
+                websocket.receive_json()
+            assert disconnect.value.code == 1003
+
+def test_manual_token(client):
+    text = "My name is John Doe. Project Bluebird ships soon, Bluebird is secret."
+    sanitize_response = client.post("/api/sanitize", json={"text": text, "presidio_config": {"entities": ["PERSON"]}})
+    token_map_id = sanitize_response.json()["token_map_id"]
+    start = text.index("Bluebird")
+
+    response = client.post(
+        "/api/tokens/manual",
+        json={"token_map_id": token_map_id, "text_to_tokenize": "Bluebird", "entity_type": "PROJECT", "start": start, "end": start + 8},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["additional_occurrences"] == 1
+    assert data["sanitized_text"] == "My name is [PERSON_1]. Project [PROJECT_1] ships soon, [PROJECT_1] is secret."
+    assert [token["token"] for token in data["tokens"]] == ["[PERSON_1]", "[PROJECT_1]", "[PROJECT_1]"]
+
+    overlap_response = client.post(
+        "/api/tokens/manual",
+        json={"token_map_id": token_map_id, "text_to_tokenize": "John", "entity_type": "PROJECT", "start": 11, "end": 15},
+    )
+    assert overlap_response.status_code == 400
+    assert overlap_response.json()["code"] == "MANUAL_TOKEN_OVERLAP"
+
+
+def test_manual_token_without_occurrences_is_rejected(client):
+    text = "The Bluefinch team met John Doe."
+    token_map_id = client.post("/api/sanitize", json={"text": text, "presidio_config": {"entities": ["PERSON"]}}).json()["token_map_id"]
+    start = text.index("Bluefinch")
+
+    response = client.post(
+        "/api/tokens/manual",
+        json={"token_map_id": token_map_id, "text_to_tokenize": "Bluefin", "entity_type": "PROJECT", "start": start, "end": start + 7},
+    )
+    assert response.status_code == 400
+
+    # Nothing was stored, so the next token keeps its number and the value is not remembered.
+    response = client.post(
+        "/api/tokens/manual",
+        json={"token_map_id": token_map_id, "text_to_tokenize": "Bluefinch", "entity_type": "PROJECT", "start": start, "end": start + 9},
+    )
+    assert response.json()["sanitized_text"] == "The [PROJECT_1] team met [PERSON_1]."
+    response = client.post(
+        "/api/sanitize/incremental",
+        json={"token_map_id": token_map_id, "text": text + "\n\nBluefin is new.", "presidio_config": {"entities": ["PERSON"]}},
+    )
+    assert response.json()["sanitized_text"].endswith("Bluefin is new.")
+
+def test_revert_token(client):
+    text = "My name is John Doe and my email is john.doe@example.com."
+    sanitize_response = client.post(
+        "/api/sanitize", json={"text": text, "presidio_config": {"entities": ["PERSON", "EMAIL_ADDRESS"]}}
+    )
+    token_map_id = sanitize_response.json()["token_map_id"]
+
+    response = client.post("/api/tokens/revert", json={"token_map_id": token_map_id, "token": "[PERSON_1]"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sanitized_text"] == "My name is John Doe and my email is [EMAIL_ADDRESS_1]."
+    assert [token["token"] for token in data["tokens"]] == ["[EMAIL_ADDRESS_1]"]
+
+def test_incremental_sanitize_keeps_token_numbering(client):
+    text = "John Doe wrote this.\n\nNothing here.\n\nJane Smith replied."
+    sanitize_response = client.post("/api/sanitize", json={"text": text})
+    assert sanitize_response.json()["sanitized_text"] == "[PERSON_1] wrote this.\n\nNothing here.\n\n[PERSON_2] replied."
+
+    edited_text = "John Doe wrote this.\n\nContact jane@example.com or John Smith.\n\nJane Smith replied."
+    response = client.post(
+        "/api/sanitize/incremental",
+        json={"token_map_id": sanitize_response.json()["token_map_id"], "text": edited_text},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sanitized_text"] == (
+        "[PERSON_1] wrote this.\n\nContact [EMAIL_ADDRESS_1] or [PERSON_3].\n\n[PERSON_2] replied."
+    )
+    assert [token["start"] for token in data["tokens"]] == [0, 30, 50, 63]
+
+    detokenize_response = client.post(
+        "/api/detokenize", json={"token_map_id": data["token_map_id"], "text": data["sanitized_text"]}
+    )
+    assert detokenize_response.json()["detokenized_text"] == edited_text
+
+def test_incremental_sanitize_keeps_reviewer_decisions(client):
+    text = "Project Bluebird kickoff.\n\nJohn Doe and Jane Smith attended."
+    sanitize_response = client.post("/api/sanitize", json={"text": text, "presidio_config": {"entities": ["PERSON"]}})
+    token_map_id = sanitize_response.json()["token_map_id"]
+    start = text.index("Bluebird")
+    client.post(
+        "/api/tokens/manual",
+        json={"token_map_id": token_map_id, "text_to_tokenize": "Bluebird", "entity_type": "PROJECT", "start": start, "end": start + 8},
+    )
+    reverted = client.post("/api/tokens/revert", json={"token_map_id": token_map_id, "token": "[PERSON_2]"})
+    assert reverted.json()["sanitized_text"] == "Project [PROJECT_1] kickoff.\n\n[PERSON_1] and Jane Smith attended."
+
+    # Both paragraphs change, so both are analyzed again.
+    edited_text = "Project Bluebird kickoff, moved to Monday.\n\nJohn Doe and Jane Smith attended. Bluebird is on track."
+    response = client.post(
+        "/api/sanitize/incremental",
+        json={"token_map_id": token_map_id, "text": edited_text, "presidio_config": {"entities": ["PERSON"]}},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sanitized_text"] == (
+        "Project [PROJECT_1] kickoff, moved to Monday.\n\n[PERSON_1] and Jane Smith attended. [PROJECT_1] is on track."
+    )
+
+    # The decisions carry over to the new token map.
+    response = client.post(
+        "/api/sanitize/incremental",
+        json={"token_map_id": data["token_map_id"], "text": edited_text + " Bluebird ships soon.", "presidio_config": {"entities": ["PERSON"]}},
+    )
+    assert response.json()["sanitized_text"].endswith("and Jane Smith attended. [PROJECT_1] is on track. [PROJECT_1] ships soon.")
+
+def test_incremental_sanitize_keeps_entities_across_chunk_seams(client, monkeypatch):
+    from app.config import get_settings
+
+    text = "Notes from the call.\n\nCall the office."
+    token_map_id = client.post("/api/sanitize", json={"text": text}).json()["token_map_id"]
+
+    # The changed paragraph is split into two chunks at the space inside the phone number.
+    monkeypatch.setattr(get_settings(), "ANALYSIS_CHUNK_SIZE", 44)
+    monkeypatch.setattr(get_settings(), "ANALYSIS_CHUNK_OVERLAP", 20)
+    edited_text = "Notes from the call.\n\nCall the front desk of the office on (212) 555-0199 before noon."
+    response = client.post(
+        "/api/sanitize/incremental",
+        json={"token_map_id": token_map_id, "text": edited_text, "presidio_config": {"entities": ["PHONE_NUMBER"]}},
+    )
+    assert response.status_code == 200
+    assert "555-0199" not in response.json()["sanitized_text"]
+    assert "[PHONE_NUMBER_1]" in response.json()["sanitized_text"]
+
+def test_sanitize_unknown_profile(client):
+    response = client.post(
+        "/api/sanitize",
+        json={"text": "My name is John Doe.", "presidio_config": {"profile": "does-not-exist"}},
+    )
+    assert response.status_code == 400
+    assert response.json()["code"] == "UNKNOWN_ANALYSIS_PROFILE"
+
+    response = client.post(
+        "/api/sanitize/stream",
+        json={"text": "My name is John Doe.", "presidio_config": {"profile": "does-not-exist"}},
+    )
+    assert response.status_code == 400
+
+def test_sanitize_unavailable_profile(client, monkeypatch):
+    from app.config import AnalysisProfile
+
+    presidio_service = client.app.state.presidio_service
+    monkeypatch.setitem(presidio_service.profiles, "broken", AnalysisProfile(model="en_core_web_not_installed"))
+    build_engine = presidio_service._build_engine
+    attempts = []
+
+    def counting_build_engine(*args, **kwargs):
+        attempts.append(args)
+        return build_engine(*args, **kwargs)
+
+    monkeypatch.setattr(presidio_service, "_build_engine", counting_build_engine)
+    for text in ("My name is John Doe.", "My name is Jane Doe."):
+        response = client.post("/api/sanitize", json={"text": text, "presidio_config": {"profile": "broken"}})
+        assert response.status_code == 503
+        assert response.json()["code"] == "ANALYSIS_PROFILE_UNAVAILABLE"
+        assert "Retry-After" not in response.headers
+    # The failed load is remembered rather than retried on every request.
+    assert len(attempts) == 1
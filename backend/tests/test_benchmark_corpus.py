@@ -0,0 +1,70 @@
+import pytest
+
+from benchmarks.corpus import MANUAL_TOKEN_WORD, CorpusGenerator
+from benchmarks.load_test import Sample, find_saturation, parse_session_mix, summarize, timeline
+from benchmarks.run import compare, parse_size, percentile
+
+
+def test_corpus_is_reproducible_and_sized():
+    generator = CorpusGenerator(seed=7, entity_density=5)
+    document = generator.document(20_000)
+
+    assert document == CorpusGenerator(seed=7, entity_density=5).document(20_000)
+    assert document.text != generator.document(20_000, index=1).text
+    assert document.text != CorpusGenerator(seed=8, entity_density=5).document(20_000).text
+    assert 19_000 <= len(document.text) <= 20_000
+    assert document.text[document.manual_token_start:].startswith(MANUAL_TOKEN_WORD)
+    for entity in document.entities:
+        assert document.text[entity.start:entity.end] == entity.value
+
+
+def test_corpus_density_and_mix():
+    sparse = CorpusGenerator(seed=1, entity_density=1).document(50_000)
+    dense = CorpusGenerator(seed=1, entity_density=10).document(50_000)
+    assert len(dense.entities) > 5 * len(sparse.entities) > 0
+
+    emails_only = CorpusGenerator(seed=1, entity_density=5, entity_mix={"EMAIL_ADDRESS": 1}).document(10_000)
+    assert emails_only.entities
+    assert {entity.entity_type for entity in emails_only.entities} == {"EMAIL_ADDRESS"}
+    assert not CorpusGenerator(seed=1, entity_density=0).document(10_000).entities
+
+    with pytest.raises(ValueError):
+        CorpusGenerator(entity_mix={"PASSPORT": 1})
+
+
+def test_result_helpers():
+    assert parse_size("5MB") == 5 * 1024 * 1024
+    assert parse_size("1KB") == 1024
+    assert percentile(list(range(1, 101)), 0.95) == 95
+    assert percentile([3.0], 0.99) == 3.0
+
+    def run(p50):
+        return {"meta": {"git_commit": "abc"}, "results": [{"endpoint": "/api/sanitize", "size_bytes": 1024, "latency_ms": {"p50": p50, "p95": p50}}]}
+
+    assert "+100.0%" in compare(run(2.0), run(1.0))[1]
+
+
+def test_load_test_reports():
+    samples = [
+        Sample(0.5, "/api/sanitize", 10.0, 200, None),
+        Sample(1.5, "/api/sanitize", 30.0, 503, "HTTP 503"),
+        Sample(2.5, "/api/sanitize", 20.0, 200, None),
+        Sample(3.0, "/api/detokenize", 5.0, 200, None),
+        Sample(3.5, "/api/detokenize", 7.0, None, "ReadTimeout"),
+    ]
+
+    summary = {entry["endpoint"]: entry for entry in summarize(samples, duration=4.0)}
+    assert summary["/api/sanitize"]["requests"] == 3
+    assert summary["/api/sanitize"]["error_kinds"] == {"HTTP 503": 1}
+    assert summary["/api/sanitize"]["latency_ms"]["p50"] == 20.0
+    assert summary["/api/detokenize"]["error_rate"] == 0.5
+
+    entries = timeline(samples, interval=2.0, user_starts=[0.0, 2.5])
+    assert [entry["requests"] for entry in entries] == [2, 3]
+    assert [entry["active_users"] for entry in entries] == [1, 2]
+    assert entries[1]["p95_by_endpoint_ms"] == {"/api/detokenize": 7.0, "/api/sanitize": 20.0}
+    assert find_saturation(entries)["active_users"] == 2
+
+    assert parse_session_mix("review=1,detokenize") == {"review": 1.0, "detokenize": 1.0}
+    with pytest.raises(ValueError):
+        parse_session_mix("upload=1")
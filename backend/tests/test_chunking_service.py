@@ -0,0 +1,50 @@
+import pytest
+
+from app.services.chunking_service import DocumentChunker
+
+
+@pytest.fixture
+def chunker():
+    return DocumentChunker(chunk_size=200, overlap=40)
+
+def test_short_text_is_a_single_chunk(chunker):
+    text = "A short document."
+    chunks = chunker.split(text)
+    assert len(chunks) == 1
+    assert chunks[0] == (0, len(text), 0, len(text))
+
+def test_cores_tile_the_document(chunker):
+    text = "\n\n".join(f"Paragraph {i}. It has two sentences about item {i}." for i in range(40))
+    chunks = chunker.split(text)
+    assert len(chunks) > 1
+    assert chunks[0].core_start == 0
+    assert chunks[-1].core_end == len(text)
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.core_end == current.core_start
+    for chunk in chunks:
+        assert chunk.core_end - chunk.core_start <= chunker.chunk_size
+        assert chunk.window_start <= chunk.core_start
+        assert chunk.window_end >= chunk.core_end
+
+def test_cores_end_on_paragraph_breaks(chunker):
+    text = "\n\n".join(f"Paragraph {i}. It has two sentences about item {i}." for i in range(40))
+    for chunk in chunker.split(text)[:-1]:
+        assert text[chunk.core_end - 2:chunk.core_end] == "\n\n"
+
+def test_windows_do_not_cut_words(chunker):
+    text = " ".join(f"word{i}" for i in range(200))
+    for chunk in chunker.split(text):
+        assert chunk.window_start == 0 or text[chunk.window_start - 1] == " "
+        assert chunk.window_end == len(text) or text[chunk.window_end] == " "
+        assert chunk.window_start >= chunk.core_start - 2 * chunker.overlap
+
+def test_split_region_keeps_cores_inside_region():
+    text = "word " * 200
+    chunker = DocumentChunker(chunk_size=100, overlap=20)
+    chunks = chunker.split_region(text, 300, 600)
+    assert chunks[0].core_start == 300
+    assert chunks[-1].core_end == 600
+    assert all(chunk.core_end - chunk.core_start <= 100 for chunk in chunks)
+    assert all(a.core_end == b.core_start for a, b in zip(chunks, chunks[1:]))
+    assert chunks[0].window_start < 300 and chunks[-1].window_end > 600
+    assert chunker.split_region(text, 50, 50) == []
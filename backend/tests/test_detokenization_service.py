@@ -0,0 +1,57 @@
+from app.services.detokenization_service import Detokenizer, StreamingDetokenizer
+
+def test_detokenize_replaces_all_tokens():
+    detokenizer = Detokenizer({
+        "[PERSON_1]": {"original_value": "John Doe", "entity_type": "PERSON", "score": 0.85},
+        "[PERSON_10]": {"original_value": "Jane Roe", "entity_type": "PERSON", "score": 0.85},
+        "[EMAIL_ADDRESS_1]": {"original_value": "john@example.com", "entity_type": "EMAIL_ADDRESS", "score": 1.0},
+    })
+    text = "[PERSON_1] and [PERSON_10] share [EMAIL_ADDRESS_1]; [PERSON_1] again."
+    assert detokenizer.detokenize(text) == "John Doe and Jane Roe share john@example.com; John Doe again."
+
+def test_detokenize_leaves_unknown_brackets_untouched():
+    detokenizer = Detokenizer({"[PERSON_1]": {"original_value": "John Doe", "entity_type": "PERSON", "score": 1.0}})
+    assert detokenizer.detokenize("[PERSON_2] [note] [[PERSON_1]]") == "[PERSON_2] [note] [John Doe]"
+
+def test_detokenize_does_not_cascade_replacements():
+    # An original value that looks like a token is inserted verbatim, not replaced again.
+    detokenizer = Detokenizer({
+        "[PERSON_1]": {"original_value": "[PERSON_2]", "entity_type": "PERSON", "score": 1.0},
+        "[PERSON_2]": {"original_value": "Jane Roe", "entity_type": "PERSON", "score": 1.0},
+    })
+    assert detokenizer.detokenize("[PERSON_1]") == "[PERSON_2]"
+
+def test_detokenize_with_irregular_tokens():
+    detokenizer = Detokenizer({
+        "<<ID>>": {"original_value": "42", "entity_type": "ID", "score": 1.0},
+        "<<ID>>-X": {"original_value": "43", "entity_type": "ID", "score": 1.0},
+    })
+    assert detokenizer.detokenize("<<ID>>-X and <<ID>>") == "43 and 42"
+
+def test_detokenize_empty_mapping():
+    assert Detokenizer({}).detokenize("[PERSON_1]") == "[PERSON_1]"
+
+def test_streaming_detokenizer_holds_back_partial_tokens():
+    detokenizer = Detokenizer({
+        "[PERSON_1]": {"original_value": "John Doe", "entity_type": "PERSON", "score": 1.0},
+        "[PERSON_12]": {"original_value": "Jane Roe", "entity_type": "PERSON", "score": 1.0},
+    })
+    stream = StreamingDetokenizer(detokenizer)
+    assert stream.feed("Hello [PER") == "Hello "
+    assert stream.feed("SON_1") == ""
+    assert stream.feed("] and [PERSON_1") == "John Doe and "
+    assert stream.feed("2], [x] ok") == "Jane Roe, [x] ok"
+    assert stream.feed(" [PERSON_") == " "
+    assert stream.flush() == "[PERSON_"
+
+def test_streaming_detokenizer_matches_whole_text_detokenization():
+    mappings = {
+        f"[PERSON_{i}]": {"original_value": f"Person {i}", "entity_type": "PERSON", "score": 1.0}
+        for i in range(1, 30)
+    }
+    detokenizer = Detokenizer(mappings)
+    text = " ".join(f"[PERSON_{i}] met [PERSON_{i + 1}]." for i in range(1, 29))
+    for fragment_size in (1, 2, 3, 7):
+        stream = StreamingDetokenizer(detokenizer)
+        output = "".join(stream.feed(text[i:i + fragment_size]) for i in range(0, len(text), fragment_size))
+        assert output + stream.flush() == detokenizer.detokenize(text)
@@ -0,0 +1,26 @@
+from app.services.diff_service import DiffRegion, ParagraphDiffer
+
+
+def test_split_paragraphs_tiles_text():
+    text = "First paragraph.\n\nSecond one.\n  \nThird."
+    paragraphs = ParagraphDiffer.split_paragraphs(text)
+    assert [text[start:end] for start, end in paragraphs] == ["First paragraph.\n\n", "Second one.\n  \n", "Third."]
+
+def test_diff_finds_changed_paragraph():
+    old_text = "Alpha.\n\nBravo.\n\nCharlie."
+    new_text = "Alpha.\n\nBravo, edited and longer.\n\nCharlie."
+    regions = ParagraphDiffer().diff(old_text, new_text)
+    assert regions == [
+        DiffRegion(0, 8, 0, 8, False),
+        DiffRegion(8, 16, 8, 35, True),
+        DiffRegion(16, 24, 35, 43, False),
+    ]
+    assert old_text[16:24] == new_text[35:43] == "Charlie."
+
+def test_diff_handles_insertions_and_deletions():
+    old_text = "Alpha.\n\nBravo.\n\nCharlie."
+    regions = ParagraphDiffer().diff(old_text, "Alpha.\n\nNew.\n\nBravo.\n\nCharlie.")
+    assert [region for region in regions if region.changed] == [DiffRegion(8, 8, 8, 14, True)]
+
+    regions = ParagraphDiffer().diff(old_text, "Alpha.\n\nCharlie.")
+    assert [region for region in regions if region.changed] == [DiffRegion(8, 16, 8, 8, True)]
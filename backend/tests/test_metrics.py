@@ -0,0 +1,44 @@
+import pytest
+
+from app.services.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test latency.", [0.1, 1.0], ["kind"])
+    histogram.observe(0.05, kind="text")
+    histogram.observe(0.1, kind="text")
+    histogram.observe(5, kind="text")
+    with histogram.time(kind="batch"):
+        pass
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{kind="text",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{kind="text",le="1"} 2' in lines
+    assert 'test_seconds_bucket{kind="text",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{kind="text"} 5.15' in lines
+    assert 'test_seconds_count{kind="text"} 3' in lines
+    assert histogram.count(kind="batch") == 1
+
+
+def test_counter_and_gauges_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_requests_total", "Requests.", ["route"])
+    counter.inc(route="/api/x")
+    counter.inc(2, route='/api/"quoted"')
+
+    text = registry.render(gauges=[("test_live", "Live things.", 7)], counters=[("test_dropped_total", "Dropped things.", 3)])
+    assert 'test_requests_total{route="/api/x"} 1' in text
+    assert 'test_requests_total{route="/api/\\"quoted\\""} 2' in text
+    assert "# TYPE test_live gauge\ntest_live 7\n" in text
+    assert "# TYPE test_dropped_total counter\ntest_dropped_total 3\n" in text
+
+
+def test_labels_must_match():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "Test.", ["route"])
+    with pytest.raises(ValueError):
+        counter.inc(status="200")
+    with pytest.raises(ValueError):
+        registry.counter("test_total", "Registered twice.")
@@ -1,5 +1,9 @@
+
 import pytest
-from app.services.presidio_service import PresidioService
+from app.services.chunking_service import DocumentChunker
+from app.config import AnalysisProfile
+from app.services.presidio_service import PresidioService, UnknownAnalysisProfileError
+from app.services.tokenmap_store import TokenMapData
 from presidio_analyzer import RecognizerResult
 
 @pytest.fixture
@@ -106,4 +110,191 @@ def test_advanced_pii_detection_and_anonymization(advanced_presidio_service):
         "During his last bank visit, his account number [US_BANK_ACCOUNT_NUMBER_1] was verified. "
         "Once again, the clients name is [PERSON_1]."
     )
-    assert sanitized_text == expected_sanitized_text
\ No newline at end of file
+    assert sanitized_text == expected_sanitized_text
+
+def test_analyze_batch_matches_single_analysis(presidio_service):
+    texts = [
+        "My name is John Doe and my email is john.doe@example.com.",
+        "This is a sample text with no PII.",
+        "Jane Smith can be reached at jane@example.org.",
+    ]
+    batch_outcomes = presidio_service.analyze_batch(texts)
+    assert len(batch_outcomes) == len(texts)
+    for text, outcome in zip(texts, batch_outcomes):
+        single = presidio_service.analyze_text(text)
+        assert [(r.entity_type, r.start, r.end) for r in outcome] == [(r.entity_type, r.start, r.end) for r in single]
+
+def test_analyze_batch_isolates_failures(presidio_service, monkeypatch):
+    original_analyze = presidio_service.analyzer.analyze
+
+    def flaky_analyze(text, **kwargs):
+        if "explode" in text:
+            raise RuntimeError("recognizer failure")
+        return original_analyze(text=text, **kwargs)
+
+    monkeypatch.setattr(presidio_service.analyzer, "analyze", flaky_analyze)
+    outcomes = presidio_service.analyze_batch(["My name is John Doe.", "please explode", "Email john@example.com"])
+    assert isinstance(outcomes[1], RuntimeError)
+    assert any(r.entity_type == "PERSON" for r in outcomes[0])
+    assert any(r.entity_type == "EMAIL_ADDRESS" for r in outcomes[2])
+
+def test_chunked_analysis_matches_single_pass(advanced_presidio_service):
+    paragraph = (
+        "John Smith, born on 04/15/1985, lives in Springfield. "
+        "His email is john.smith@example.com and his SSN is 123-45-6789. "
+        "Jane Doe's account number 987654321 was verified."
+    )
+    text = "\n\n".join([paragraph] * 12)
+    chunker = DocumentChunker(chunk_size=400, overlap=120)
+    chunks = chunker.split(text)
+    assert len(chunks) > 1
+
+    chunk_results = [
+        advanced_presidio_service.analyze_chunk(text[c.window_start:c.window_end], c) for c in chunks
+    ]
+    chunked = advanced_presidio_service.merge_chunk_results(chunk_results)
+    single = advanced_presidio_service.analyze_text(text)
+    assert [(r.entity_type, r.start, r.end) for r in chunked] == [(r.entity_type, r.start, r.end) for r in single]
+
+    # Token numbering is identical to the single-pass result
+    assert advanced_presidio_service.anonymize_text(text, chunked)[0] == advanced_presidio_service.anonymize_text(text, single)[0]
+
+def test_requires_nlp_only_for_ner_entities(advanced_presidio_service):
+    assert advanced_presidio_service.requires_nlp(["PERSON", "EMAIL_ADDRESS"])
+    assert advanced_presidio_service.requires_nlp(None)
+    assert not advanced_presidio_service.requires_nlp(["EMAIL_ADDRESS", "US_SSN", "US_BANK_ACCOUNT_NUMBER"])
+
+def test_pattern_only_analysis_skips_spacy_pipeline(advanced_presidio_service, monkeypatch):
+    text = "Contact john.doe@example.com, reference 536-22-1234 and account 123456789."
+    entities = ["EMAIL_ADDRESS", "US_SSN", "US_BANK_ACCOUNT_NUMBER"]
+    full_results = advanced_presidio_service._resolve_conflicts(
+        advanced_presidio_service.analyzer.analyze(text=text, entities=entities, language="en")
+    )
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the spaCy pipeline must not run for pattern-only requests")
+
+    monkeypatch.setattr(advanced_presidio_service.analyzer.nlp_engine, "process_text", fail)
+    monkeypatch.setattr(advanced_presidio_service.analyzer.nlp_engine, "process_batch", fail)
+    fast_results = advanced_presidio_service.analyze_text(text, entities=entities, raise_errors=True)
+    batch_results = advanced_presidio_service.analyze_batch([text], entities=entities)[0]
+
+    expected = [(r.entity_type, r.start, r.end, r.score) for r in full_results]
+    assert {entity for entity, *_ in expected} == set(entities)
+    assert [(r.entity_type, r.start, r.end, r.score) for r in fast_results] == expected
+    assert [(r.entity_type, r.start, r.end, r.score) for r in batch_results] == expected
+
+def test_analysis_profiles_load_lazily():
+    service = PresidioService(
+        supported_entities=["PERSON", "EMAIL_ADDRESS"],
+        profiles={
+            "accurate": AnalysisProfile(),
+            "email_only": AnalysisProfile(context_enhancement=False, score_threshold=0.5, recognizers=["EmailRecognizer"]),
+        },
+        default_profile="accurate",
+    )
+    assert service.loaded_profiles() == ["accurate"]
+
+    text = "My name is John Doe and my email is john.doe@example.com."
+    assert {r.entity_type for r in service.analyze_text(text)} == {"PERSON", "EMAIL_ADDRESS"}
+    assert [r.entity_type for r in service.analyze_text(text, profile="email_only")] == ["EMAIL_ADDRESS"]
+    assert service.loaded_profiles() == ["accurate", "email_only"]
+    assert not service.requires_nlp(profile="email_only")
+    assert service.profile_version("accurate") != service.profile_version("email_only")
+
+    with pytest.raises(UnknownAnalysisProfileError):
+        service.analyze_text(text, profile="missing")
+
+def test_pattern_scanner_matches_pattern_recognizers():
+    entities = ["PERSON", "EMAIL_ADDRESS", "CREDIT_CARD", "US_SSN", "US_BANK_ACCOUNT_NUMBER", "IP_ADDRESS", "URL", "DATE_TIME"]
+    profiles = {
+        "scanned": AnalysisProfile(),
+        "plain": AnalysisProfile(pattern_scanner=False),
+    }
+    service = PresidioService(supported_entities=entities, profiles=profiles, default_profile="scanned")
+    assert any(type(r).__name__ == "ScannedPatternRecognizer" for r in service.analyzer.registry.recognizers)
+
+    texts = [
+        "John Doe, SSN 536-22-1234, card 4111111111111111, account 123456789.",
+        "Mail john.doe@example.com or visit https://www.example.com/help from 192.168.0.1 on 01/02/2024.",
+        "ssn: 536 22 1234 and 536221234 and 111-11-1111, www.example.org, 4111-1111-1111-1112",
+    ]
+    for text in texts:
+        for requested in (entities, ["US_SSN", "CREDIT_CARD", "URL"]):
+            scanned = service.analyze_text(text, entities=requested, profile="scanned")
+            plain = service.analyze_text(text, entities=requested, profile="plain")
+            assert [(r.entity_type, r.start, r.end, r.score) for r in scanned] == [
+                (r.entity_type, r.start, r.end, r.score) for r in plain
+            ]
+
+def test_prefilter_preserves_results():
+    entities = ["PERSON", "EMAIL_ADDRESS", "PHONE_NUMBER", "CREDIT_CARD", "US_SSN", "US_BANK_ACCOUNT_NUMBER", "IP_ADDRESS", "URL", "CRYPTO"]
+    profiles = {
+        "filtered": AnalysisProfile(),
+        "unfiltered": AnalysisProfile(prefilter=False),
+    }
+    service = PresidioService(supported_entities=entities, profiles=profiles, default_profile="filtered")
+
+    texts = [
+        "John Doe will call tomorrow.",
+        "Call 212-555-1234 or +49 30 1234567, ext 12.",
+        "SSN 536-22-1234, card 4111 1111 1111 1111, account 123456789.",
+        "Mail john.doe@example.com from 10.0.0.1 or ::1, see example.org.",
+        "Wallet 1BoatSLRHtKNngkdXEeobR76b53LETtpyT was used.",
+        "Numbers 12 345 6789 and 2024",
+    ]
+    for text in texts:
+        for requested in (entities, ["EMAIL_ADDRESS", "US_SSN", "PHONE_NUMBER"]):
+            filtered = service.analyze_text(text, entities=requested, profile="filtered")
+            unfiltered = service.analyze_text(text, entities=requested, profile="unfiltered")
+            assert [(r.entity_type, r.start, r.end, r.score) for r in filtered] == [
+                (r.entity_type, r.start, r.end, r.score) for r in unfiltered
+            ]
+
+    skipped = service.get_prefilter_stats()["filtered"]["skipped"]
+    assert skipped["EmailRecognizer"] > 0
+    assert skipped["PhoneRecognizer"] > 0
+    assert "unfiltered" not in service.get_prefilter_stats()
+
+
+def test_recognizer_stats_time_recognizers_and_count_discards():
+    entities = ["PERSON", "EMAIL_ADDRESS", "URL", "PHONE_NUMBER"]
+    service = PresidioService(supported_entities=entities, recognizer_stats=True)
+    plain = PresidioService(supported_entities=entities)
+    text = "John Smith wrote from john.smith@example.com, call 212-555-1234."
+
+    results = service.analyze_text(text)
+    assert [(r.entity_type, r.start, r.end) for r in results] == [
+        (r.entity_type, r.start, r.end) for r in plain.analyze_text(text)
+    ]
+    service.analyze_batch([text, "No entities here."])
+
+    stats = {entry["recognizer"]: entry for entry in service.recognizer_stats.get_stats()}
+    assert stats["EmailRecognizer"]["calls"] == 2
+    assert stats["EmailRecognizer"]["kept"] == 2
+    # The URL recognizer also matches the domain inside the email address, which loses the conflict.
+    assert stats["UrlRecognizer"]["discarded"] >= 2
+    assert stats["UrlRecognizer"]["discard_rate"] > 0
+    assert stats["spaCy pipeline"]["calls"] >= 3
+    assert all(entry["total_ms"] >= 0 for entry in stats.values())
+
+    service.recognizer_stats.reset()
+    assert service.recognizer_stats.get_stats() == []
+    assert plain.recognizer_stats is None
+
+
+def test_integrate_manual_token_reuses_existing_token(presidio_service):
+    text = "Ask Doe. Doe knows."
+    token_map_data = TokenMapData(
+        {"[PERSON_1]": {"original_value": "Doe", "entity_type": "PERSON", "score": 0.85}},
+        text,
+        [{"token": "[PERSON_1]", "original_value": "Doe", "entity_type": "PERSON", "start": 4, "end": 7, "score": 0.85}],
+        60,
+    )
+    manual_token = {"text_to_tokenize": "Doe", "entity_type": "SURNAME", "start": 9, "end": 12}
+    new_mappings, new_occurrences, _ = presidio_service.integrate_manual_token(token_map_data, manual_token)
+    assert new_mappings == {}
+    assert [(o["token"], o["entity_type"], o["start"]) for o in new_occurrences] == [("[PERSON_1]", "PERSON", 9)]
+
+    with pytest.raises(ValueError):
+        presidio_service.integrate_manual_token(token_map_data, {"text_to_tokenize": "Do", "entity_type": "NAME", "start": 9, "end": 11})
@@ -0,0 +1,33 @@
+from presidio_analyzer import Pattern, PatternRecognizer
+
+from app.services.recognizer_prefilter import PrefilterRule, RecognizerPrefilter
+
+
+def _recognizer(name, entity):
+    return PatternRecognizer(supported_entity=entity, name=name, patterns=[Pattern(name=name, regex=r"x", score=0.5)])
+
+
+def test_prefilter_drops_entities_whose_recognizers_cannot_match():
+    prefilter = RecognizerPrefilter(
+        [_recognizer("Email", "EMAIL_ADDRESS"), _recognizer("Ssn", "US_SSN"), _recognizer("Name", "PERSON")],
+        rules={"Email": PrefilterRule(any_chars="@"), "Ssn": PrefilterRule(min_digit_run=4, min_digits=9)},
+    )
+    entities = ["EMAIL_ADDRESS", "US_SSN", "PERSON"]
+
+    assert prefilter.filter_entities("Call me, John.", entities) == ["PERSON"]
+    assert prefilter.filter_entities("john@example.com 123-45-6789", entities) == entities
+    assert prefilter.filter_entities("ids 123 456 789", entities) == ["PERSON"]  # 9 digits, but no run of 4
+    assert prefilter.filter_entities("1234 56789", ["US_SSN"]) == ["US_SSN"]
+
+    stats = prefilter.get_stats()
+    assert stats["texts"] == 4
+    assert stats["skipped"] == {"Email": 2, "Ssn": 2}
+
+
+def test_prefilter_keeps_entities_with_an_unfiltered_recognizer():
+    prefilter = RecognizerPrefilter(
+        [_recognizer("Email", "EMAIL_ADDRESS"), _recognizer("Email Fallback", "EMAIL_ADDRESS")],
+        rules={"Email": PrefilterRule(any_chars="@")},
+    )
+    assert prefilter.filter_entities("no address here", ["EMAIL_ADDRESS"]) == ["EMAIL_ADDRESS"]
+    assert prefilter.get_stats()["skipped"] == {"Email": 0}
@@ -0,0 +1,43 @@
+import logging
+import time
+
+from app.services.startup_timeline import StartupTimeline, timed_phase
+
+
+def test_timeline_records_phases_in_order():
+    timeline = StartupTimeline()
+    with timeline.phase("first"):
+        time.sleep(0.01)
+    with timed_phase(timeline, "second"):
+        pass
+    with timed_phase(None, "ignored"):
+        pass
+
+    report = timeline.as_dict()
+    assert report["completed"] is False
+    assert [phase["name"] for phase in report["phases"]] == ["first", "second"]
+    first, second = report["phases"]
+    assert first["duration_ms"] >= 10
+    assert second["start_ms"] >= first["start_ms"] + first["duration_ms"] - 0.1
+
+    timeline.complete()
+    assert timeline.as_dict()["completed"] is True
+    assert timeline.as_dict()["total_ms"] >= first["duration_ms"]
+
+
+def test_failed_phase_is_still_recorded():
+    timeline = StartupTimeline()
+    try:
+        with timeline.phase("broken"):
+            raise RuntimeError("model missing")
+    except RuntimeError:
+        pass
+    assert [phase["name"] for phase in timeline.phases()] == ["broken"]
+
+
+def test_profiling_mode_logs_the_slowest_functions(caplog):
+    timeline = StartupTimeline(profiling=True)
+    with caplog.at_level(logging.INFO, logger="app.services.startup_timeline"):
+        with timeline.phase("sorting"):
+            sorted(range(10_000), key=lambda value: -value)
+    assert any("Startup profile of phase 'sorting'" in record.getMessage() for record in caplog.records)
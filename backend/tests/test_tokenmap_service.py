@@ -58,3 +58,20 @@ def test_delete_non_existent_token_map(token_map_service):
     non_existent_id = UUID('00000000-0000-0000-0000-000000000000')
     success = token_map_service.delete_token_map(non_existent_id)
     assert not success
+
+def test_detokenizer_is_cached_and_invalidated(token_map_service):
+    mappings = {"[PERSON_1]": {"original_value": "John Doe", "entity_type": "PERSON", "score": 0.85}}
+    token_map_id = token_map_service.create_token_map(mappings, "John Doe", [])
+    detokenizer = token_map_service.get_detokenizer(token_map_id)
+    assert detokenizer.detokenize("Hi [PERSON_1]") == "Hi John Doe"
+    assert token_map_service.get_detokenizer(token_map_id) is detokenizer
+
+    token_map_service.update_token_map(
+        token_map_id, [TokenUpdate(token="[PERSON_1]", original_value="Jane Smith", entity_type="PERSON")]
+    )
+    assert token_map_service.get_detokenizer(token_map_id).detokenize("Hi [PERSON_1]") == "Hi Jane Smith"
+
+    token_map_service.append_tokens(
+        token_map_id, {"[PERSON_2]": {"original_value": "Bob", "entity_type": "PERSON", "score": 0.85}}, []
+    )
+    assert token_map_service.get_detokenizer(token_map_id).detokenize("[PERSON_2]") == "Bob"
@@ -0,0 +1,450 @@
+import fnmatch
+import socketserver
+import threading
+import time
+import tracemalloc
+from uuid import uuid4
+
+import pytest
+
+from app.models.requests import TokenUpdate
+from app.services.tokenmap_service import TokenMapService
+from app.services.tokenmap_store import (
+    InMemoryTokenMapStore,
+    RedisTokenMapStore,
+    SQLiteTokenMapStore,
+    TokenMapData,
+)
+
+
+class _StandInRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Serves the subset of the Redis protocol used by RedisTokenMapStore.
+    """
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        arguments = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            arguments.append(self.rfile.read(length + 2)[:-2].decode())
+        return arguments
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        encoded = value.encode()
+        return b"$%d\r\n%s\r\n" % (len(encoded), encoded)
+
+    def _run(self, name, arguments):
+        data, versions = self.server.data, self.server.versions
+        now = time.time()
+        for key in [k for k, (_, expires_at) in data.items() if expires_at is not None and expires_at < now]:
+            del data[key]
+            versions[key] = versions.get(key, 0) + 1
+        if name in ("SET", "RPUSH") or name in ("DEL", "PEXPIRE") and arguments[0] in data:
+            # Writes invalidate the WATCH of other connections.
+            versions[arguments[0]] = versions.get(arguments[0], 0) + 1
+
+        if name in ("PING", "AUTH", "SELECT"):
+            return b"+OK\r\n" if name != "PING" else b"+PONG\r\n"
+        if name == "SET":
+            expires_at = now + int(arguments[3]) / 1000 if len(arguments) > 3 else None
+            data[arguments[0]] = (arguments[1], expires_at)
+            return b"+OK\r\n"
+        if name == "GET":
+            return self._bulk(data.get(arguments[0], (None, None))[0])
+        if name == "DEL":
+            return b":%d\r\n" % (1 if data.pop(arguments[0], None) else 0)
+        if name == "PTTL":
+            value, expires_at = data.get(arguments[0], (None, None))
+            ttl_ms = -2 if value is None else -1 if expires_at is None else int((expires_at - now) * 1000)
+            return b":%d\r\n" % ttl_ms
+        if name == "PEXPIRE":
+            value, _ = data.get(arguments[0], (None, None))
+            if value is not None:
+                data[arguments[0]] = (value, now + int(arguments[1]) / 1000)
+            return b":%d\r\n" % (value is not None)
+        if name == "RPUSH":
+            values, expires_at = data.get(arguments[0], ([], None))
+            data[arguments[0]] = (values + arguments[1:], expires_at)
+            return b":%d\r\n" % len(data[arguments[0]][0])
+        if name == "LRANGE":
+            values = data.get(arguments[0], ([], None))[0]
+            return b"*%d\r\n" % len(values) + b"".join(self._bulk(value) for value in values)
+        if name == "SCAN":
+            keys = [key for key in data if fnmatch.fnmatch(key, arguments[2])]
+            return b"*2\r\n" + self._bulk("0") + b"*%d\r\n" % len(keys) + b"".join(self._bulk(k) for k in keys)
+        return b"-ERR unknown command\r\n"
+
+    def handle(self):
+        watched = {}
+        queued = None
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            name, arguments = command[0].upper(), command[1:]
+            with self.server.lock:
+                if name == "WATCH":
+                    watched.update((key, self.server.versions.get(key, 0)) for key in arguments)
+                    reply = b"+OK\r\n"
+                elif name == "UNWATCH":
+                    watched.clear()
+                    reply = b"+OK\r\n"
+                elif name == "MULTI":
+                    queued = []
+                    reply = b"+OK\r\n"
+                elif name == "EXEC":
+                    if any(self.server.versions.get(key, 0) != version for key, version in watched.items()):
+                        reply = b"*-1\r\n"
+                    else:
+                        replies = [self._run(*queued_command) for queued_command in queued]
+                        reply = b"*%d\r\n" % len(replies) + b"".join(replies)
+                    watched.clear()
+                    queued = None
+                elif queued is not None:
+                    queued.append((name, arguments))
+                    reply = b"+QUEUED\r\n"
+                else:
+                    reply = self._run(name, arguments)
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def stand_in_redis_url():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _StandInRedisHandler)
+    server.daemon_threads = True
+    server.data = {}
+    server.versions = {}
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/1"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path, stand_in_redis_url):
+    if request.param == "memory":
+        store = InMemoryTokenMapStore()
+    elif request.param == "sqlite":
+        store = SQLiteTokenMapStore(str(tmp_path / "token_maps.db"))
+    else:
+        store = RedisTokenMapStore(stand_in_redis_url)
+    yield store
+    store.close()
+
+def _token_map_data(ttl_seconds=60):
+    return TokenMapData(
+        {"[PERSON_1]": {"original_value": "John Doe", "entity_type": "PERSON", "score": 0.85}},
+        "My name is John Doe.",
+        [{"token": "[PERSON_1]", "original_value": "John Doe", "entity_type": "PERSON", "start": 11, "end": 19, "score": 0.85}],
+        ttl_seconds,
+    )
+
+def test_store_round_trip(store):
+    token_map_id = uuid4()
+    store.put(token_map_id, _token_map_data())
+    loaded = store.get(token_map_id)
+    assert loaded.mappings["[PERSON_1]"]["original_value"] == "John Doe"
+    assert loaded.original_text == "My name is John Doe."
+    assert loaded.tokens_info_raw[0]["start"] == 11
+    assert store.count() == 1
+
+    assert store.delete(token_map_id)
+    assert store.get(token_map_id) is None
+    assert not store.delete(token_map_id)
+    assert store.count() == 0
+
+def test_store_cleanup_expired(store):
+    expired_id, live_id = uuid4(), uuid4()
+    expired = _token_map_data()
+    expired.expires_at = time.time() + 0.05
+    store.put(expired_id, expired)
+    store.put(live_id, _token_map_data())
+    time.sleep(0.1)
+    removed = store.cleanup_expired()
+    if isinstance(store, RedisTokenMapStore):
+        assert removed == 0  # Redis expires keys by their TTL
+    else:
+        assert removed == 1
+    assert store.get(expired_id) is None
+    assert store.get(live_id) is not None
+    assert store.count() == 1
+
+def test_store_append(store):
+    token_map_id = uuid4()
+    token_map_data = _token_map_data()
+    token_map_data.original_text += " Mail jd@example.com."
+    token_map_data.sanitized_text += " Mail jd@example.com."
+    store.put(token_map_id, token_map_data)
+    email = {"original_value": "jd@example.com", "entity_type": "EMAIL_ADDRESS", "score": 1.0}
+    assert store.append(
+        token_map_id,
+        {"[EMAIL_ADDRESS_1]": email},
+        [{"token": "[EMAIL_ADDRESS_1]", "original_value": "jd@example.com", "entity_type": "EMAIL_ADDRESS", "start": 26, "end": 40, "score": 1.0}],
+    )
+    loaded = store.get(token_map_id)
+    assert loaded.sanitized_text == "My name is [PERSON_1]. Mail [EMAIL_ADDRESS_1]."
+    assert [occurrence["token"] for occurrence in loaded.tokens_info_raw] == ["[PERSON_1]", "[EMAIL_ADDRESS_1]"]
+
+    # A full write folds the appended tokens in.
+    store.put(token_map_id, loaded)
+    assert store.get(token_map_id).mappings["[EMAIL_ADDRESS_1]"] == email
+
+    assert store.delete(token_map_id)
+    assert not store.append(token_map_id, {}, [])
+    assert store.get(token_map_id) is None
+
+def _other_worker(store):
+    """
+    A second connection to the same storage, as another worker process would open.
+    """
+    if isinstance(store, SQLiteTokenMapStore):
+        return SQLiteTokenMapStore(store.path)
+    if isinstance(store, RedisTokenMapStore):
+        return RedisTokenMapStore(f"redis://{store.host}:{store.port}/{store.db}")
+    return store
+
+def test_store_update(store):
+    token_map_id = uuid4()
+    store.put(token_map_id, _token_map_data())
+    updated = store.update(token_map_id, lambda token_map_data: token_map_data.remove_token("[PERSON_1]"))
+    assert updated.sanitized_text == "My name is John Doe."
+    assert store.get(token_map_id).reverted_values == {"John Doe"}
+
+    def reject(token_map_data):
+        raise ValueError("rejected")
+
+    with pytest.raises(ValueError):
+        store.update(token_map_id, reject)
+    assert store.get(token_map_id).reverted_values == {"John Doe"}
+    assert store.update(uuid4(), reject) is None
+
+def test_store_updates_from_concurrent_workers_are_all_kept(store):
+    token_map_id = uuid4()
+    store.put(token_map_id, _token_map_data())
+    workers = [store, _other_worker(store)]
+
+    def edit(worker, index):
+        for step in range(10):
+            record = {"original_value": f"value {index} {step}", "entity_type": "PERSON", "score": 1.0}
+            worker.update(token_map_id, lambda token_map_data: token_map_data.append_tokens({f"[PERSON_{index}_{step}]": record}, []))
+
+    threads = [threading.Thread(target=edit, args=(worker, index)) for index, worker in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        # Neither worker overwrote an edit of the other.
+        assert len(store.get(token_map_id).mappings) == 21
+    finally:
+        if workers[1] is not store:
+            workers[1].close()
+
+def test_service_changes_are_visible_to_other_workers(tmp_path):
+    # Two services sharing one SQLite file behave like two uvicorn worker processes.
+    path = str(tmp_path / "shared.db")
+    worker_a = TokenMapService(ttl_seconds=60, store=SQLiteTokenMapStore(path))
+    worker_b = TokenMapService(ttl_seconds=60, store=SQLiteTokenMapStore(path))
+    try:
+        token_map_id = worker_a.create_token_map(
+            {"[PERSON_1]": {"original_value": "John Doe", "entity_type": "PERSON", "score": 0.85}}, "John Doe", []
+        )
+        assert worker_b.get_detokenizer(token_map_id).detokenize("[PERSON_1]") == "John Doe"
+
+        worker_b.update_token_map(
+            token_map_id, [TokenUpdate(token="[PERSON_1]", original_value="Jane Smith", entity_type="PERSON")]
+        )
+        assert worker_a.get_token_map(token_map_id)["[PERSON_1]"]["original_value"] == "Jane Smith"
+
+        assert worker_a.delete_token_map(token_map_id)
+        assert worker_b.get_token_map(token_map_id) is None
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+def test_memory_store_evicts_least_recently_used():
+    size = _token_map_data().estimate_size()
+    store = InMemoryTokenMapStore(max_bytes=size * 2)
+    first, second, third = uuid4(), uuid4(), uuid4()
+    store.put(first, _token_map_data())
+    store.put(second, _token_map_data())
+    store.get(first)  # first is now more recently used than second
+    store.put(third, _token_map_data())
+
+    assert store.get(second) is None
+    assert store.get(first) is not None
+    assert store.get(third) is not None
+    stats = store.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == size * 2
+
+def test_memory_store_tracks_bytes_on_update_and_delete():
+    store = InMemoryTokenMapStore()
+    token_map_id = uuid4()
+    token_map_data = _token_map_data()
+    store.put(token_map_id, token_map_data)
+    initial_bytes = store.get_stats()["bytes"]
+
+    token_map_data.original_text += " " * 1000
+    store.put(token_map_id, token_map_data)
+    assert store.get_stats()["bytes"] == initial_bytes + 1000
+
+    store.delete(token_map_id)
+    assert store.get_stats()["bytes"] == 0
+
+def test_memory_store_expiry_honours_extension():
+    store = InMemoryTokenMapStore()
+    extended_id, expired_id = uuid4(), uuid4()
+    for token_map_id in (extended_id, expired_id):
+        token_map_data = _token_map_data()
+        token_map_data.expires_at = time.time() + 0.05
+        store.put(token_map_id, token_map_data)
+
+    extended = store.get(extended_id)
+    extended.expires_at = time.time() + 60
+    store.put(extended_id, extended)
+    time.sleep(0.1)
+
+    assert store.cleanup_expired() == 1
+    assert store.get(expired_id) is None
+    assert store.get(extended_id) is not None
+    assert store.get_stats()["expirations"] == 1
+
+def test_token_map_data_keeps_api_shapes():
+    token_map_data = _token_map_data()
+    assert token_map_data.mappings == {
+        "[PERSON_1]": {"original_value": "John Doe", "entity_type": "PERSON", "score": 0.85}
+    }
+    assert token_map_data.tokens_info_raw == [
+        {"token": "[PERSON_1]", "original_value": "John Doe", "entity_type": "PERSON", "start": 11, "end": 19, "score": 0.85}
+    ]
+
+    assert token_map_data.update_token("[PERSON_1]", "Jane Smith", "PERSON")
+    assert not token_map_data.update_token("[PERSON_2]", "Jane Smith", "PERSON")
+    assert token_map_data.get_detokenizer().detokenize("[PERSON_1]") == "Jane Smith"
+
+    restored = TokenMapData.from_json(token_map_data.to_json())
+    assert restored.mappings == token_map_data.mappings
+    assert restored.tokens_info_raw == token_map_data.tokens_info_raw
+
+def test_token_map_data_remembers_reviewer_decisions():
+    token_map_data = _token_map_data()
+    # Editing a token makes it a reviewer token.
+    assert token_map_data.update_token("[PERSON_1]", "John Doe", "PERSON")
+    assert token_map_data.reviewer_values == {"John Doe": "[PERSON_1]"}
+
+    restored = TokenMapData.from_json(token_map_data.to_json())
+    assert restored.reviewer_values == {"John Doe": "[PERSON_1]"}
+
+    assert restored.remove_token("[PERSON_1]") == 1
+    assert restored.reviewer_values == {}
+    assert TokenMapData.from_json(restored.to_json()).reverted_values == {"John Doe"}
+
+def _measure_allocated(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        built = build()
+        return tracemalloc.get_traced_memory()[0] - before, built
+    finally:
+        tracemalloc.stop()
+
+def test_compact_storage_memory_per_span():
+    # Benchmark: 20,000 spans over 2,000 distinct people, stored as the previous list of
+    # per-occurrence dicts versus the compact TokenMapData layout.
+    span_count, distinct_values = 20_000, 2_000
+    names = [f"Person Name {index:05d}" for index in range(distinct_values)]
+    text = " ".join(names[index % distinct_values] for index in range(span_count))
+
+    mappings, occurrences, position = {}, [], 0
+    for index in range(span_count):
+        value = names[index % distinct_values]
+        token = f"[PERSON_{index % distinct_values + 1}]"
+        mappings[token] = {"original_value": value, "entity_type": "PERSON", "score": 0.85}
+        occurrences.append({
+            "token": token, "original_value": value, "entity_type": "PERSON",
+            "start": position, "end": position + len(value), "score": 0.85,
+        })
+        position += len(value) + 1
+
+    def build_dicts():
+        # Mirrors how anonymize_segment produced the stored shapes: fresh strings per occurrence.
+        return [
+            {
+                "token": f"[PERSON_{index % distinct_values + 1}]",
+                "original_value": text[occurrence["start"]:occurrence["end"]],
+                "entity_type": "PERSON",
+                "start": occurrence["start"],
+                "end": occurrence["end"],
+                "score": float(index % 100) / 100,
+            }
+            for index, occurrence in enumerate(occurrences)
+        ]
+
+    dict_bytes, dict_occurrences = _measure_allocated(build_dicts)
+    compact_bytes, token_map_data = _measure_allocated(lambda: TokenMapData(mappings, text, dict_occurrences, 60))
+
+    dict_per_span = dict_bytes / span_count
+    compact_per_span = compact_bytes / span_count
+    assert token_map_data.occurrence_count() == span_count
+    assert token_map_data.tokens_info_raw[-1]["original_value"] == dict_occurrences[-1]["original_value"]
+    assert compact_per_span * 4 < dict_per_span
+
+def _occurrence(token, text, start, entity_type="PERSON"):
+    value = text[start:].split(" ")[0]
+    return {"token": token, "original_value": value, "entity_type": entity_type, "start": start, "end": start + len(value), "score": 0.85}
+
+def test_insert_occurrences_patches_sanitized_text():
+    text = "Ann met Bob and Cid near Dan and Eve"
+    record = {"original_value": "", "entity_type": "PERSON", "score": 0.85}
+    stored = [_occurrence("[PERSON_1]", text, 8), _occurrence("[PERSON_2]", text, 25)]
+    inserted = [_occurrence("[PERSON_3]", text, 0), _occurrence("[PERSON_4]", text, 16), _occurrence("[PERSON_5]", text, 33)]
+
+    token_map_data = TokenMapData({"[PERSON_1]": record, "[PERSON_2]": record}, text, stored, 60)
+    token_map_data.insert_occurrences({f"[PERSON_{n}]": record for n in (3, 4, 5)}, inserted)
+
+    rebuilt = TokenMapData(token_map_data.mappings, text, stored + inserted, 60)
+    assert token_map_data.sanitized_text == rebuilt.sanitized_text
+    assert token_map_data.sanitized_text == "[PERSON_3] met [PERSON_1] and [PERSON_4] near [PERSON_2] and [PERSON_5]"
+    assert [occurrence["start"] for occurrence in token_map_data.tokens_info_raw] == [0, 8, 16, 25, 33]
+
+def test_find_overlapping_uses_interval_index():
+    text = "Ann met Bob and Cid"
+    record = {"original_value": "", "entity_type": "PERSON", "score": 0.85}
+    token_map_data = TokenMapData({"[PERSON_1]": record, "[PERSON_2]": record}, text, [_occurrence("[PERSON_1]", text, 8), _occurrence("[PERSON_2]", text, 16)], 60)
+    assert token_map_data.find_overlapping(0, 8) is None
+    assert token_map_data.find_overlapping(11, 16) is None
+    assert token_map_data.find_overlapping(10, 12)["token"] == "[PERSON_1]"
+    assert token_map_data.find_overlapping(12, 17)["token"] == "[PERSON_2]"
+    assert token_map_data.find_overlapping(4, 19)["start"] == 8
+    assert token_map_data.next_token("PERSON") == "[PERSON_3]"
+    assert token_map_data.next_token("EMPLOYEE_ID") == "[EMPLOYEE_ID_1]"
+
+def test_remove_token_restores_original_text():
+    text = "Ann met Bob and Ann met Cid"
+    record = {"original_value": "Ann", "entity_type": "PERSON", "score": 0.85}
+    occurrences = [
+        _occurrence("[PERSON_1]", text, 0), _occurrence("[PERSON_2]", text, 8),
+        _occurrence("[PERSON_1]", text, 16), _occurrence("[PERSON_3]", text, 24),
+    ]
+    token_map_data = TokenMapData(
+        {"[PERSON_1]": record, "[PERSON_2]": record, "[PERSON_3]": record}, text, occurrences, 60
+    )
+
+    assert token_map_data.remove_token("[PERSON_1]") == 2
+    assert token_map_data.sanitized_text == "Ann met [PERSON_2] and Ann met [PERSON_3]"
+    assert "[PERSON_1]" not in token_map_data.mappings
+    assert [occurrence["token"] for occurrence in token_map_data.tokens_info_raw] == ["[PERSON_2]", "[PERSON_3]"]
+    assert token_map_data.remove_token("[PERSON_1]") == 0
+
+    # Tokens inserted later are found through the position index as well.
+    token_map_data.insert_occurrences({"[PERSON_4]": record}, [_occurrence("[PERSON_4]", text, 16)])
+    assert token_map_data.remove_token("[PERSON_4]") == 1
+    assert token_map_data.sanitized_text == "Ann met [PERSON_2] and Ann met [PERSON_3]"
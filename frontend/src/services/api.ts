@@ -1,7 +1,13 @@
-import axios, { AxiosInstance, AxiosError } from 'axios';
+import axios, { AxiosInstance, AxiosError, InternalAxiosRequestConfig } from 'axios';
 import { DetokenizeRequest, TokenUpdate, TokenUpdateRequest, PresidioConfig, BackendSanitizeResponse, BackendTokenInfo } from '../types';
 import { DetokenizeResponse, ErrorResponse, SanitizeResponse } from '../types';
 
+// While the backend loads its models it answers 503 SERVICE_STARTING with a Retry-After
+// header. Other 503s, such as a full analysis queue, are reported to the user instead.
+const MAX_STARTUP_RETRIES = 60;
+
+type RetryableRequestConfig = InternalAxiosRequestConfig & { startupRetries?: number };
+
 class ApiService {
   private api: AxiosInstance;
 
@@ -15,13 +21,22 @@ class ApiService {
     });
     this.api.interceptors.response.use(
       (response) => response,
-      (error: AxiosError) => {
+      async (error: AxiosError) => {
+        const config = error.config as RetryableRequestConfig | undefined;
+        const retryAfter = error.response?.headers['retry-after'];
+        const isStarting = (error.response?.data as ErrorResponse | undefined)?.code === 'SERVICE_STARTING';
+        if (error.response?.status === 503 && isStarting && retryAfter && config && (config.startupRetries ?? 0) < MAX_STARTUP_RETRIES) {
+          // The backend is still starting up; wait and send the request again.
+          config.startupRetries = (config.startupRetries ?? 0) + 1;
+          await new Promise((resolve) => setTimeout(resolve, Number(retryAfter) * 1000));
+          return this.api.request(config);
+        }
         if (error.response) {
           // The request was made and the server responded with a status code
           // that falls out of the range of 2xx
           const errorData = error.response.data as ErrorResponse;
           console.error('API Error:', errorData);
-          return Promise.reject(new Error(errorData.detail || 'An API error occurred.'));
+          return Promise.reject(new Error(errorData?.message || errorData?.detail || 'An API error occurred.'));
         } else if (error.request) {
           // The request was made but no response was received
           console.error('Network Error:', error.message);
@@ -91,7 +91,9 @@ export interface TokenUpdateRequest {
 }
 
 export interface ErrorResponse {
-  detail: string;
+  detail?: string;
+  code?: string;
+  message?: string;
 }
 
 export type AppState = {